@@ -0,0 +1,244 @@
+"""
+Distributed sliding-window extraction over a shared work queue
+
+Spreads one large book, or a whole syllabus, across any number of worker
+processes and machines. The only coordination is a SQLite file on a shared
+filesystem (shared/work_queue.py):
+
+    enqueue   extract page text once, build the windows and queue them (idempotent)
+    work      claim windows under a lease, heartbeat while extracting, commit results;
+              start as many as the API quota allows, on any machine
+    status    window counts per document (pending / leased / expired / done / failed)
+    collect   assemble a document's results into the usual output.json
+
+A worker that crashes loses at most the windows it had claimed; their leases
+expire and other workers pick them up.
+
+Usage:
+    python distributed_ingest.py enqueue book.pdf syllabus/*.pdf --queue /mnt/shared/queue.db
+    python distributed_ingest.py work --queue /mnt/shared/queue.db --batch 2
+    python distributed_ingest.py status --queue /mnt/shared/queue.db
+    python distributed_ingest.py collect book.pdf --queue /mnt/shared/queue.db --output book.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from shared.log_setup import configure_logging, log_fields
+from shared.token_accounting import BudgetExceededError, TokenLedger
+from shared.work_queue import (DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH,
+                               LeaseHeartbeat, WorkQueue, default_worker_id)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_pdf(queue: WorkQueue, pdf_path: str, window_size: int = 3,
+                context_mode: str = "boundary", page_source: str = "text") -> int:
+    """
+    Extract a PDF's page text, build its windows and queue them (no model or API key needed)
+
+    Returns:
+        int: Windows added (0 when the document was already queued)
+    """
+    from questions_ingestion_pipeline.main import PDFQuestionExtractor
+    from shared.pdf_splitter import file_hash
+
+    with open(pdf_path, "rb") as f:
+        doc_id = file_hash(f.read())
+    if page_source == "text":
+        pages_text = PDFQuestionExtractor.extract_text_from_pdf(pdf_path)
+    else:
+        pages_text = [page.markdown for page in PDFQuestionExtractor.extract_pages(pdf_path, page_source)]
+    windows = PDFQuestionExtractor.create_sliding_windows(pages_text, window_size, context_mode)
+    return queue.enqueue_document(doc_id, pdf_path, len(pages_text), windows,
+                                  window_size=window_size, context_mode=context_mode, page_source=page_source)
+
+
+def run_worker(queue: WorkQueue, extractor, worker_id: str, batch: int = 1,
+               exit_when_idle: bool = True, poll_interval: float = 5.0) -> int:
+    """
+    Claim and process windows until the queue is drained (or forever)
+
+    Args:
+        queue (WorkQueue): Shared queue
+        extractor (PDFQuestionExtractor): Extractor whose model processes the windows
+        worker_id (str): Lease owner name, unique per process
+        batch (int): Windows claimed per round trip
+        exit_when_idle (bool): Stop once nothing is pending or leased; otherwise keep polling
+        poll_interval (float): Seconds between claims while idle
+
+    Returns:
+        int: Windows this worker committed
+    """
+    ledger = TokenLedger.from_env(document=f"worker:{worker_id}")
+    committed = 0
+    try:
+        with LeaseHeartbeat(queue, worker_id):
+            while True:
+                leases = queue.claim(worker_id, batch)
+                if not leases:
+                    counts = queue.progress()
+                    if exit_when_idle and not (counts["pending"] or counts["leased"] or counts["expired"]):
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                for lease in leases:
+                    window = lease["payload"]
+                    result = extractor.extract_questions_from_window(window["combined_text"], window, ledger)
+                    if "error" in result:
+                        queue.fail(worker_id, lease["doc_id"], lease["window_id"], result["error"])
+                        logger.warning("⚠️ Window %s of %s failed (attempt %d): %s", lease["window_id"],
+                                       lease["doc_id"][:12], lease["attempts"], result["error"])
+                        continue
+                    if queue.complete(worker_id, lease["doc_id"], lease["window_id"], result):
+                        committed += 1
+                    logger.info(
+                        "✅ Window %s of %s committed. Found %s questions.",
+                        lease["window_id"], lease["doc_id"][:12], result.get("total_questions_found", 0),
+                        extra=log_fields(worker=worker_id, window=lease["window_id"], document=lease["doc_id"],
+                                         questions_found=result.get("total_questions_found", 0))
+                    )
+    except BudgetExceededError as e:
+        logger.error("🛑 Worker %s stopping: %s", worker_id, e)
+    finally:
+        returned = queue.release(worker_id)
+        if returned:
+            logger.info("↩️ Returned %d unfinished windows to the queue", returned)
+    token_usage = ledger.summary()
+    logger.info("🧾 Worker %s: %d windows, %d LLM calls, ~$%.4f", worker_id, committed,
+                token_usage["calls"], token_usage["cost_usd"], extra=log_fields(token_usage=token_usage))
+    return committed
+
+
+def assemble_output(queue: WorkQueue, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the pipeline's output.json structure from a document's committed windows."""
+    results = {
+        "pdf_path": document["pdf_path"],
+        "total_pages": document["total_pages"],
+        "window_size": document["meta"].get("window_size"),
+        "total_windows": document["total_windows"],
+        "processing_status": "in_progress",
+        "windows_completed": 0,
+        "windows_results": [],
+        "summary_stats": {"total_questions_found": 0, "questions_by_type": {}, "questions_by_difficulty": {}},
+        "processing_started": datetime.fromtimestamp(document["created_at"]).isoformat(),
+    }
+    stats = results["summary_stats"]
+    finished = 0
+    for state in queue.window_states(document["doc_id"]):
+        window = state["payload"]
+        if state["status"] == "done":
+            window_result = state["result"]
+        elif state["status"] == "failed":
+            window_result = {
+                "window_id": window["window_id"],
+                "focus_page": window["focus_page"],
+                "page_range": window["page_range"],
+                "questions": [],
+                "summary": f"Error processing window: {state['error']}",
+                "total_questions_found": 0,
+                "error": state["error"],
+            }
+        else:
+            continue
+        finished += 1
+        results["windows_results"].append(window_result)
+        stats["total_questions_found"] += window_result.get("total_questions_found", 0)
+        for question in window_result.get("questions", []):
+            q_type = question.get("question_type", "unknown")
+            q_difficulty = question.get("difficulty_level", "unknown")
+            stats["questions_by_type"][q_type] = stats["questions_by_type"].get(q_type, 0) + 1
+            stats["questions_by_difficulty"][q_difficulty] = stats["questions_by_difficulty"].get(q_difficulty, 0) + 1
+
+    results["windows_completed"] = finished
+    if finished >= document["total_windows"]:
+        results["processing_status"] = "completed"
+        results["processing_completed"] = datetime.now().isoformat()
+    return results
+
+
+def find_document(queue: WorkQueue, pdf_path: str) -> Optional[Dict[str, Any]]:
+    from shared.pdf_splitter import file_hash
+
+    with open(pdf_path, "rb") as f:
+        doc_id = file_hash(f.read())
+    return next((doc for doc in queue.documents() if doc["doc_id"] == doc_id), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed sliding-window question extraction")
+    parser.add_argument("--queue", default=os.getenv("WORK_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+                        help="SQLite queue file on a shared filesystem")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length in seconds")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Queue the windows of one or more PDFs")
+    enqueue.add_argument("pdfs", nargs="+")
+    enqueue.add_argument("--window-size", type=int, default=3)
+    enqueue.add_argument("--context-mode", choices=["boundary", "full"], default="boundary")
+    enqueue.add_argument("--page-source", choices=["text", "hybrid", "ocr"], default=os.getenv("PAGE_SOURCE", "text"))
+
+    work = commands.add_parser("work", help="Process queued windows")
+    work.add_argument("--worker-id", default=default_worker_id())
+    work.add_argument("--batch", type=int, default=1, help="Windows claimed at a time")
+    work.add_argument("--forever", action="store_true", help="Keep polling when the queue is empty")
+    work.add_argument("--fake-llm", action="store_true", help="Use the stubbed extraction model (offline)")
+
+    commands.add_parser("status", help="Show per-document progress")
+
+    collect = commands.add_parser("collect", help="Write a document's results as output.json")
+    collect.add_argument("pdf")
+    collect.add_argument("--output", default="output.json")
+    collect.add_argument("--retry-failed", action="store_true", help="Requeue failed windows instead of collecting")
+
+    args = parser.parse_args()
+    load_dotenv()
+    configure_logging()
+    queue = WorkQueue(args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts)
+
+    if args.command == "work":
+        from questions_ingestion_pipeline.main import PDFQuestionExtractor
+
+        llm = None
+        if getattr(args, "fake_llm", False):
+            from shared.fake_llm import stub_extraction_llm
+            llm = stub_extraction_llm()
+        extractor = PDFQuestionExtractor(llm=llm)
+
+    if args.command == "enqueue":
+        for pdf_path in args.pdfs:
+            added = enqueue_pdf(queue, pdf_path, args.window_size, args.context_mode, args.page_source)
+            print(f"📥 {pdf_path}: {added} windows queued" if added else f"📥 {pdf_path}: already queued")
+    elif args.command == "work":
+        committed = run_worker(queue, extractor, args.worker_id, args.batch, exit_when_idle=not args.forever)
+        print(f"🏁 {args.worker_id} committed {committed} windows")
+    elif args.command == "status":
+        for document in queue.documents():
+            counts = queue.progress(document["doc_id"])
+            print(f"📄 {document['pdf_path']} ({document['total_windows']} windows): "
+                  + ", ".join(f"{state} {n}" for state, n in counts.items()))
+    else:
+        document = find_document(queue, args.pdf)
+        if document is None:
+            print(f"❌ {args.pdf} is not in the queue")
+        elif args.retry_failed:
+            print(f"🔁 Requeued {queue.retry_failed(document['doc_id'])} failed windows")
+        else:
+            results = assemble_output(queue, document)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"💾 {results['windows_completed']}/{results['total_windows']} windows "
+                  f"({results['processing_status']}) written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
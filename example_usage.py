@@ -3,6 +3,9 @@ Example usage of the PDF Question Extractor with Incremental Saving
 """
 
 from questions_ingestion_pipeline.main import PDFQuestionExtractor
+from shared.log_setup import configure_logging
+from shared.progress_events import start_event_server
+from shared.question_bank import get_question_bank
 import os
 
 def run_example():
@@ -30,13 +33,16 @@ def run_example():
         print(f"💾 Output: {output_file}")
         print(f"⏰ You can monitor progress in real-time by checking {output_file}")
         print("💡 Tip: Run 'python monitor_progress.py' in another terminal to see live progress!")
+        if start_event_server():
+            print(f"📡 Live progress events: http://127.0.0.1:{os.environ['PROGRESS_EVENTS_PORT']}/events")
         print("-" * 60)
         
         # Process the PDF with sliding window approach and incremental saving
         results = extractor.process_pdf(
             pdf_path=pdf_path,
             window_size=3,  # 3-page sliding window
-            output_path=output_file
+            output_path=output_file,
+            question_bank=get_question_bank()  # also index questions in question_bank.db
         )
         
         # Display final summary (results are already saved incrementally)
@@ -103,6 +109,8 @@ def run_with_monitoring():
     run_example()
 
 if __name__ == "__main__":
+    configure_logging()
+    
     print("Choose processing mode:")
     print("1. Standard processing")
     print("2. Processing with live monitoring")
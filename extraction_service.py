@@ -0,0 +1,448 @@
+"""
+HTTP service for PDF question extraction and question generation
+
+A small asyncio HTTP/1.1 server (stdlib only) in front of a worker pool:
+
+    POST /extract     {"pdf_path": "..."} or {"pdf_base64": "..."}, optional "window_size"
+                      -> 202 {"job_id", "status", "coalesced"}
+    GET  /jobs/<id>   -> job status, and the output.json-style result once completed
+    DELETE /jobs/<id> -> cancel a queued or running job; a running extraction stops after
+                         aborting its in-flight model call and keeps its partial result
+    POST /generate    {"query": "...", "board": "...", "class": "..."} -> 200 generated question
+    GET  /health      -> queue depth, in-flight work and worker count
+    GET  /events      -> Server-Sent Events stream of extraction progress
+                         (?job=<id> or ?document=<pdf_path> to filter; Last-Event-ID resumes)
+
+Work goes through one bounded queue: when it is full the service answers 503
+with Retry-After instead of accepting more. Identical requests that are
+already queued or running (same PDF bytes and window size, or same generation
+query/scope) are coalesced onto the existing job.
+
+Usage:
+    python extraction_service.py --port 8080 --workers 4 --queue-size 32
+    python extraction_service.py --fake-llm        # offline, stubbed models
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from dotenv import load_dotenv
+
+from shared.cancellation import CancellationToken
+from shared.log_setup import configure_logging
+from shared.progress_events import (EVENT_FILTERS, HEARTBEAT_SECONDS, SSE_HEADERS, SSE_HEARTBEAT,
+                                    get_progress_bus, parse_last_event_id, sse_message)
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 200 * 1024 * 1024
+# Finished jobs kept for GET /jobs/<id> before the oldest are dropped
+MAX_RETAINED_JOBS = 1000
+
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Job:
+    """A unit of queued work and its outcome."""
+
+    def __init__(self, kind: str, key: str, payload: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_token = CancellationToken()
+        self.done = asyncio.get_running_loop().create_future()
+
+    def to_dict(self) -> Dict[str, Any]:
+        info = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "completed":
+            info["result"] = self.result
+        elif self.status == "failed":
+            info["error"] = self.error
+        elif self.status == "cancelled":
+            info["cancel_reason"] = self.cancel_token.reason
+            if self.result is not None:
+                info["result"] = self.result
+        return info
+
+
+class ExtractionService:
+    """
+    Worker pool, bounded queue and request coalescing behind the HTTP routes
+
+    Args:
+        workers (int): Number of jobs processed concurrently
+        queue_size (int): Maximum number of queued (not yet running) jobs
+        jobs_dir (str): Directory for uploaded PDFs and per-job output files
+        extraction_llm: Chat model for PDF extraction (default: Gemini)
+        generation_llm: Chat model for question generation (default: the shared OpenAI chain)
+        use_question_bank (bool): Index extracted and generated questions in the question bank
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 32, jobs_dir: str = "service_jobs",
+                 extraction_llm: Any = None, generation_llm: Any = None, use_question_bank: bool = True):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.jobs_dir = jobs_dir
+        self.extraction_llm = extraction_llm
+        self.generation_llm = generation_llm
+        self.use_question_bank = use_question_bank
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service-worker")
+        self.in_flight: Dict[str, Job] = {}
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.coalesced = 0
+        self.rejected = 0
+        self._extractor = None
+        self._question_chain = None
+        self._queue: Optional[asyncio.Queue] = None
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    # --- Work execution (runs on executor threads) ---
+
+    def _get_extractor(self):
+        if self._extractor is None:
+            from questions_ingestion_pipeline.main import PDFQuestionExtractor
+            self._extractor = PDFQuestionExtractor(llm=self.extraction_llm)
+        return self._extractor
+
+    def _get_question_chain(self):
+        if self._question_chain is None:
+            from questions_genrator.generator import create_question_generator, get_question_chain
+            self._question_chain = (create_question_generator(self.generation_llm)
+                                    if self.generation_llm is not None else get_question_chain())
+        return self._question_chain
+
+    def _run_extraction(self, job: Job) -> Dict[str, Any]:
+        from shared.question_bank import get_question_bank
+
+        return self._get_extractor().process_pdf(
+            pdf_path=job.payload["pdf_path"],
+            window_size=job.payload["window_size"],
+            output_path=os.path.join(self.jobs_dir, f"{job.job_id}.json"),
+            question_bank=get_question_bank() if self.use_question_bank else None,
+            job_id=job.job_id,
+            cancel_token=job.cancel_token
+        )
+
+    def _run_generation(self, job: Job) -> Dict[str, Any]:
+        from questions_genrator.generator import generate_question
+
+        result, from_cache = generate_question(
+            job.payload["query"], job.payload.get("board"), job.payload.get("class"),
+            chain=self._get_question_chain(), save_to_bank=self.use_question_bank
+        )
+        return {"question": result.model_dump(by_alias=True), "from_cache": from_cache}
+
+    # --- Queue and workers ---
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for index in range(self.workers):
+            asyncio.create_task(self._worker(index))
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            if job.cancel_token.cancelled:
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                if not job.done.done():
+                    job.done.set_result(None)
+                self._queue.task_done()
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            runner = self._run_extraction if job.kind == "extract" else self._run_generation
+            try:
+                job.result = await loop.run_in_executor(self.executor, runner, job)
+                job.status = "cancelled" if job.cancel_token.cancelled else "completed"
+            except Exception as e:
+                logger.error("Job %s (%s) failed: %s", job.job_id, job.kind, e)
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                if self.in_flight.get(job.key) is job:
+                    self.in_flight.pop(job.key)
+                if not job.done.done():
+                    job.done.set_result(None)
+                self._queue.task_done()
+
+    def submit(self, kind: str, key: str, payload: Dict[str, Any]) -> Tuple[Job, bool]:
+        """
+        Queue a job, or join the identical job already queued or running
+
+        Returns:
+            Tuple[Job, bool]: The job and whether it was coalesced onto an existing one
+
+        Raises:
+            HTTPError: 503 when the queue is full
+        """
+        existing = self.in_flight.get(key)
+        if existing is not None:
+            self.coalesced += 1
+            return existing, True
+
+        job = Job(kind, key, payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise HTTPError(503, "Server busy, retry later", {"Retry-After": "5"})
+
+        self.in_flight[key] = job
+        self.jobs[job.job_id] = job
+        while len(self.jobs) > MAX_RETAINED_JOBS:
+            oldest_id = next(iter(self.jobs))
+            if self.jobs[oldest_id].status in ("queued", "running"):
+                break
+            self.jobs.pop(oldest_id)
+        return job, False
+
+    def cancel(self, job: Job) -> Dict[str, Any]:
+        """Cancel a job; new identical requests start a fresh job instead of joining it."""
+        if job.status in ("queued", "running"):
+            job.cancel_token.cancel("Cancelled by client")
+            if self.in_flight.get(job.key) is job:
+                self.in_flight.pop(job.key)
+        return job.to_dict()
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "in_flight": len(self.in_flight),
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "event_subscribers": get_progress_bus().subscriber_count,
+        }
+
+    # --- Routes ---
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == "/health":
+            return 200, self.health()
+
+        if path.startswith("/jobs/"):
+            if method not in ("GET", "DELETE"):
+                raise HTTPError(405, "Use GET or DELETE")
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job is None:
+                raise HTTPError(404, "Unknown job")
+            if method == "DELETE":
+                return 202, self.cancel(job)
+            return 200, job.to_dict()
+
+        if path == "/extract":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            # Reading, hashing and decoding a PDF would stall every other connection on the loop
+            request = _parse_json(body)
+            payload = await asyncio.get_running_loop().run_in_executor(None, self._extraction_payload, request)
+            job, coalesced = self.submit("extract", payload.pop("key"), payload)
+            return 202, {"job_id": job.job_id, "status": job.status, "coalesced": coalesced}
+
+        if path == "/generate":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            request = _parse_json(body)
+            query = (request.get("query") or "").strip()
+            if not query:
+                raise HTTPError(400, "'query' is required")
+            payload = {"query": query, "board": request.get("board"), "class": request.get("class")}
+            key = "generate:" + json.dumps(payload, sort_keys=True)
+            job, coalesced = self.submit("generate", key, payload)
+            await asyncio.shield(job.done)
+            if job.status != "completed":
+                raise HTTPError(500, job.error or f"Generation {job.status}")
+            return 200, dict(job.result, coalesced=coalesced)
+
+        raise HTTPError(404, "Not found")
+
+    def _extraction_payload(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            window_size = int(request.get("window_size", 3))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'window_size' must be an integer")
+        if window_size < 1:
+            raise HTTPError(400, "'window_size' must be at least 1")
+        if request.get("pdf_base64"):
+            try:
+                pdf_bytes = base64.b64decode(request["pdf_base64"], validate=True)
+            except ValueError:
+                raise HTTPError(400, "'pdf_base64' is not valid base64")
+            digest = hashlib.sha256(pdf_bytes).hexdigest()
+            pdf_path = os.path.join(self.jobs_dir, f"{digest}.pdf")
+            if not os.path.exists(pdf_path):
+                with open(pdf_path, "wb") as f:
+                    f.write(pdf_bytes)
+        elif request.get("pdf_path"):
+            pdf_path = request["pdf_path"]
+            if not os.path.isfile(pdf_path):
+                raise HTTPError(400, f"PDF not found: {pdf_path}")
+            with open(pdf_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        else:
+            raise HTTPError(400, "Provide 'pdf_path' or 'pdf_base64'")
+        return {"pdf_path": pdf_path, "window_size": window_size, "key": f"extract:{digest}:{window_size}"}
+
+    async def stream_events(self, writer: asyncio.StreamWriter, query: str, request_headers: Dict[str, str]):
+        """Push progress events to one client until it disconnects."""
+        filters = {key: value for key, value in parse_qsl(query) if key in EVENT_FILTERS}
+        after_id = parse_last_event_id(request_headers.get("last-event-id"))
+        head = ["HTTP/1.1 200 OK", "Connection: close"] + [f"{name}: {value}" for name, value in SSE_HEADERS.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        subscription = get_progress_bus().subscribe_async(after_id, **filters)
+        try:
+            while True:
+                event = await subscription.get(HEARTBEAT_SECONDS)
+                writer.write(sse_message(event) if event is not None else SSE_HEARTBEAT)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            subscription.close()
+            writer.close()
+
+    # --- HTTP plumbing ---
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        status, payload, headers = 500, {"error": "Internal server error"}, {}
+        try:
+            method, target, request_headers, body = await _read_request(reader)
+            path, _, query = target.partition("?")
+            if path == "/events":
+                if method != "GET":
+                    raise HTTPError(405, "Use GET")
+                await self.stream_events(writer, query, request_headers)
+                return
+            status, payload = await self.handle(method, path, body)
+        except HTTPError as e:
+            status, payload, headers = e.status, {"error": str(e)}, e.headers
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            logger.exception("Unhandled error: %s", e)
+
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(data)}",
+                "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    try:
+        method, target, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _parse_json(body: bytes) -> Dict[str, Any]:
+    try:
+        value = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPError(400, "Body must be JSON")
+    if not isinstance(value, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return value
+
+
+async def serve(service: ExtractionService, host: str, port: int):
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    logger.info("Service listening on http://%s:%d (%d workers, queue size %d)",
+                host, port, service.workers, service.queue_size)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service for question extraction and generation")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="Jobs processed concurrently")
+    parser.add_argument("--queue-size", type=int, default=32, help="Queued jobs accepted before answering 503")
+    parser.add_argument("--jobs-dir", default="service_jobs", help="Where uploads and job outputs are written")
+    parser.add_argument("--fake-llm", action="store_true", help="Use stubbed models (no API keys, fully offline)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging()
+
+    extraction_llm = generation_llm = None
+    if args.fake_llm:
+        from shared.fake_llm import stub_extraction_llm, stub_generation_llm
+        extraction_llm, generation_llm = stub_extraction_llm(), stub_generation_llm()
+
+    # Stub output must not end up in the real question bank
+    service = ExtractionService(args.workers, args.queue_size, args.jobs_dir, extraction_llm, generation_llm,
+                                use_question_bank=not args.fake_llm)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped")
+
+
+if __name__ == "__main__":
+    main()
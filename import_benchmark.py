@@ -0,0 +1,142 @@
+"""
+Import-time regression check for the entry points
+
+Each entry-point module is imported in a fresh interpreter under
+``python -X importtime``, and two things are checked:
+
+    heavy SDKs   none of HEAVY_PACKAGES may be imported at module load; they
+                 belong inside the stage that uses them
+    budget       the module's cumulative import time (median over --runs) must
+                 stay within its budget in IMPORT_BUDGETS_MS
+
+Exits with status 1 on any regression, so it can run as a CI step.
+
+Usage:
+    python import_benchmark.py
+    python import_benchmark.py --runs 7 --top 10 --report import_times.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Packages that cost hundreds of milliseconds (or seconds) to import
+HEAVY_PACKAGES = ("langchain", "langchain_core", "langchain_google_genai", "langchain_openai",
+                  "langchain_community", "pydantic", "PyPDF2", "mistralai", "streamlit", "httpx",
+                  "google", "openai", "PIL")
+
+# Cumulative import time budget per entry point, in milliseconds
+IMPORT_BUDGETS_MS = {
+    "questions_ingestion_pipeline.main": 150,
+    "example_usage": 150,
+    "monitor_progress": 80,
+    "distributed_ingest": 150,
+    "extraction_service": 150,
+    "questions_genrator.bulk": 100,
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)\s*$")
+
+
+def measure(module: str) -> Dict[str, Any]:
+    """
+    Import ``module`` once in a fresh interpreter
+
+    Returns:
+        Dict[str, Any]: ``cumulative_us`` of the module, every imported module's
+        ``self_us`` / ``cumulative_us``, and ``error`` if the import failed
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    imports = []
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        imports.append({"module": name, "self_us": self_us, "cumulative_us": cumulative})
+        if name == module and len(indent) <= 1:
+            cumulative_us = cumulative
+    error = None
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ["import failed"])[-1]
+    return {"cumulative_us": cumulative_us, "imports": imports, "error": error}
+
+
+def heavy_imports(imports: List[Dict[str, Any]]) -> List[str]:
+    return sorted({entry["module"].split(".")[0] for entry in imports} & set(HEAVY_PACKAGES))
+
+
+def check(module: str, budget_ms: float, runs: int) -> Dict[str, Any]:
+    samples = [measure(module) for _ in range(runs)]
+    errors = [s["error"] for s in samples if s["error"]]
+    times_ms = [s["cumulative_us"] / 1000 for s in samples if s["cumulative_us"] is not None]
+    median_ms = statistics.median(times_ms) if times_ms else None
+    heavy = heavy_imports(samples[-1]["imports"])
+    slowest = sorted(samples[-1]["imports"], key=lambda entry: entry["self_us"], reverse=True)
+
+    problems = []
+    if errors:
+        problems.append(f"import failed: {errors[0]}")
+    if heavy:
+        problems.append(f"heavy packages imported at load: {', '.join(heavy)}")
+    if median_ms is not None and median_ms > budget_ms:
+        problems.append(f"{median_ms:.1f} ms exceeds the {budget_ms} ms budget")
+    return {
+        "module": module,
+        "median_ms": round(median_ms, 2) if median_ms is not None else None,
+        "budget_ms": budget_ms,
+        "heavy_imports": heavy,
+        "slowest": [{"module": e["module"], "self_ms": round(e["self_us"] / 1000, 2)} for e in slowest],
+        "problems": problems,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check entry-point import times against their budgets")
+    parser.add_argument("modules", nargs="*", help="Entry points to check (default: all budgeted ones)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (median is used)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports listed per module")
+    parser.add_argument("--report", help="Write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or list(IMPORT_BUDGETS_MS)
+    results = []
+    print(f"⏱️  Import times ({args.runs} runs each, median):")
+    for module in modules:
+        result = check(module, IMPORT_BUDGETS_MS.get(module, 150), args.runs)
+        result["slowest"] = result["slowest"][:args.top]
+        results.append(result)
+        status = "❌" if result["problems"] else "✅"
+        median = f"{result['median_ms']:.1f} ms" if result["median_ms"] is not None else "n/a"
+        print(f"{status} {module:<36} {median:>10}  (budget {result['budget_ms']} ms)")
+        for problem in result["problems"]:
+            print(f"     - {problem}")
+        for entry in result["slowest"]:
+            print(f"       {entry['self_ms']:>7.2f} ms  {entry['module']}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 Report saved to {args.report}")
+
+    failed = [r["module"] for r in results if r["problems"]]
+    if failed:
+        print(f"\n❌ Import regression in: {', '.join(failed)}")
+        return 1
+    print("\n✅ All entry points within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
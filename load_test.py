@@ -0,0 +1,215 @@
+"""
+Offline load test for the extraction pipeline and the question generator
+
+Both apps are driven through their real code paths (prompting, parsing,
+recovery, question-bank writes) with a fake chat model that replays the
+latencies recorded in ``pdf_question_extractor.log`` and answers with payloads
+taken from ``output.json``. Each concurrency level runs as its own phase and
+reports throughput, p50/p95/p99 latency, error rate and memory.
+
+Usage:
+    python load_test.py --target both --concurrency 1 4 16 --requests 48
+    python load_test.py --target generation --concurrency 32 --time-scale 0.1 --error-rate 0.02
+    python load_test.py --report load_test_report.json
+    python load_test.py --target extraction --concurrency 8 --time-scale 0.1 --hedge
+
+``--time-scale`` shrinks the recorded latencies (1.0 replays them as recorded).
+``--hedge`` wraps the fake models in hedged requests (see ``shared/hedging.py``)
+so the p99 impact and hedge win rate can be measured.
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Keep the run offline and away from the real question bank
+os.environ.setdefault("QUESTION_BANK_PATH", "")
+
+from shared.fake_llm import latency_faithful_llms, load_latency_samples
+from shared.hedging import HedgedChatModel, Hedger
+from shared.log_setup import configure_logging
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered), math.ceil(pct / 100 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_phase(name: str, call: Callable[[int], bool], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Issue ``requests`` calls with at most ``concurrency`` in flight
+
+    Args:
+        call (Callable): Receives the request index and returns False (or raises) on failure
+
+    Returns:
+        Dict[str, Any]: Throughput, latency percentiles, error rate and memory for the phase
+    """
+    latencies: List[float] = []
+    errors = 0
+
+    def timed(index: int):
+        start = time.perf_counter()
+        try:
+            ok = call(index)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    tracemalloc.start()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, ok in pool.map(timed, range(requests)):
+            latencies.append(latency)
+            errors += not ok
+    wall = time.perf_counter() - wall_start
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "target": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(requests / wall, 3) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "heap_peak_mb": round(heap_peak / (1024 * 1024), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def extraction_call(llm: Any, pdf_path: str, window_size: int) -> Callable[[int], bool]:
+    from questions_ingestion_pipeline.main import PDFQuestionExtractor
+
+    extractor = PDFQuestionExtractor(llm=llm)
+    windows = extractor.create_sliding_windows(extractor.extract_text_from_pdf(pdf_path), window_size)
+    if not windows:
+        raise SystemExit(f"❌ No text windows could be built from {pdf_path}")
+
+    def call(index: int) -> bool:
+        window = windows[index % len(windows)]
+        result = extractor.extract_questions_from_window(window["combined_text"], window)
+        return "error" not in result and "parse_error" not in result
+
+    return call
+
+
+def generation_call(llm: Any, output_path: str) -> Callable[[int], bool]:
+    from questions_genrator.generator import create_question_generator, generate_question
+
+    chain = create_question_generator(llm)
+    with open(output_path, "r", encoding="utf-8") as f:
+        queries = [q["question_text"] for w in json.load(f).get("windows_results", []) for q in w.get("questions", [])]
+    queries = queries or ["Quadratic equations by factorisation"]
+
+    def call(index: int) -> bool:
+        generate_question(queries[index % len(queries)], use_cache=False, chain=chain)
+        return True
+
+    return call
+
+
+def print_table(results: List[Dict[str, Any]]):
+    header = f"{'target':<11}{'conc':>5}{'reqs':>6}{'rps':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'errors':>8}{'heap MB':>9}{'RSS MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['target']:<11}{r['concurrency']:>5}{r['requests']:>6}{r['throughput_rps']:>9.3f}"
+              f"{r['p50_s']:>8.2f}{r['p95_s']:>8.2f}{r['p99_s']:>8.2f}{r['error_rate']:>8.1%}"
+              f"{r['heap_peak_mb']:>9.1f}{r['peak_rss_mb']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test with a latency-faithful fake model")
+    parser.add_argument("--target", choices=["extraction", "generation", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels to sweep")
+    parser.add_argument("--requests", type=int, default=48, help="Requests per concurrency level")
+    parser.add_argument("--log", default=os.path.join("mistal_ocr_test", "pdf_question_extractor.log"),
+                        help="Extractor log to take model latencies from")
+    parser.add_argument("--output-json", default="output.json", help="Pipeline output to take payloads from")
+    parser.add_argument("--pdf", default="maths_example.pdf", help="PDF whose windows drive the extraction target")
+    parser.add_argument("--window-size", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier on recorded latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model calls that fail")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--hedge", action="store_true", help="Hedge model calls at the observed p90 latency")
+    parser.add_argument("--hedge-max-extra", type=float, default=0.1, help="Maximum hedges as a fraction of calls")
+    parser.add_argument("--report", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    configure_logging(level="WARNING")
+
+    samples = load_latency_samples(args.log)
+    if samples:
+        print(f"⏱️ Replaying {len(samples)} recorded latencies "
+              f"({min(samples):.1f}-{max(samples):.1f}s, scale {args.time_scale})")
+    else:
+        print(f"⚠️ No latencies found in {args.log}; model calls return immediately")
+
+    extraction_llm, generation_llm = latency_faithful_llms(
+        args.log, args.output_json, args.time_scale, args.error_rate, args.seed
+    )
+    hedgers = {}
+    if args.hedge:
+        # Until enough calls have completed, hedge at the recorded p90
+        recorded_p90 = percentile(samples, 90) * args.time_scale if samples else None
+        for name in ("extraction", "generation"):
+            hedgers[name] = Hedger(name, max_extra_fraction=args.hedge_max_extra, initial_delay=recorded_p90)
+        extraction_llm = HedgedChatModel(inner=extraction_llm, hedger=hedgers["extraction"])
+        generation_llm = HedgedChatModel(inner=generation_llm, hedger=hedgers["generation"])
+
+    targets = []
+    if args.target in ("extraction", "both"):
+        targets.append(("extraction", extraction_call(extraction_llm, args.pdf, args.window_size)))
+    if args.target in ("generation", "both"):
+        targets.append(("generation", generation_call(generation_llm, args.output_json)))
+
+    results = []
+    for name, call in targets:
+        for concurrency in args.concurrency:
+            print(f"🚀 {name}: {args.requests} requests at concurrency {concurrency}")
+            results.append(run_phase(name, call, args.requests, concurrency))
+
+    print()
+    print_table(results)
+
+    for name, hedger in hedgers.items():
+        stats = hedger.stats()
+        if stats["calls"]:
+            print(f"\n🪁 {name} hedging: {stats['hedges_fired']} hedges over {stats['calls']} calls, "
+                  f"{stats['hedge_wins']} wins ({stats['hedge_win_rate']:.0%}), {stats['cancelled']} cancelled")
+            for result in results:
+                if result["target"] == name:
+                    result["hedging"] = stats
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Report written to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,53 @@
+"""
+NCERT exercise-question extraction over a whole chapter PDF with Gemini
+
+The PDF reaches the model as a proper document input instead of base64 text
+pasted into the prompt:
+
+    text    PyPDF2 text layer, one "=== Page N ===" block per page (cheapest)
+    hybrid  text layer, with only the pages whose text layer is unusable OCR'd
+    ocr     Mistral OCR markdown per page (for scanned pages / heavy math)
+    native  the PDF itself as a binary attachment (Gemini bills ~258 tokens per page)
+
+Before calling the model, the estimated prompt size of the chosen mode is
+compared with the old base64-as-text prompt; the actual usage reported by the
+model is printed afterwards.
+
+Usage:
+    python mistal_ocr_test/main.py maths_example.pdf --mode text
+    python mistal_ocr_test/main.py maths_example.pdf --mode hybrid
+    python mistal_ocr_test/main.py maths_example.pdf --mode native --pages 1-12
+    python mistal_ocr_test/main.py maths_example.pdf --compare-only
+"""
+
+import argparse
 import base64
 import os
-import pprint
+import sys
+
 from dotenv import load_dotenv
-import PyPDF2
-import io
+from langchain_core.messages import HumanMessage, SystemMessage
+
+# Make the repo-level packages importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.llm_backend import create_chat_model
+from shared.page_router import iter_routed_pages
+from shared.pdf_splitter import PDFSplitter, parse_ranges
+
 load_dotenv()
-from mistralai import Mistral
-def encode_pdf(pdf_path):
-    """Encode only the first 3 pages of the pdf to base64."""
-    try:
-        
-        with open(pdf_path, "rb") as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            writer = PyPDF2.PdfWriter()
-            
-            # Add only first 3 pages (or all pages if less than 3)
-            num_pages = min(3, len(reader.pages))
-            for i in range(num_pages):
-                writer.add_page(reader.pages[i])
-            
-            # Write to bytes buffer
-            output_buffer = io.BytesIO()
-            writer.write(output_buffer)
-            output_buffer.seek(0)
-            
-            return base64.b64encode(output_buffer.read()).decode('utf-8')
-    except FileNotFoundError:
-        print(f"Error: The file {pdf_path} was not found.")
-        return None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
-
-# Path to your pdf
-pdf_path = "C:\\Users\\Manan Agrawal\\Documents\\WORK\\Python101\\Vedantu-RAG-Pipeline\\maths_example.pdf"
-
-# Getting the base64 string
-base64_pdf = encode_pdf(pdf_path)
-
-print("Base64 Encoded PDF:")
-print(base64_pdf)
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-import PyPDF2
-import io
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=os.environ.get("GOOGLE_API_KEY"),
-    temperature=0.3,
-)
-
-system_message = SystemMessage(
-    content="""
+
+# Rough characters-per-token ratio used for the text estimates
+CHARS_PER_TOKEN = 4
+# Gemini's per-page token charge for PDF attachments
+NATIVE_PDF_TOKENS_PER_PAGE = 258
+
+SYSTEM_PROMPT = r"""
 1. Persona & Objective
-You are a meticulous AI digital archivist. Your expertise lies in parsing complex academic documents, specifically Indian NCERT textbooks, with flawless precision. Your primary objective is to scan a Base64-encoded PDF of a Class 12 NCERT Mathematics textbook, identify all exercise sections, and extract only the questions into a highly structured, nested JSON format. You must operate with zero tolerance for including non-question content.
+You are a meticulous AI digital archivist. Your expertise lies in parsing complex academic documents, specifically Indian NCERT textbooks, with flawless precision. Your primary objective is to scan the pages of a Class 12 NCERT Mathematics textbook, identify all exercise sections, and extract only the questions into a highly structured, nested JSON format. You must operate with zero tolerance for including non-question content.
 
 2. Input Format
-You will be provided with a single input: a Base64 encoded string representing a PDF file. Your first step is to decode this string to access the content of the PDF document. The document is a standard NCERT Class 12 Mathematics textbook. Be aware that PDF-to-text conversion can sometimes introduce minor formatting errors; you are expected to intelligently handle these.
+You will be provided with the pages of a PDF document, either as extracted text / OCR markdown with each page preceded by a "=== Page N ===" marker, or as the attached PDF document itself. The document is a standard NCERT Class 12 Mathematics textbook. Be aware that PDF-to-text conversion can sometimes introduce minor formatting errors; you are expected to intelligently handle these.
 
 3. Core Task: High-Fidelity Question Extraction
 Your core task is to identify and extract every question from the main exercises and miscellaneous exercises within each chapter.
@@ -122,7 +112,7 @@ JSON Structure Example:
 }
 
 6. Step-by-Step Execution Plan
-Receive and decode the Base64 PDF string.
+Read the provided pages in order.
 
 Perform an initial pass to identify all chapter titles and exercise section titles (e.g., "Chapter 1...", "Exercise 1.1", "Miscellaneous Exercise..."). Use these to build the skeleton of your JSON output.
 
@@ -138,17 +128,94 @@ Place the cleaned, formatted question string into the correct array within your
 
 Continue this process until the entire document is parsed.
 
-Output the final, complete, and validated JSON object as your sole response.""")
+Output the final, complete, and validated JSON object as your sole response."""
 
-human_message = HumanMessage(
-    content=f"Decode the following Base64 PDF and extract all questions in structured JSON format:\\n{base64_pdf}"
-)
 
+def text_layer_pages(reader, start, end):
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
 
 
-message = []
-message.append(system_message)
-message.append(human_message)
+def routed_pages(pdf_bytes, mode):
+    """Page text for ``ocr`` (every page) or ``hybrid`` (text layer, OCR for weak pages)."""
+    pages = list(iter_routed_pages(PDFSplitter(pdf_bytes), mode))
+    ocr_count = sum(page.source == "ocr" for page in pages)
+    print(f"🔀 {len(pages) - ocr_count} pages from the text layer, {ocr_count} via OCR")
+    return [page.markdown for page in pages]
 
-response = llm.invoke(message)
-print(response.content)
\ No newline at end of file
+
+def join_pages(pages, first_page_number):
+    return "\n\n".join(f"=== Page {first_page_number + i} ===\n{text}" for i, text in enumerate(pages))
+
+
+def build_document_message(mode, reader, pdf_bytes, start, end):
+    """
+    Build the human message carrying the pages in the chosen input mode
+
+    Returns:
+        Tuple[HumanMessage, int]: The message and its estimated document token count
+    """
+    instruction = "Extract all exercise questions from the following pages in structured JSON format."
+    if mode == "native":
+        content = [
+            {"type": "text", "text": instruction},
+            {"type": "media", "mime_type": "application/pdf", "data": base64.b64encode(pdf_bytes).decode("utf-8")},
+        ]
+        return HumanMessage(content=content), (end - start) * NATIVE_PDF_TOKENS_PER_PAGE
+
+    pages = routed_pages(pdf_bytes, mode) if mode in ("ocr", "hybrid") else text_layer_pages(reader, start, end)
+    document_text = join_pages(pages, start + 1)
+    return HumanMessage(content=f"{instruction}\n\n{document_text}"), len(document_text) // CHARS_PER_TOKEN
+
+
+def report_token_comparison(mode, document_tokens, pdf_bytes, page_count):
+    """Print the estimated document tokens of ``mode`` against the old base64-as-text prompt."""
+    legacy_tokens = len(base64.b64encode(pdf_bytes)) // CHARS_PER_TOKEN
+    system_tokens = len(SYSTEM_PROMPT) // CHARS_PER_TOKEN
+    print(f"📊 Estimated prompt tokens for {page_count} pages:")
+    print(f"   {'base64 pasted as text:':<24}~{legacy_tokens + system_tokens:,}")
+    print(f"   {mode + ' mode:':<24}~{document_tokens + system_tokens:,}")
+    if document_tokens:
+        print(f"   reduction: {legacy_tokens / document_tokens:,.0f}x fewer document tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract NCERT exercise questions from a PDF chapter")
+    parser.add_argument("pdf_path", nargs="?", default="maths_example.pdf")
+    parser.add_argument("--mode", choices=["text", "hybrid", "ocr", "native"], default="text", help="How the pages reach the model")
+    parser.add_argument("--pages", help="1-based page range, e.g. 1-12 (default: every page)")
+    parser.add_argument("--compare-only", action="store_true", help="Print the token comparison without calling the model")
+    args = parser.parse_args()
+
+    try:
+        splitter = PDFSplitter.from_path(args.pdf_path)
+    except FileNotFoundError:
+        print(f"Error: The file {args.pdf_path} was not found.")
+        return
+
+    start, end = 0, splitter.page_count
+    if args.pages:
+        try:
+            ranges = parse_ranges(args.pages, splitter.page_count)
+        except ValueError as e:
+            parser.error(str(e))
+        # The pages go to the model as one contiguous excerpt
+        if len(ranges) != 1:
+            parser.error("--pages takes a single range, e.g. 1-12")
+        start, end = ranges[0]
+    pdf_bytes = splitter.page_range(start, end)
+    human_message, document_tokens = build_document_message(args.mode, splitter.reader, pdf_bytes, start, end)
+    report_token_comparison(args.mode, document_tokens, pdf_bytes, end - start)
+    if args.compare_only:
+        return
+
+    llm = create_chat_model("google", "gemini-2.5-flash", temperature=0.3, api_key=os.environ.get("GOOGLE_API_KEY"))
+    response = llm.invoke([SystemMessage(content=SYSTEM_PROMPT), human_message])
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        print(f"🧾 Actual usage: {usage.get('input_tokens', 0):,} input / {usage.get('output_tokens', 0):,} output tokens")
+    print(response.content)
+
+
+if __name__ == "__main__":
+    main()
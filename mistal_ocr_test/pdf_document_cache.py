@@ -0,0 +1,61 @@
+"""
+Parsed-PDF document cache for the Streamlit extractor.
+
+Uploaded PDFs are keyed by the SHA-256 of their bytes, parsed once, and shared
+across reruns and sessions through ``st.cache_resource``. Derived payloads
+(the first-page preview, the base64 document for OCR and page-range slices)
+are built lazily on first use and reused afterwards; page ranges come from the
+shared :class:`~shared.pdf_splitter.PDFSplitter` and its (hash, range) cache.
+"""
+
+import base64
+import threading
+
+import streamlit as st
+
+from shared.pdf_splitter import PDFSplitter
+
+
+class PDFDocument:
+    """A parsed PDF and the payloads derived from it."""
+
+    def __init__(self, file_hash, pdf_bytes):
+        self.file_hash = file_hash
+        # ``bytes`` is immutable, so every slice and reader shares this buffer
+        self.data = pdf_bytes
+        self.splitter = PDFSplitter(pdf_bytes, digest=file_hash)
+        self.reader = self.splitter.reader
+        self.page_count = self.splitter.page_count
+        self._lock = threading.Lock()
+        self._base64_pdf = None
+        self._preview_base64 = None
+
+    @property
+    def size_mb(self):
+        return len(self.data) / (1024 * 1024)
+
+    @property
+    def base64_pdf(self):
+        """The whole document base64-encoded, as sent to the OCR API."""
+        with self._lock:
+            if self._base64_pdf is None:
+                self._base64_pdf = base64.b64encode(self.data).decode('utf-8')
+            return self._base64_pdf
+
+    @property
+    def preview_base64(self):
+        """A one-page PDF of the first page, base64-encoded for the preview iframe."""
+        with self._lock:
+            if self._preview_base64 is None:
+                self._preview_base64 = base64.b64encode(self.page_range(0, 1)).decode('utf-8')
+            return self._preview_base64
+
+    def page_range(self, start, end):
+        """Return pages ``[start, end)`` as a standalone PDF."""
+        return self.splitter.page_range(start, end)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_pdf_document(file_hash, _pdf_bytes):
+    """Return the cached :class:`PDFDocument` for ``file_hash``, parsing it on first use."""
+    return PDFDocument(file_hash, _pdf_bytes)
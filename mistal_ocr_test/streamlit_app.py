@@ -1,21 +1,37 @@
 import streamlit as st
 import base64
 import os
-from PIL import Image
-import io
+import sys
 from dotenv import load_dotenv
-from mistralai import Mistral
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
-import PyPDF2
+from pydantic import ValidationError
 import json
 import logging
 import time
 from datetime import datetime
 
+# `streamlit run` only puts this script's folder on sys.path; add the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mistal_ocr_test.pdf_document_cache import get_pdf_document
+from shared.cancellation import (CallTimeoutError, CancellationToken, ExtractionCancelled, call_timeout_from_env,
+                                 document_timeout_from_env, invoke_with_timeout)
+from shared.json_repair import JSONRecoveryError, recover_json, reformat_json_with_llm
+from shared.llm_backend import create_chat_model, requires_api_key
+from shared.log_setup import Lazy, configure_logging, log_fields
+from shared.page_context import boundary_context
+from shared.page_router import route_document
+from shared.pdf_splitter import file_hash
+from shared.progress_events import get_progress_bus, start_event_server
+from shared.question_bank import get_question_bank, records_from_ocr_questions
+from shared.question_schema import OCR_QUESTIONS, dump_questions, parse_ocr_questions, validate_questions
+from shared.token_accounting import BudgetExceededError, TokenLedger
+
 # Load environment variables
 load_dotenv()
 
+EXTRACTION_MODEL = "gemini-2.5-pro"
+
 # System prompt for question extraction
 SYSTEM_PROMPT = """You are an expert AI assistant specialized in parsing educational content. Your task is to act as a highly accurate question extractor for OCR text from NCERT Class 12th Mathematics textbooks.
 
@@ -83,46 +99,51 @@ You MUST format your output as a JSON list of objects. Each object represents a
 ]
 ```"""
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('pdf_question_extractor.log'),
-        logging.StreamHandler()
-    ]
-)
+# Schema reminder for the re-formatting request sent when a response cannot be repaired locally
+OUTPUT_FORMAT_INSTRUCTIONS = 'The output must be a JSON list of objects with the keys "chapter", "question", "topic" and "image_id" (a string or null).'
+
+# Configure logging (idempotent across Streamlit reruns)
+configure_logging(log_file='pdf_question_extractor.log')
 logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
 
-def encode_pdf(pdf_bytes):
-    """Encode the pdf bytes to base64."""
-    return base64.b64encode(pdf_bytes).decode('utf-8')
-
-def decode_base64_image(base64_string):
-    """Decode base64 string to PIL Image."""
+def count_json_items(json_text):
+    """Count the items in a JSON array string (used only for debug logging)."""
+    return len(json.loads(json_text)) if json_text != '[]' else 0
+
+def preview_questions(questions, max_chars=100):
+    """Truncated question texts for debug logging."""
+    previews = []
+    for q in questions if isinstance(questions, list) else []:
+        text = q.get('question', 'No question text')
+        previews.append(text[:max_chars] + '...' if len(text) > max_chars else text)
+    return previews
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def decode_base64_image(file_key, image_id, _base64_string):
+    """Decode a base64 OCR image to raw bytes, memoized per (file, image ID).
+
+    The base64 payload is excluded from the cache key (leading underscore) so a
+    cache hit never re-hashes the image data.
+    """
     try:
+        base64_string = _base64_string
         if base64_string.startswith('data:image'):
             base64_string = base64_string.split(',')[1]
-        image_data = base64.b64decode(base64_string)
-        return Image.open(io.BytesIO(image_data))
+        return base64.b64decode(base64_string)
     except Exception as e:
-        st.error(f"Error decoding image: {e}")
+        logger.error(f"Error decoding image {image_id}: {e}")
         return None
 
-def display_first_page_preview(pdf_bytes):
-    """Extracts and displays the first page of a PDF in the sidebar."""
+def get_uploaded_document():
+    """Return the cached parsed document for the current upload."""
+    return get_pdf_document(st.session_state.uploaded_file_hash, st.session_state.uploaded_file_bytes)
+
+def display_first_page_preview(document):
+    """Displays the cached first-page preview of a PDF in the sidebar."""
     try:
-        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-        writer = PyPDF2.PdfWriter()
-        writer.add_page(reader.pages[0])
-        
-        first_page_buffer = io.BytesIO()
-        writer.write(first_page_buffer)
-        first_page_buffer.seek(0)
-        
-        base64_pdf = base64.b64encode(first_page_buffer.read()).decode('utf-8')
+        base64_pdf = document.preview_base64
         pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="400" type="application/pdf"></iframe>'
         st.markdown(pdf_display, unsafe_allow_html=True)
     except Exception as e:
@@ -138,12 +159,27 @@ def get_page_content_with_images(page_object):
             content += f"[Image ID: {img.id}]\n"
     return content
 
+def get_context_fragment(page_object, fragment, position):
+    """Label a neighbouring-page fragment and list the images it references."""
+    content = f"(Only the {position} of this page is shown; it completes a question that crosses the page break.)\n{fragment}"
+    images = [img for img in (page_object.images or []) if img.id in fragment]
+    if images:
+        content += "\n\n--- IMAGES ON THIS PAGE ---\n"
+        for img in images:
+            content += f"[Image ID: {img.id}]\n"
+    return content
+
 # --- Core Logic Functions ---
 
-def process_ocr(pdf_bytes):
-    """Process OCR using Mistral API and cache images."""
+PAGE_SOURCE_OPTIONS = {
+    "hybrid": "Text layer, OCR only weak pages",
+    "ocr": "OCR every page",
+}
+
+def process_ocr(document, page_source="hybrid"):
+    """Build the page stream (text layer and/or Mistral OCR) and cache images."""
     start_time = time.time()
-    pdf_size_mb = len(pdf_bytes) / (1024 * 1024)
+    pdf_size_mb = document.size_mb
     
     logger.info("=" * 50)
     logger.info("STARTING OCR PROCESSING")
@@ -152,29 +188,19 @@ def process_ocr(pdf_bytes):
     logger.info(f"OCR started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     try:
-        api_key = os.environ.get("MISTRAL_API_KEY")
-        if not api_key:
-            logger.error("MISTRAL_API_KEY not found in environment variables")
-            st.error("MISTRAL_API_KEY not found in environment variables")
-            return None
-            
-        logger.debug("Initializing Mistral client")
-        client = Mistral(api_key=api_key)
-        
-        logger.debug("Encoding PDF to base64")
-        base64_pdf = encode_pdf(pdf_bytes)
-        logger.debug(f"Base64 encoding complete, size: {len(base64_pdf)} characters")
-        
-        logger.info("Sending PDF to Mistral OCR API")
+        logger.info(f"Routing {document.page_count} pages ({page_source})")
         ocr_start_time = time.time()
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest",
-            document={"type": "document_url", "document_url": f"data:application/pdf;base64,{base64_pdf}"},
-            include_image_base64=True
-        )
+        # The Mistral client is created only once some page actually needs OCR
+        try:
+            ocr_response = route_document(document.splitter, page_source)
+        except ValueError as e:
+            # e.g. pages need OCR but MISTRAL_API_KEY is not set
+            logger.error(f"Could not build the page text: {e}")
+            st.error(f"Could not build the page text: {e}")
+            return None
         ocr_duration = time.time() - ocr_start_time
         
-        logger.info(f"OCR API response received in {ocr_duration:.2f} seconds")
+        logger.info(f"Page text ready in {ocr_duration:.2f} seconds: {ocr_response.summary}")
         
         if ocr_response:
             logger.info(f"OCR successful! Processing {len(ocr_response.pages)} pages")
@@ -186,7 +212,7 @@ def process_ocr(pdf_bytes):
                 page_text_length = len(page.markdown) if page.markdown else 0
                 page_image_count = len(page.images) if page.images else 0
                 
-                logger.debug(f"Page {page_idx + 1}: {page_text_length} text characters, {page_image_count} images")
+                logger.debug("Page %d: %d text characters, %d images", page_idx + 1, page_text_length, page_image_count)
                 
                 if page.images:
                     for img in page.images:
@@ -194,7 +220,13 @@ def process_ocr(pdf_bytes):
                         image_count += 1
             
             total_duration = time.time() - start_time
-            logger.info(f"OCR processing complete! Cached {image_count} images")
+            logger.info(f"OCR processing complete! Cached {len(st.session_state.image_lookup)} unique images ({image_count} references)")
+            image_stats = ocr_response.summary.get("images")
+            if image_stats and image_stats["images"]:
+                logger.info(
+                    f"🖼️ {image_stats['images']} OCR images -> {image_stats['unique']} kept, "
+                    f"payload {image_stats['original_chars'] / 1e6:.2f} MB -> {image_stats['stored_chars'] / 1e6:.2f} MB"
+                )
             logger.info(f"Total OCR processing time: {total_duration:.2f} seconds")
             logger.info("=" * 50)
         else:
@@ -207,28 +239,42 @@ def process_ocr(pdf_bytes):
         st.error(f"Error processing OCR: {e}")
         return None
 
-def extract_questions_for_window(main_page_text, front_page_text, back_page_text, prev_extracted_questions_json, page_number=None):
-    """Generate questions for a single sliding window using Google Gemini."""
+def extract_questions_for_window(main_page_text, front_page_text, back_page_text, prev_extracted_questions_json, page_number=None, ledger=None, cancel_token=None):
+    """Generate questions for a single sliding window using Google Gemini.
+
+    Tokens, latency and cost of every call are recorded in ``ledger`` when
+    given; a spent budget raises :class:`BudgetExceededError`. Calls are
+    bounded by LLM_CALL_TIMEOUT (:class:`CallTimeoutError`) and by
+    ``cancel_token`` (:class:`ExtractionCancelled`).
+    """
     start_time = time.time()
     page_info = f"Page {page_number}" if page_number else "Unknown page"
     
-    logger.info(f"Starting question extraction for {page_info}")
-    logger.debug(f"Main page text length: {len(main_page_text)} characters")
-    logger.debug(f"Front page text length: {len(front_page_text)} characters")
-    logger.debug(f"Back page text length: {len(back_page_text)} characters")
-    logger.debug(f"Previous questions count: {len(json.loads(prev_extracted_questions_json)) if prev_extracted_questions_json != '[]' else 0}")
+    logger.debug(
+        "Starting question extraction for %s", page_info,
+        extra=log_fields(
+            page=page_number,
+            main_chars=len(main_page_text),
+            front_chars=len(front_page_text),
+            back_chars=len(back_page_text),
+            prev_questions=Lazy(count_json_items, prev_extracted_questions_json),
+        )
+    )
     
     try:
         api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and requires_api_key():
             logger.error("GOOGLE_API_KEY not found in environment variables")
             st.error("GOOGLE_API_KEY not found in environment variables")
             return []
             
-        logger.debug(f"Initializing ChatGoogleGenerativeAI for {page_info}")
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=api_key, temperature=0.1)
+        model = EXTRACTION_MODEL
+        if ledger is not None and ledger.check_budget():
+            model = ledger.downgrade_model
+        logger.debug("Initializing chat model (%s) for %s", model, page_info)
+        llm = create_chat_model("google", model, temperature=0.1, api_key=api_key)
         
-        logger.debug(f"Using embedded system prompt for {page_info}")
+        logger.debug("Using embedded system prompt for %s", page_info)
         system_message = SystemMessage(content=SYSTEM_PROMPT)
 
         human_message_content = f"""
@@ -244,122 +290,250 @@ Here is the data for the current window. Please analyze it according to the inst
 """
         human_message = HumanMessage(content=human_message_content)
         
-        logger.info(f"Sending request to Gemini API for {page_info}")
-        logger.debug(f"Total message content length: {len(human_message_content)} characters")
+        logger.debug("Sending request to Gemini API for %s (%d characters)", page_info, len(human_message_content))
         
         messages = [system_message, human_message]
         llm_start_time = time.time()
-        response = llm.invoke(messages)
+        response = invoke_with_timeout(llm, messages, call_timeout_from_env(), cancel_token)
         llm_duration = time.time() - llm_start_time
+        usage = ledger.record(model, response, llm_duration, page=page_number) if ledger is not None else {}
         
-        logger.info(f"Gemini API response received for {page_info} in {llm_duration:.2f} seconds")
+        logger.info(
+            "Gemini API response received for %s in %.2f seconds", page_info, llm_duration,
+            extra=log_fields(page=page_number, latency_s=round(llm_duration, 2), model=model,
+                             input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+        )
         
         content = response.content.strip()
-        logger.debug(f"Raw response length: {len(content)} characters")
+        logger.debug("Raw response length: %d characters", len(content))
         
         if content.startswith('```json'): content = content[7:]
         if content.endswith('```'): content = content[:-3]
         content = content.strip()
         
-        logger.debug(f"Cleaned response length: {len(content)} characters")
+        logger.debug("Cleaned response length: %d characters", len(content))
         
         try:
             if not content: 
-                logger.warning(f"Empty response received for {page_info}")
+                logger.warning("Empty response received for %s", page_info)
                 return []
-            questions_json = json.loads(content)
-            extracted_count = len(questions_json) if isinstance(questions_json, list) else 0
+            try:
+                # Parse and validate the whole list in one pass
+                questions = parse_ocr_questions(content)
+            except ValidationError:
+                try:
+                    questions_json = json.loads(content)
+                except json.JSONDecodeError as json_err:
+                    # Repair locally, then re-format only the malformed output as a last resort
+                    logger.warning("JSON parsing failed for %s: %s; attempting recovery", page_info, json_err)
+                    def record_usage(reformat_response, latency):
+                        if ledger is not None:
+                            ledger.record(model, reformat_response, latency, page=page_number, purpose="reformat")
+                    
+                    questions_json, method = recover_json(
+                        content,
+                        reformat=lambda text: reformat_json_with_llm(llm, text, OUTPUT_FORMAT_INSTRUCTIONS, on_response=record_usage,
+                                                                     timeout=call_timeout_from_env(), cancel_token=cancel_token)
+                    )
+                    if isinstance(questions_json, dict):
+                        questions_json = next((v for v in questions_json.values() if isinstance(v, list)), [])
+                    logger.info("Recovered response for %s via %s", page_info, method)
+                # Questions that don't match the schema are dropped, the rest kept
+                questions = validate_questions(questions_json if isinstance(questions_json, list) else [], OCR_QUESTIONS)
+            questions_json = dump_questions(questions, OCR_QUESTIONS)
+            extracted_count = len(questions_json)
             total_duration = time.time() - start_time
             
-            logger.info(f"Successfully extracted {extracted_count} questions from {page_info} in {total_duration:.2f} seconds")
-            
-            if extracted_count > 0:
-                logger.debug(f"Questions extracted from {page_info}: {[q.get('question', 'No question text')[:100] + '...' if len(q.get('question', '')) > 100 else q.get('question', 'No question text') for q in questions_json]}")
+            logger.debug(
+                "Successfully extracted %d questions from %s in %.2f seconds", extracted_count, page_info, total_duration,
+                extra=log_fields(page=page_number, questions=Lazy(preview_questions, questions_json))
+            )
             
-            return questions_json if isinstance(questions_json, list) else []
+            return questions_json
             
-        except json.JSONDecodeError as json_err:
+        except JSONRecoveryError as json_err:
             total_duration = time.time() - start_time
-            logger.error(f"JSON parsing failed for {page_info} after {total_duration:.2f} seconds: {json_err}")
-            logger.debug(f"Raw response content that failed to parse: {content}")
+            logger.error("JSON recovery failed for %s after %.2f seconds: %s", page_info, total_duration, json_err)
+            logger.debug("Raw response content that failed to parse: %s", content)
             st.warning(f"Failed to parse JSON response from LLM for {page_info}. Raw response: {content}")
             return []
             
+    except (BudgetExceededError, CallTimeoutError, ExtractionCancelled):
+        raise
     except Exception as e:
         total_duration = time.time() - start_time
-        logger.error(f"Error generating questions for {page_info} after {total_duration:.2f} seconds: {e}")
+        logger.error("Error generating questions for %s after %.2f seconds: %s", page_info, total_duration, e)
         st.error(f"Error generating questions for {page_info}: {e}")
         return []
 
-def process_pdf_with_sliding_window():
-    """Iterates through the PDF with a sliding window and extracts questions."""
+def process_pdf_with_sliding_window(page_indices=None, page_source="hybrid"):
+    """Iterates through the PDF with a sliding window and extracts questions.
+
+    ``page_indices`` (0-based) limits the run to those pages, e.g. to resume a
+    stopped run. ``page_source`` is the page text source the OCR run used, as
+    reported in the progress events. Stopping (the Stop button or
+    DOCUMENT_TIMEOUT) aborts the in-flight model call. The questions found so
+    far are kept, and the pages left over (including pages whose call timed
+    out) are saved for resuming.
+    """
     start_time = time.time()
     ocr_pages = st.session_state.ocr_response.pages
     total_pages = len(ocr_pages)
+    pages_to_do = list(page_indices) if page_indices is not None else list(range(total_pages))
     
-    logger.info(f"Starting sliding window processing for PDF with {total_pages} pages")
+    logger.info(f"Starting sliding window processing for PDF with {total_pages} pages ({len(pages_to_do)} to process)")
     logger.info(f"Process started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    if 'all_questions' not in st.session_state:
+    if st.session_state.get('all_questions') is None:
         st.session_state.all_questions = []
+        mark_questions_changed()
         logger.debug("Initialized empty questions list in session state")
 
+    # Clicking Stop reruns the script; the checkpoint below lets Streamlit interrupt a waiting model call
+    st.button("⏹️ Stop", key="stop_extraction", help="Stop after aborting the current page; progress is kept")
     progress_bar = st.progress(0, text="Starting question generation...")
+    progress = {"value": 0.0, "text": "Starting question generation..."}
+    token = CancellationToken(document_timeout_from_env(),
+                              checkpoint=lambda: progress_bar.progress(progress["value"], text=progress["text"]))
     
     # Statistics tracking
     total_questions_extracted = 0
     pages_with_questions = 0
     pages_without_questions = 0
+    bank_records = []
+    document_name = st.session_state.uploaded_file_info[0]
+    ledger = TokenLedger.from_env(document=document_name)
+    if page_indices is not None:
+        # A resumed run continues the stopped run's spend instead of restarting the budget at $0
+        ledger.seed(st.session_state.get('token_usage'))
+    abort_reason = None
+    completed = 0
+    timed_out_pages = []
+    page_num = None
+    events = get_progress_bus()
+    
+    def publish(event_type, **fields):
+        events.publish(event_type, job=ledger.run_id, document=document_name, **fields)
+    
+    publish("document_started", total_pages=total_pages, total_windows=len(pages_to_do), page_source=page_source)
 
-    with st.status("Processing PDF with sliding window...", expanded=True) as status:
-        for i in range(total_pages):
-            page_start_time = time.time()
-            page_num = i + 1
-            
-            logger.info(f"Processing sliding window for page {page_num}/{total_pages}")
-            status.update(label=f"Processing Page {page_num}/{total_pages}...")
-            
-            # Get page content
-            main_page_text = get_page_content_with_images(ocr_pages[i])
-            front_page_text = get_page_content_with_images(ocr_pages[i-1]) if i > 0 else "This is the first page. There is no front page."
-            back_page_text = get_page_content_with_images(ocr_pages[i+1]) if i < total_pages - 1 else "This is the last page. There is no back page."
-            
-            logger.debug(f"Page {page_num} - Main text length: {len(main_page_text)} chars")
-            logger.debug(f"Page {page_num} - Front context length: {len(front_page_text)} chars")
-            logger.debug(f"Page {page_num} - Back context length: {len(back_page_text)} chars")
-            
-            prev_questions_json = json.dumps(st.session_state.all_questions, indent=2)
-            current_total = len(st.session_state.all_questions)
-            
-            logger.debug(f"Page {page_num} - Previous questions count: {current_total}")
-            
-            newly_extracted = extract_questions_for_window(
-                main_page_text, front_page_text, back_page_text, prev_questions_json, page_num
-            )
-            
-            page_duration = time.time() - page_start_time
-            
-            if newly_extracted:
-                st.session_state.all_questions.extend(newly_extracted)
-                pages_with_questions += 1
-                total_questions_extracted += len(newly_extracted)
+    try:
+        with st.status("Processing PDF with sliding window...", expanded=True) as status:
+            for i in pages_to_do:
+                page_start_time = time.time()
+                page_num = i + 1
+                
+                logger.debug("Processing sliding window for page %d/%d", page_num, total_pages)
+                status.update(label=f"Processing Page {page_num}/{total_pages}...")
+                
+                # Get page content
+                main_page_text = get_page_content_with_images(ocr_pages[i])
+                
+                # Neighbouring pages are only sent as the fragments a page-crossing question needs
+                front, back = boundary_context(
+                    ocr_pages[i-1].markdown or "" if i > 0 else None,
+                    ocr_pages[i].markdown or "",
+                    ocr_pages[i+1].markdown or "" if i < total_pages - 1 else None,
+                )
+                if i == 0:
+                    front_page_text = "This is the first page. There is no front page."
+                elif front:
+                    front_page_text = get_context_fragment(ocr_pages[i-1], front, "end")
+                else:
+                    front_page_text = "No question continues from the previous page."
+                if i == total_pages - 1:
+                    back_page_text = "This is the last page. There is no back page."
+                elif back:
+                    back_page_text = get_context_fragment(ocr_pages[i+1], back, "start")
+                else:
+                    back_page_text = "No question continues onto the next page."
+                
+                prev_questions_json = json.dumps(st.session_state.all_questions, indent=2)
+                current_total = len(st.session_state.all_questions)
+                
+                publish("window_started", window=page_num, window_index=completed + 1, total_windows=len(pages_to_do),
+                        pages=[page_num])
+                tokens_before = dict(ledger.totals)
+                try:
+                    token.raise_if_cancelled()
+                    newly_extracted = extract_questions_for_window(
+                        main_page_text, front_page_text, back_page_text, prev_questions_json, page_num, ledger, token
+                    )
+                except (BudgetExceededError, ExtractionCancelled) as e:
+                    logger.error("Stopping at page %d: %s", page_num, e)
+                    abort_reason = f"Stopped at page {page_num}: {e}"
+                    publish("window_finished", window=page_num, window_index=completed + 1,
+                            total_windows=len(pages_to_do), pages=[page_num], questions_found=0, error=str(e))
+                    break
+                except CallTimeoutError as e:
+                    # A stuck page is skipped and kept for resuming; it doesn't hold up the rest
+                    logger.warning("Page %d skipped: %s", page_num, e, extra=log_fields(page=page_num))
+                    st.write(f"⏱️ Page {page_num}: {e}. It can be retried with Resume.")
+                    timed_out_pages.append(i)
+                    completed += 1
+                    publish("window_finished", window=page_num, window_index=completed,
+                            total_windows=len(pages_to_do), pages=[page_num], questions_found=0, error=str(e))
+                    continue
                 
-                logger.info(f"Page {page_num}: Successfully extracted {len(newly_extracted)} questions in {page_duration:.2f} seconds")
-                for idx, question in enumerate(newly_extracted):
-                    logger.debug(f"Page {page_num} Question {idx+1}: {question.get('question', 'No question text')[:100]}{'...' if len(question.get('question', '')) > 100 else ''}")
+                page_duration = time.time() - page_start_time
+                completed += 1
+                publish("window_finished", window=page_num, window_index=completed, total_windows=len(pages_to_do),
+                        pages=[page_num], questions_found=len(newly_extracted),
+                        input_tokens=ledger.totals["input_tokens"] - tokens_before["input_tokens"],
+                        output_tokens=ledger.totals["output_tokens"] - tokens_before["output_tokens"],
+                        cost_usd=round(ledger.totals["cost_usd"] - tokens_before["cost_usd"], 6),
+                        duration_s=round(page_duration, 2))
                 
-                st.write(f"✅ Page {page_num}: Found {len(newly_extracted)} new question(s).")
+                if newly_extracted:
+                    st.session_state.all_questions.extend(newly_extracted)
+                    mark_questions_changed()
+                    pages_with_questions += 1
+                    total_questions_extracted += len(newly_extracted)
+                    bank_records.extend(records_from_ocr_questions(newly_extracted, document_name, page_num))
+                    
+                    logger.info(
+                        "Page %d: Successfully extracted %d questions in %.2f seconds", page_num, len(newly_extracted), page_duration,
+                        extra=log_fields(page=page_num, questions_found=len(newly_extracted), total_questions=current_total + len(newly_extracted))
+                    )
+                    
+                    st.write(f"✅ Page {page_num}: Found {len(newly_extracted)} new question(s).")
+                else:
+                    pages_without_questions += 1
+                    logger.info(
+                        "Page %d: No questions extracted in %.2f seconds", page_num, page_duration,
+                        extra=log_fields(page=page_num, questions_found=0, total_questions=current_total)
+                    )
+                    st.write(f"☑️ Page {page_num}: No new questions found.")
+
+                progress["value"] = completed / len(pages_to_do)
+                progress["text"] = f"Processed Page {page_num}/{total_pages}"
+                progress_bar.progress(progress["value"], text=progress["text"])
+
+            if abort_reason:
+                status.update(label=abort_reason, state="error")
+            elif timed_out_pages:
+                status.update(label=f"Processed, {len(timed_out_pages)} page(s) timed out", state="complete")
             else:
-                pages_without_questions += 1
-                logger.info(f"Page {page_num}: No questions extracted in {page_duration:.2f} seconds")
-                st.write(f"☑️ Page {page_num}: No new questions found.")
-
-            progress_bar.progress((i + 1) / total_pages, text=f"Processed Page {page_num}/{total_pages}")
-            
-            # Log cumulative statistics
-            logger.debug(f"Cumulative stats after page {page_num}: {len(st.session_state.all_questions)} total questions")
-
-        status.update(label="All pages processed!", state="complete")
+                status.update(label="All pages processed!", state="complete")
+    finally:
+        # Runs on Stop too (Streamlit interrupts the script), so partial results are never lost
+        remaining = timed_out_pages + pages_to_do[completed:]
+        if completed < len(pages_to_do) and abort_reason is None:
+            abort_reason = f"Stopped at page {page_num}" if page_num else "Stopped"
+        if remaining:
+            st.session_state.extraction_resume = {"pages": remaining, "reason": abort_reason or "Some pages timed out"}
+        else:
+            st.session_state.pop('extraction_resume', None)
+        st.session_state.token_usage = dict(ledger.summary(), abort_reason=abort_reason)
+        publish("document_finished", status="aborted" if abort_reason else "completed", error=abort_reason,
+                questions_found=total_questions_extracted, remaining_pages=[p + 1 for p in remaining],
+                token_usage=ledger.summary())
+        
+        # Index the new questions in the question bank in one transaction
+        question_bank = get_question_bank()
+        if question_bank is not None and bank_records:
+            added = question_bank.add_questions(bank_records)
+            logger.info(f"Added {added} new questions to the question bank ({question_bank.path})")
     
     # Final processing summary
     total_duration = time.time() - start_time
@@ -370,23 +544,160 @@ def process_pdf_with_sliding_window():
     logger.info("=" * 80)
     logger.info(f"Process completed at: {end_time}")
     logger.info(f"Total processing time: {total_duration:.2f} seconds")
-    logger.info(f"Average time per page: {total_duration/total_pages:.2f} seconds")
-    logger.info(f"Total pages processed: {total_pages}")
+    logger.info(f"Average time per page: {total_duration/max(len(pages_to_do), 1):.2f} seconds")
+    logger.info(f"Total pages processed: {completed}/{len(pages_to_do)}")
     logger.info(f"Pages with questions: {pages_with_questions}")
     logger.info(f"Pages without questions: {pages_without_questions}")
     logger.info(f"Total questions extracted: {total_questions_extracted}")
     logger.info(f"Final question count: {len(st.session_state.all_questions)}")
+    logger.info(
+        "LLM usage: %d calls, %d input / %d output tokens, ~$%.4f",
+        ledger.totals["calls"], ledger.totals["input_tokens"], ledger.totals["output_tokens"], ledger.totals["cost_usd"],
+        extra=log_fields(token_usage=Lazy(ledger.summary))
+    )
     if total_questions_extracted > 0:
         logger.info(f"Average questions per productive page: {total_questions_extracted/pages_with_questions:.2f}")
     logger.info("=" * 80)
 
-    st.success(f"Processing complete! Found a total of {len(st.session_state.all_questions)} questions.")
+    if abort_reason:
+        st.warning(f"{abort_reason}. Kept {len(st.session_state.all_questions)} questions; the remaining pages can be resumed.")
+    else:
+        st.success(f"Processing complete! Found a total of {len(st.session_state.all_questions)} questions.")
     st.rerun()
 
+# --- Display Functions ---
+
+QUESTIONS_PER_PAGE_OPTIONS = [10, 25, 50, 100]
+QUESTION_VIEW_STATE_KEYS = [
+    'questions_json_cache', 'question_chapter_filter', 'question_topic_filter',
+    'questions_page', 'questions_per_page', 'ocr_page_number', 'show_ocr_pages'
+]
+
+def mark_questions_changed():
+    """Invalidate everything derived from ``all_questions``; call after every change to the list."""
+    st.session_state.questions_version = st.session_state.get('questions_version', 0) + 1
+
+def get_questions_json(questions):
+    """Serialize the questions for download, reusing the last result until they change."""
+    version = st.session_state.get('questions_version', 0)
+    cached = st.session_state.get('questions_json_cache')
+    if cached is None or cached[0] != version:
+        cached = (version, json.dumps(questions, indent=2))
+        st.session_state.questions_json_cache = cached
+    return cached[1]
+
+def filter_questions(questions, chapters, topics):
+    """Return (index, question) pairs matching the selected chapters and topics."""
+    return [
+        (i, q) for i, q in enumerate(questions)
+        if (not chapters or q.get('chapter', 'N/A') in chapters)
+        and (not topics or q.get('topic', 'N/A') in topics)
+    ]
+
+def display_question(index, question):
+    """Render a single extracted question with its associated image, if any."""
+    with st.container(border=True):
+        st.markdown(f"**Question {index + 1}**")
+        st.markdown(f"**Chapter:** {question.get('chapter', 'N/A')}")
+        st.markdown(f"**Topic:** {question.get('topic', 'N/A')}")
+        st.markdown(f"> {question.get('question', 'No question text found.')}")
+        
+        image_id = question.get("image_id")
+        if image_id and st.session_state.image_lookup:
+            image_base64 = st.session_state.image_lookup.get(image_id)
+            if image_base64:
+                st.markdown("**Associated Image:**")
+                image_bytes = decode_base64_image(st.session_state.uploaded_file_hash, image_id, image_base64)
+                if image_bytes:
+                    st.image(image_bytes, use_container_width=True)
+                else:
+                    st.error(f"Error decoding image '{image_id}'.")
+            else:
+                st.warning(f"Warning: Image ID '{image_id}' was found but could not be loaded from the OCR cache.")
+
+def display_questions_page(questions):
+    """Render one page of questions, filtered by chapter and topic.
+
+    Only the questions on the current page are rendered, so the cost of a rerun
+    no longer grows with the total number of extracted questions.
+    """
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        chapters = st.multiselect(
+            "Filter by chapter",
+            sorted({q.get('chapter', 'N/A') for q in questions}),
+            key="question_chapter_filter"
+        )
+    with col2:
+        topics = st.multiselect(
+            "Filter by topic",
+            sorted({q.get('topic', 'N/A') for q in questions if not chapters or q.get('chapter', 'N/A') in chapters}),
+            key="question_topic_filter"
+        )
+    with col3:
+        per_page = st.selectbox("Per page", QUESTIONS_PER_PAGE_OPTIONS, key="questions_per_page")
+
+    matches = filter_questions(questions, chapters, topics)
+    if not matches:
+        st.info("No questions match the selected filters.")
+        return
+
+    total_pages = (len(matches) - 1) // per_page + 1
+    if st.session_state.get('questions_page', 1) > total_pages:
+        st.session_state.questions_page = total_pages
+    page = st.number_input(
+        f"Page (1-{total_pages})", min_value=1, max_value=total_pages,
+        step=1, key="questions_page"
+    )
+    start = (page - 1) * per_page
+    page_matches = matches[start:start + per_page]
+    st.caption(f"Showing questions {start + 1}-{start + len(page_matches)} of {len(matches)} matching")
+
+    for index, question in page_matches:
+        display_question(index, question)
+
+def display_ocr_page_view(ocr_pages):
+    """Show the OCR output one page at a time, only when the user asks for it."""
+    with st.expander("Click to view detailed OCR output for each page"):
+        if not st.toggle("Load OCR page view", key="show_ocr_pages"):
+            return
+        page_number = st.number_input(
+            f"OCR page (1-{len(ocr_pages)})", min_value=1, max_value=len(ocr_pages),
+            step=1, key="ocr_page_number"
+        )
+        page = ocr_pages[page_number - 1]
+        st.subheader(f"Page {page_number}")
+        st.caption(f"Source: {page.source}" + (f" ({', '.join(page.quality['reasons'])})" if page.quality["reasons"] else ""))
+        st.markdown("**Extracted Text:**")
+        st.markdown(page.markdown if page.markdown else "No text extracted.")
+        thumbnails = [img for img in page.images or [] if img.thumbnail_base64]
+        if thumbnails:
+            st.markdown("**Images:**")
+            st.image(
+                [decode_base64_image(st.session_state.uploaded_file_hash, f"{img.id}:thumb", img.thumbnail_base64) for img in thumbnails],
+                caption=[img.id for img in thumbnails]
+            )
+
 # --- Streamlit UI ---
 
+def display_token_usage(token_usage):
+    """Show the last run's token and cost totals."""
+    if not token_usage:
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("LLM calls", token_usage["calls"])
+    col2.metric("Input tokens", f"{token_usage['input_tokens']:,}")
+    col3.metric("Output tokens", f"{token_usage['output_tokens']:,}")
+    col4.metric("Estimated cost", f"${token_usage['cost_usd']:.4f}")
+    if token_usage.get("abort_reason"):
+        st.warning(f"🛑 {token_usage['abort_reason']}")
+    elif token_usage.get("downgraded"):
+        st.caption("💸 The budget was exceeded; later pages used the downgrade model.")
+
 def main():
     st.set_page_config(page_title="PDF Question Extractor", page_icon="📄", layout="wide")
+    # Live progress for external dashboards; started once per server process
+    start_event_server()
     st.title("📄 PDF Question Extractor with Sliding Window")
     st.markdown("Upload a PDF, run OCR, and then generate questions with image association.")
     
@@ -409,23 +720,43 @@ def main():
                 logger.info(f"New PDF uploaded: {current_file_info[0]} (Size: {current_file_info[1]} bytes)")
                 st.session_state.uploaded_file_info = current_file_info
                 st.session_state.uploaded_file_bytes = uploaded_file.getvalue()
+                st.session_state.uploaded_file_hash = file_hash(st.session_state.uploaded_file_bytes)
                 # Reset all derived data when a new file is uploaded
                 st.session_state.ocr_response = None
+                st.session_state.pop('ocr_page_source', None)
                 st.session_state.all_questions = None
+                mark_questions_changed()
                 st.session_state.image_lookup = None
+                st.session_state.pop('token_usage', None)
+                st.session_state.pop('extraction_resume', None)
+                for key in QUESTION_VIEW_STATE_KEYS:
+                    st.session_state.pop(key, None)
                 logger.debug("Reset session state for new PDF upload")
                 st.info("New PDF detected. Ready to process.")
                 st.rerun() # Rerun to show the preview immediately
 
             # Display first page preview immediately
-            display_first_page_preview(st.session_state.uploaded_file_bytes)
+            try:
+                document = get_uploaded_document()
+            except Exception as e:
+                # PyPDF2 rejects corrupt and encrypted files while parsing
+                logger.error(f"Could not read uploaded PDF {current_file_info[0]}: {e}")
+                st.warning(f"Could not read this PDF (it may be corrupt or encrypted): {e}")
+                st.stop()
+            display_first_page_preview(document)
+            st.caption(f"{document.page_count} pages · {document.size_mb:.2f} MB")
+
+            page_source = st.radio(
+                "Page text", list(PAGE_SOURCE_OPTIONS), format_func=PAGE_SOURCE_OPTIONS.get, key="page_source"
+            )
 
             # OCR processing button
             if st.button("🔍 Process OCR", type="primary", use_container_width=True):
                 with st.spinner("Processing OCR... This may take a few moments."):
-                    ocr_response = process_ocr(st.session_state.uploaded_file_bytes)
+                    ocr_response = process_ocr(document, page_source)
                     if ocr_response:
                         st.session_state.ocr_response = ocr_response
+                        st.session_state.ocr_page_source = page_source
                         st.success("OCR processing complete!")
                     else:
                         st.error("Failed to process OCR.")
@@ -446,34 +777,27 @@ def main():
             logger.info(f"PDF: {st.session_state.uploaded_file_info[0]} ({st.session_state.uploaded_file_info[1]} bytes)")
             logger.info(f"Total pages available: {len(st.session_state.ocr_response.pages)}")
             st.session_state.all_questions = []
-            process_pdf_with_sliding_window()
+            mark_questions_changed()
+            st.session_state.pop('extraction_resume', None)
+            process_pdf_with_sliding_window(page_source=st.session_state.get('ocr_page_source', 'hybrid'))
+        
+        resume = st.session_state.get('extraction_resume')
+        if resume:
+            st.info(f"⏸️ {resume['reason']}. {len(resume['pages'])} page(s) left to process.")
+            if st.button(f"▶️ Resume ({len(resume['pages'])} pages)", use_container_width=True):
+                logger.info("User resumed question generation for %d pages", len(resume['pages']))
+                process_pdf_with_sliding_window(resume['pages'], st.session_state.get('ocr_page_source', 'hybrid'))
 
         if st.session_state.all_questions is not None:
             st.subheader(f"📚 Extracted Questions ({len(st.session_state.all_questions)} total)")
+            display_token_usage(st.session_state.get('token_usage'))
             
             if st.session_state.all_questions:
-                for i, q in enumerate(st.session_state.all_questions):
-                    with st.container(border=True):
-                        st.markdown(f"**Question {i+1}**")
-                        st.markdown(f"**Chapter:** {q.get('chapter', 'N/A')}")
-                        st.markdown(f"**Topic:** {q.get('topic', 'N/A')}")
-                        st.markdown(f"> {q.get('question', 'No question text found.')}")
-                        
-                        image_id = q.get("image_id")
-                        if image_id and st.session_state.image_lookup:
-                            image_base64 = st.session_state.image_lookup.get(image_id)
-                            if image_base64:
-                                st.markdown("**Associated Image:**")
-                                decoded_image = decode_base64_image(image_base64)
-                                if decoded_image:
-                                    st.image(decoded_image, use_container_width=True)
-                            else:
-                                st.warning(f"Warning: Image ID '{image_id}' was found but could not be loaded from the OCR cache.")
-
-                all_questions_json = json.dumps(st.session_state.all_questions, indent=2)
+                display_questions_page(st.session_state.all_questions)
+
                 st.download_button(
                     label="📥 Download All Questions (JSON)",
-                    data=all_questions_json,
+                    data=get_questions_json(st.session_state.all_questions),
                     file_name="all_extracted_questions.json",
                     mime="application/json",
                     use_container_width=True
@@ -481,12 +805,15 @@ def main():
             else:
                 st.info("No questions were extracted from the document.")
 
-        with st.expander("Click to view detailed OCR output for each page"):
-            for page_idx, page in enumerate(st.session_state.ocr_response.pages):
-                st.subheader(f"Page {page_idx + 1}")
-                st.markdown("**Extracted Text:**")
-                st.markdown(page.markdown if page.markdown else "No text extracted.")
-                st.divider()
+        summary = st.session_state.ocr_response.summary
+        st.caption(f"🔀 {summary['text_layer']} pages from the PDF text layer, {summary['ocr']} via OCR")
+        image_stats = summary.get("images")
+        if image_stats and image_stats["images"]:
+            st.caption(
+                f"🖼️ {image_stats['images']} images, {image_stats['unique']} after removing duplicates "
+                f"({image_stats['original_chars'] / 1e6:.2f} MB -> {image_stats['stored_chars'] / 1e6:.2f} MB)"
+            )
+        display_ocr_page_view(st.session_state.ocr_response.pages)
     elif st.session_state.uploaded_file_info:
         st.info("PDF loaded. Please click 'Process OCR' in the sidebar to continue.")
 
@@ -8,6 +8,8 @@ import time
 import os
 from datetime import datetime
 
+from shared.ndjson_export import INDEX_FILE, load_index
+
 def monitor_progress(output_file="output.json", refresh_interval=2):
     """
     Monitor the progress of PDF processing in real-time
@@ -102,71 +104,133 @@ def monitor_progress(output_file="output.json", refresh_interval=2):
     except Exception as e:
         print(f"\n❌ Monitor error: {str(e)}")
 
+def monitor_events(url="http://127.0.0.1:8765/events"):
+    """
+    Follow a run's progress events pushed over Server-Sent Events (no file polling)
+    
+    Args:
+        url (str): SSE endpoint, e.g. http://127.0.0.1:8765/events?document=maths_example.pdf
+    """
+    from urllib.request import urlopen
+    
+    print("📡 PDF Processing Live Events")
+    print("="*50)
+    print(f"🔗 Subscribed to: {url}")
+    print("Press Ctrl+C to stop monitoring\n")
+    
+    try:
+        with urlopen(url) as stream:
+            for raw_line in stream:
+                line = raw_line.decode("utf-8").rstrip("\n")
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                stamp = datetime.fromtimestamp(event["time"]).strftime('%H:%M:%S')
+                kind = event["type"]
+                if kind == "document_started":
+                    print(f"[{stamp}] 🚀 {event['document']}: {event.get('total_pages', '?')} pages, "
+                          f"{event.get('total_windows', '?')} windows")
+                elif kind == "window_started":
+                    print(f"[{stamp}] 🪟 Window {event.get('window_index', event.get('window'))}/"
+                          f"{event.get('total_windows', '?')} started (pages {event.get('pages')})")
+                elif kind == "window_finished":
+                    if event.get("error"):
+                        print(f"[{stamp}] ❌ Window {event.get('window')} failed: {event['error']}")
+                    else:
+                        print(f"[{stamp}] ✅ Window {event.get('window')}: {event.get('questions_found', 0)} questions, "
+                              f"{event.get('input_tokens', 0) + event.get('output_tokens', 0)} tokens")
+                elif kind == "document_finished":
+                    print(f"[{stamp}] 🏁 {event['document']} {event.get('status', '').upper()}: "
+                          f"{event.get('questions_found', 0)} questions")
+                else:
+                    print(f"[{stamp}] • {kind}: {event}")
+    except KeyboardInterrupt:
+        print("\n\n👋 Monitoring stopped by user")
+    except Exception as e:
+        print(f"\n❌ Monitor error: {str(e)}")
+
 def show_final_summary(output_file="output.json"):
     """
     Show a detailed summary of the completed processing
     
     Args:
-        output_file (str): Path to the completed output JSON file
+        output_file (str): Path to the completed output JSON file, or to a sharded
+            export (its directory or index.json), which is summarised from the index alone
     """
     try:
         if not os.path.exists(output_file):
             print(f"❌ Output file not found: {output_file}")
             return
         
+        if os.path.isdir(output_file) or os.path.basename(output_file) == INDEX_FILE:
+            index = load_index(output_file)
+            for document in index["documents"].values():
+                print_summary(document["run"], output_file)
+            return
+        
         with open(output_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        print("\n" + "="*60)
-        print("📊 DETAILED PROCESSING SUMMARY")
-        print("="*60)
-        
-        print(f"📄 PDF: {data.get('pdf_path', 'Unknown')}")
-        print(f"📊 Total Pages: {data.get('total_pages', 0)}")
-        print(f"🪟 Window Size: {data.get('window_size', 0)}")
-        print(f"🔢 Total Windows: {data.get('total_windows', 0)}")
-        print(f"✅ Windows Completed: {data.get('windows_completed', 0)}")
-        print(f"🚀 Status: {data.get('processing_status', 'unknown').upper()}")
-        
-        total_questions = data.get('summary_stats', {}).get('total_questions_found', 0)
-        print(f"❓ Total Questions Found: {total_questions}")
-        
-        # Question type breakdown
-        if data.get('summary_stats', {}).get('questions_by_type'):
-            print("\n📝 Questions by Type:")
-            for q_type, count in data['summary_stats']['questions_by_type'].items():
-                percentage = (count / total_questions * 100) if total_questions > 0 else 0
-                print(f"   • {q_type}: {count} ({percentage:.1f}%)")
-        
-        # Difficulty breakdown
-        if data.get('summary_stats', {}).get('questions_by_difficulty'):
-            print("\n📈 Questions by Difficulty:")
-            for difficulty, count in data['summary_stats']['questions_by_difficulty'].items():
-                percentage = (count / total_questions * 100) if total_questions > 0 else 0
-                print(f"   • {difficulty}: {count} ({percentage:.1f}%)")
-        
-        # Window-by-window breakdown
-        print(f"\n🪟 Window Breakdown:")
-        windows_results = data.get('windows_results', [])
-        for i, window in enumerate(windows_results[:5], 1):  # Show first 5 windows
-            window_questions = window.get('total_questions_found', 0)
-            page_range = window.get('page_range', 'unknown')
-            print(f"   Window {i} (pages {page_range}): {window_questions} questions")
-        
-        if len(windows_results) > 5:
-            print(f"   ... and {len(windows_results) - 5} more windows")
-        
-        # Timing information
-        if data.get('processing_started'):
-            print(f"\n⏰ Started: {data['processing_started']}")
-        if data.get('processing_completed'):
-            print(f"🏁 Completed: {data['processing_completed']}")
-        
-        print(f"\n💾 Full results available in: {output_file}")
+        print_summary(data, output_file)
         
     except Exception as e:
         print(f"❌ Error showing summary: {str(e)}")
 
+def print_summary(data, output_file):
+    """
+    Print the summary of one run
+    
+    Args:
+        data (dict): The run's output.json contents (windows need only their counts)
+        output_file (str): Where the full results live
+    """
+    print("\n" + "="*60)
+    print("📊 DETAILED PROCESSING SUMMARY")
+    print("="*60)
+    
+    print(f"📄 PDF: {data.get('pdf_path', 'Unknown')}")
+    print(f"📊 Total Pages: {data.get('total_pages', 0)}")
+    print(f"🪟 Window Size: {data.get('window_size', 0)}")
+    print(f"🔢 Total Windows: {data.get('total_windows', 0)}")
+    print(f"✅ Windows Completed: {data.get('windows_completed', 0)}")
+    print(f"🚀 Status: {data.get('processing_status', 'unknown').upper()}")
+    
+    total_questions = data.get('summary_stats', {}).get('total_questions_found', 0)
+    print(f"❓ Total Questions Found: {total_questions}")
+    
+    # Question type breakdown
+    if data.get('summary_stats', {}).get('questions_by_type'):
+        print("\n📝 Questions by Type:")
+        for q_type, count in data['summary_stats']['questions_by_type'].items():
+            percentage = (count / total_questions * 100) if total_questions > 0 else 0
+            print(f"   • {q_type}: {count} ({percentage:.1f}%)")
+    
+    # Difficulty breakdown
+    if data.get('summary_stats', {}).get('questions_by_difficulty'):
+        print("\n📈 Questions by Difficulty:")
+        for difficulty, count in data['summary_stats']['questions_by_difficulty'].items():
+            percentage = (count / total_questions * 100) if total_questions > 0 else 0
+            print(f"   • {difficulty}: {count} ({percentage:.1f}%)")
+    
+    # Window-by-window breakdown
+    print(f"\n🪟 Window Breakdown:")
+    windows_results = data.get('windows_results', [])
+    for i, window in enumerate(windows_results[:5], 1):  # Show first 5 windows
+        window_questions = window.get('total_questions_found', 0)
+        page_range = window.get('page_range', 'unknown')
+        print(f"   Window {i} (pages {page_range}): {window_questions} questions")
+    
+    if len(windows_results) > 5:
+        print(f"   ... and {len(windows_results) - 5} more windows")
+    
+    # Timing information
+    if data.get('processing_started'):
+        print(f"\n⏰ Started: {data['processing_started']}")
+    if data.get('processing_completed'):
+        print(f"🏁 Completed: {data['processing_completed']}")
+    
+    print(f"\n💾 Full results available in: {output_file}")
+
 if __name__ == "__main__":
     import sys
     
@@ -175,6 +239,10 @@ if __name__ == "__main__":
     else:
         output_file = "output.json"
     
+    if output_file.startswith(("http://", "https://")):
+        monitor_events(output_file)
+        sys.exit(0)
+    
     print("Choose an option:")
     print("1. Monitor progress in real-time")
     print("2. Show final summary")
@@ -0,0 +1,150 @@
+"""
+Bulk question generation from a CSV or JSONL query file.
+
+Each row needs a ``query`` field (and optionally an ``id``). Rows run through
+the shared question chain with bounded concurrency; every result is appended
+to a JSONL file as soon as it completes, and a failing row is retried on its
+own without affecting the rest of the batch.
+
+Usage:
+    python questions_genrator/bulk.py queries.csv -o questions.jsonl --concurrency 8 --retries 3
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+# Make the repo-level packages importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+# Generated questions are indexed in the question bank in batches of this size
+BANK_BATCH_SIZE = 100
+
+
+def load_queries(source: IO, file_name: str) -> List[Dict[str, str]]:
+    """
+    Read query rows from a CSV or JSONL file
+
+    Args:
+        source (IO): Open binary or text file
+        file_name (str): Name used to pick the format (``.csv`` or ``.jsonl``)
+
+    Returns:
+        List[Dict[str, str]]: Rows with ``id`` and ``query`` keys; rows without a query are skipped
+    """
+    text = source.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8-sig")
+
+    if file_name.lower().endswith(".csv"):
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    rows = []
+    for line_no, record in enumerate(records, 1):
+        query = (record.get("query") or "").strip()
+        if query:
+            rows.append({"id": str(record.get("id") or line_no), "query": query})
+    return rows
+
+
+def generate_bulk(
+    rows: List[Dict[str, str]],
+    output: IO,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
+    max_retries: int = DEFAULT_RETRIES,
+    chain: Any = None,
+    on_result: Optional[Callable[[Dict[str, Any], int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Generate a question for every row and stream results to ``output`` as JSONL
+
+    Args:
+        rows (List[Dict[str, str]]): Rows from :func:`load_queries`
+        output (IO): Text stream the JSONL records are written (and flushed) to
+        max_concurrency (int): Maximum number of requests in flight
+        max_retries (int): Attempts per row before it is recorded as failed
+        chain: Runnable to use instead of the shared question chain
+        on_result (Callable): Optional callback ``(record, completed, total)`` per finished row
+
+    Returns:
+        Dict[str, Any]: Run statistics (total, succeeded, failed, duration_seconds)
+    """
+    # LangChain and the provider SDKs load here, not when the CLI starts
+    from questions_genrator.generator import get_question_chain, save_to_question_bank
+
+    chain = (chain or get_question_chain()).with_retry(stop_after_attempt=max_retries)
+    inputs = [{"query": row["query"]} for row in rows]
+    stats = {"total": len(rows), "succeeded": 0, "failed": 0}
+    pending_bank = []
+    start_time = time.time()
+
+    results = chain.batch_as_completed(
+        inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    )
+    for completed, (index, result) in enumerate(results, 1):
+        row = rows[index]
+        if isinstance(result, Exception):
+            record = {"id": row["id"], "query": row["query"], "status": "error", "error": str(result)}
+            stats["failed"] += 1
+        else:
+            record = {"id": row["id"], "query": row["query"], "status": "ok", "result": result.model_dump()}
+            stats["succeeded"] += 1
+            pending_bank.append((row["query"], result))
+            if len(pending_bank) >= BANK_BATCH_SIZE:
+                save_to_question_bank(pending_bank)
+                pending_bank = []
+
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        if on_result:
+            on_result(record, completed, len(rows))
+
+    save_to_question_bank(pending_bank)
+    stats["duration_seconds"] = round(time.time() - start_time, 2)
+    return stats
+
+
+def default_output_path() -> str:
+    return f"bulk_questions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate structured questions for every query in a CSV/JSONL file")
+    parser.add_argument("input", help="CSV (with a 'query' column) or JSONL file of queries")
+    parser.add_argument("-o", "--output", help="JSONL file to write results to")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum requests in flight")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Attempts per query before giving up")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    with open(args.input, "rb") as f:
+        rows = load_queries(f, args.input)
+
+    output_path = args.output or default_output_path()
+    print(f"🚀 Generating {len(rows)} questions (concurrency={args.concurrency}, retries={args.retries})")
+
+    def report(record, completed, total):
+        marker = "✅" if record["status"] == "ok" else "❌"
+        print(f"{marker} [{completed}/{total}] {record['id']}")
+
+    with open(output_path, "w", encoding="utf-8") as output:
+        stats = generate_bulk(rows, output, args.concurrency, args.retries, on_result=report)
+
+    print(f"\n🎉 Done in {stats['duration_seconds']}s: {stats['succeeded']} succeeded, {stats['failed']} failed")
+    print(f"💾 Results written to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
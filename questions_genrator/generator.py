@@ -0,0 +1,252 @@
+"""
+Question generation chain shared by the Streamlit UI and batch tools.
+
+The chain (prompt with precomputed format instructions, ChatOpenAI on pooled
+keep-alive HTTP clients, and the Pydantic parser) is built once per process by
+:func:`get_question_chain`, so a warm request pays neither construction nor
+connection setup costs.
+"""
+
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+from pydantic import BaseModel, Field
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+
+from questions_genrator.semantic_cache import SemanticCache
+from shared.llm_backend import create_chat_model
+from shared.question_bank import get_question_bank, record_from_generated
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
+HTTP_TIMEOUT_SECONDS = 60.0
+
+class QuestionStructure(BaseModel):
+    """Structured model for educational question generation"""
+    question: str = Field(description="Generated educational question based on the user query")
+    class_level: str = Field(description="Grade/Class level (e.g., Class 10, Grade 12, College)", alias="class")
+    subject: str = Field(description="Subject name (e.g., Mathematics, Physics, Chemistry, Biology, English, History)")
+    topic: str = Field(description="Specific topic within the subject")
+    board: str = Field(description="Education board in India (e.g., CBSE, ICSE, State Board, IB, CAIE, NIOS)")
+    difficulty: str = Field(description="Difficulty level: Easy, Medium, or Hard")
+    concepts: List[str] = Field(description="List of key concepts that will be used to solve this question")
+    prerequisites: List[str] = Field(description="List of prerequisite knowledge/concepts needed to understand and solve this question")
+    learning_objective: str = Field(description="What students should learn from this question")
+    keywords: List[str] = Field(description="List of relevant keywords for the question")
+
+def create_http_clients():
+    """Create keep-alive pooled HTTP clients shared by every request of the process"""
+    timeout = httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10.0)
+    return (
+        httpx.Client(limits=HTTP_POOL_LIMITS, timeout=timeout),
+        httpx.AsyncClient(limits=HTTP_POOL_LIMITS, timeout=timeout),
+    )
+
+def create_llm():
+    """Create the OpenAI chat model (live, recording or replaying, per LLM_BACKEND) on the pooled HTTP clients"""
+    http_client, http_async_client = create_http_clients()
+    return create_chat_model(
+        "openai",
+        "gpt-4o-mini",
+        temperature=0.3,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+def create_prompt(parser):
+    """Create the prompt template with the parser's format instructions bound"""
+    return ChatPromptTemplate.from_messages([
+        ("system", """You are an educational expert based in India who analyzes queries and generates structured educational content.
+
+        Given a user query, you need to:
+        1. Generate a relevant educational question based on the query
+        2. Classify the question with appropriate metadata
+        
+        For the BOARD field, you MUST choose ONLY from these Indian education boards:
+        
+        **National Boards:**
+        - CBSE (Central Board of Secondary Education)
+        - ICSE (Indian Certificate of Secondary Education) 
+        - ISC (Indian School Certificate)
+        - NIOS (National Institute of Open Schooling)
+        
+        **International Boards (in India):**
+        - IB (International Baccalaureate)
+        - CAIE (Cambridge Assessment International Education)
+        
+        **State Boards:**
+        - Maharashtra State Board
+        - Karnataka State Board
+        - Andhra Pradesh State Board
+        - Uttar Pradesh State Board
+        - West Bengal State Board
+        - Gujarat State Board
+        - Tamil Nadu State Board
+        - Rajasthan State Board
+        - Madhya Pradesh State Board
+        - Bihar State Board
+        - Assam State Board
+        - Or any other specific state board (mention the state name + "State Board")
+        
+        Choose the most appropriate board based on the content level, subject, and typical curriculum alignment.
+        
+        Make sure to provide appropriate educational classifications based on the content and complexity of the query.
+        
+        {format_instructions}"""),
+        ("human", "User Query: {query}")
+    ]).partial(format_instructions=parser.get_format_instructions())
+
+def create_question_generator(llm=None):
+    """Create and configure the question generation chain"""
+    
+    # Initialize the OpenAI LLM
+    if llm is None:
+        llm = create_llm()
+    
+    # Create the Pydantic output parser
+    parser = PydanticOutputParser(pydantic_object=QuestionStructure)
+    
+    # Create the chain with structured output
+    chain = create_prompt(parser) | llm | parser
+    
+    return chain
+
+def create_streaming_question_generator(llm=None):
+    """
+    Create a chain that streams the question as progressively more complete dicts
+
+    The tolerant JSON parser re-parses the accumulated tokens on every chunk,
+    closing any unterminated strings/arrays, so each yielded dict holds every
+    field seen so far. Use :func:`validate_question` on the final dict.
+    """
+    if llm is None:
+        llm = create_llm()
+    
+    # Prompt still carries the Pydantic format instructions
+    prompt = create_prompt(PydanticOutputParser(pydantic_object=QuestionStructure))
+    return prompt | llm | JsonOutputParser()
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Return the process-wide chat model, shared by the regular and streaming chains"""
+    return create_llm()
+
+@lru_cache(maxsize=1)
+def get_question_chain():
+    """Return the process-wide question generation chain, building it on first use"""
+    return create_question_generator(get_llm())
+
+@lru_cache(maxsize=1)
+def get_streaming_question_chain():
+    """Return the process-wide streaming question chain, building it on first use"""
+    return create_streaming_question_generator(get_llm())
+
+def validate_question(fields: Dict[str, Any]) -> QuestionStructure:
+    """Validate a fully streamed dict into a :class:`QuestionStructure`"""
+    return QuestionStructure.model_validate(fields)
+
+@lru_cache(maxsize=1)
+def get_semantic_cache():
+    """Return the process-wide semantic result cache (configured from the environment)"""
+    ttl = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 24 * 3600))
+    return SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.85)),
+        ttl_seconds=ttl if ttl > 0 else None,
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+    )
+
+def save_to_question_bank(generated: List[Tuple[str, QuestionStructure]]) -> int:
+    """
+    Index generated (query, question) pairs in the question bank in one transaction
+
+    Indexing is best effort: a bank error is logged and never fails the generation that produced the questions.
+    """
+    try:
+        question_bank = get_question_bank()
+        if question_bank is None:
+            return 0
+        return question_bank.add_questions(
+            record_from_generated(result.model_dump(by_alias=True), query) for query, result in generated
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Could not save {len(generated)} generated questions to the question bank: {e}")
+        return 0
+
+def build_query(query: str, board: Optional[str] = None, class_level: Optional[str] = None) -> str:
+    """Append the optional board/class preferences to the user query"""
+    preferences = [f"{label}: {value}" for label, value in (("Board", board), ("Class", class_level)) if value]
+    return f"{query}\n({', '.join(preferences)})" if preferences else query
+
+def generate_question(
+    query: str,
+    board: Optional[str] = None,
+    class_level: Optional[str] = None,
+    use_cache: bool = True,
+    chain: Any = None,
+    save_to_bank: bool = True
+) -> Tuple[QuestionStructure, bool]:
+    """
+    Generate a question, serving near-identical queries from the semantic cache
+
+    Cache entries are scoped by board and class, so the same wording asked for
+    a different board or class is generated separately. ``chain`` overrides the
+    shared question chain (e.g. one built on a stub model); ``save_to_bank=False``
+    keeps its output out of the question bank.
+
+    Returns:
+        Tuple[QuestionStructure, bool]: The question and whether it came from the cache
+    """
+    cache = get_semantic_cache()
+    scope = (board or "", class_level or "")
+    if use_cache:
+        cached = cache.lookup(query, scope)
+        if cached is not None:
+            return cached, True
+
+    result = (chain or get_question_chain()).invoke({"query": build_query(query, board, class_level)})
+    cache.store(query, result, scope)
+    if save_to_bank:
+        save_to_question_bank([(query, result)])
+    return result, False
+
+class StreamUpdate(NamedTuple):
+    """One step of :func:`stream_question`"""
+    fields: Dict[str, Any]
+    result: Optional[QuestionStructure]
+    from_cache: bool
+
+def stream_question(
+    query: str,
+    board: Optional[str] = None,
+    class_level: Optional[str] = None,
+    use_cache: bool = True
+) -> Iterator[StreamUpdate]:
+    """
+    Stream a question field by field, validating it once generation finishes
+
+    Yields partial updates (``result`` is None) while tokens arrive, then a
+    final update carrying the validated :class:`QuestionStructure`. Cache hits
+    yield only the final update.
+    """
+    cache = get_semantic_cache()
+    scope = (board or "", class_level or "")
+    if use_cache:
+        cached = cache.lookup(query, scope)
+        if cached is not None:
+            yield StreamUpdate(cached.model_dump(by_alias=True), cached, True)
+            return
+
+    fields: Dict[str, Any] = {}
+    for fields in get_streaming_question_chain().stream({"query": build_query(query, board, class_level)}):
+        yield StreamUpdate(fields, None, False)
+
+    result = validate_question(fields)
+    cache.store(query, result, scope)
+    save_to_question_bank([(query, result)])
+    yield StreamUpdate(result.model_dump(by_alias=True), result, False)
@@ -1,146 +1,242 @@
 import streamlit as st
 import json
 import os
+import sys
 from datetime import datetime
-from typing import List
-from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-class QuestionStructure(BaseModel):
-    """Structured model for educational question generation"""
-    question: str = Field(description="Generated educational question based on the user query")
-    class_level: str = Field(description="Grade/Class level (e.g., Class 10, Grade 12, College)", alias="class")
-    subject: str = Field(description="Subject name (e.g., Mathematics, Physics, Chemistry, Biology, English, History)")
-    topic: str = Field(description="Specific topic within the subject")
-    board: str = Field(description="Education board in India (e.g., CBSE, ICSE, State Board, IB, CAIE, NIOS)")
-    difficulty: str = Field(description="Difficulty level: Easy, Medium, or Hard")
-    concepts: List[str] = Field(description="List of key concepts that will be used to solve this question")
-    prerequisites: List[str] = Field(description="List of prerequisite knowledge/concepts needed to understand and solve this question")
-    learning_objective: str = Field(description="What students should learn from this question")
-    keywords: List[str] = Field(description="List of relevant keywords for the question")
+# `streamlit run` only puts this script's folder on sys.path; add the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def create_question_generator():
-    """Create and configure the question generation chain"""
-    
-    # Initialize the OpenAI LLM
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.3,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-    
-    # Create the Pydantic output parser
-    parser = PydanticOutputParser(pydantic_object=QuestionStructure)
-    
-    # Create the prompt template with format instructions
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", """You are an educational expert based in India who analyzes queries and generates structured educational content.
+from questions_genrator.bulk import DEFAULT_CONCURRENCY, DEFAULT_RETRIES, default_output_path, generate_bulk, load_queries
+from questions_genrator.generator import QuestionStructure, get_semantic_cache, stream_question
+from shared.llm_backend import requires_api_key
 
-        Given a user query, you need to:
-        1. Generate a relevant educational question based on the query
-        2. Classify the question with appropriate metadata
-        
-        For the BOARD field, you MUST choose ONLY from these Indian education boards:
-        
-        **National Boards:**
-        - CBSE (Central Board of Secondary Education)
-        - ICSE (Indian Certificate of Secondary Education) 
-        - ISC (Indian School Certificate)
-        - NIOS (National Institute of Open Schooling)
-        
-        **International Boards (in India):**
-        - IB (International Baccalaureate)
-        - CAIE (Cambridge Assessment International Education)
-        
-        **State Boards:**
-        - Maharashtra State Board
-        - Karnataka State Board
-        - Andhra Pradesh State Board
-        - Uttar Pradesh State Board
-        - West Bengal State Board
-        - Gujarat State Board
-        - Tamil Nadu State Board
-        - Rajasthan State Board
-        - Madhya Pradesh State Board
-        - Bihar State Board
-        - Assam State Board
-        - Or any other specific state board (mention the state name + "State Board")
-        
-        Choose the most appropriate board based on the content level, subject, and typical curriculum alignment.
-        
-        Make sure to provide appropriate educational classifications based on the content and complexity of the query.
-        
-        {format_instructions}"""),
-        ("human", "User Query: {query}")
-    ])
-    
-    # Create the chain with structured output
-    chain = prompt_template | llm | parser
-    
-    return chain
+def render_list(placeholder, items, empty_message):
+    """Render a bullet list into a placeholder"""
+    with placeholder.container():
+        if items:
+            for item in items:
+                st.markdown(f"• {item}")
+        else:
+            st.info(empty_message)
 
-def display_structured_output(data: QuestionStructure):
-    """Display the structured output in a visually appealing format"""
+def render_keywords(placeholder, keywords):
+    if keywords:
+        placeholder.success(f"**Keywords:** {', '.join(keywords)}")
+    else:
+        placeholder.info("**Keywords:** No keywords specified")
+
+# How each output field is drawn into its placeholder (keys use the JSON aliases)
+FIELD_RENDERERS = {
+    "question": lambda p, v: p.markdown(f"**{v}**"),
+    "class": lambda p, v: p.info(f"**Class:** {v}"),
+    "subject": lambda p, v: p.info(f"**Subject:** {v}"),
+    "board": lambda p, v: p.info(f"**Board:** {v}"),
+    "topic": lambda p, v: p.success(f"**Topic:** {v}"),
+    "difficulty": lambda p, v: p.warning(f"**Difficulty:** {v}"),
+    "keywords": render_keywords,
+    "learning_objective": lambda p, v: p.markdown(f"*{v}*"),
+    "concepts": lambda p, v: render_list(p, v, "No key concepts specified"),
+    "prerequisites": lambda p, v: render_list(p, v, "No prerequisites specified"),
+}
+
+def create_output_placeholders():
+    """Lay out the output sections and return an empty placeholder per field"""
+    placeholders = {}
     
     # Main question display
     st.markdown("### 📚 Generated Question")
-    st.markdown(f"**{data.question}**")
+    placeholders["question"] = st.empty()
     
     # Create columns for metadata
     col1, col2, col3 = st.columns(3)
     
     with col1:
         st.markdown("#### 🎓 Academic Details")
-        st.info(f"**Class:** {data.class_level}")
-        st.info(f"**Subject:** {data.subject}")
-        st.info(f"**Board:** {data.board}")
+        for field in ("class", "subject", "board"):
+            placeholders[field] = st.empty()
     
     with col2:
         st.markdown("#### 📖 Content Details")
-        st.success(f"**Topic:** {data.topic}")
-        st.warning(f"**Difficulty:** {data.difficulty}")
+        for field in ("topic", "difficulty"):
+            placeholders[field] = st.empty()
     
     with col3:
         st.markdown("#### 🎯 Learning Info")
-        if data.keywords and len(data.keywords) > 0:
-            keywords_str = ", ".join(data.keywords)
-            st.success(f"**Keywords:** {keywords_str}")
-        else:
-            st.info("**Keywords:** No keywords specified")
+        placeholders["keywords"] = st.empty()
     
     # Learning objective
     st.markdown("#### 💡 Learning Objective")
-    st.markdown(f"*{data.learning_objective}*")
+    placeholders["learning_objective"] = st.empty()
     
     # New sections for concepts and prerequisites
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### 🧠 Key Concepts")
-        if data.concepts and len(data.concepts) > 0:
-            for concept in data.concepts:
-                st.markdown(f"• {concept}")
-        else:
-            st.info("No key concepts specified")
+        placeholders["concepts"] = st.empty()
     
     with col2:
         st.markdown("#### 📋 Prerequisites")
-        if data.prerequisites and len(data.prerequisites) > 0:
-            for prerequisite in data.prerequisites:
-                st.markdown(f"• {prerequisite}")
-        else:
-            st.info("No prerequisites specified")
+        placeholders["prerequisites"] = st.empty()
+    
+    return placeholders
+
+def render_output_fields(placeholders, fields, rendered, finished=False):
+    """
+    Draw every field that has finished streaming and not been drawn yet
+
+    While streaming, the last key in ``fields`` may still be growing, so it is
+    only drawn once a later key appears or the stream has finished.
+    """
+    keys = list(fields)
+    complete = keys if finished else keys[:-1]
+    for field in complete:
+        if field in FIELD_RENDERERS and field not in rendered:
+            FIELD_RENDERERS[field](placeholders[field], fields[field])
+            rendered.add(field)
+
+def display_structured_output(data: QuestionStructure):
+    """Display the structured output in a visually appealing format"""
+    placeholders = create_output_placeholders()
+    render_output_fields(placeholders, data.model_dump(by_alias=True), set(), finished=True)
     
     # Display raw data in expander
     with st.expander("📋 View Raw Data"):
         st.json(data.model_dump())
 
+def stream_structured_output(updates):
+    """
+    Render a streamed question field by field as each one completes
+
+    Returns:
+        Tuple[QuestionStructure, bool]: The validated question and whether it came from the cache
+    """
+    status = st.empty()
+    status.caption("🔄 Generating structured question...")
+    placeholders = create_output_placeholders()
+    rendered = set()
+    
+    for update in updates:
+        if update.result is not None:
+            # Final, validated result: redraw from it so every field matches
+            rendered.clear()
+            render_output_fields(placeholders, update.result.model_dump(by_alias=True), rendered, finished=True)
+            status.empty()
+            with st.expander("📋 View Raw Data"):
+                st.json(update.result.model_dump())
+            return update.result, update.from_cache
+        render_output_fields(placeholders, update.fields, rendered)
+    
+    raise RuntimeError("Generation finished without a result")
+
+def single_query_ui():
+    """Generate and display a question for one query typed into the text area"""
+    # Query input
+    st.markdown("### 🔍 Enter Your Query")
+    query = st.text_area(
+        "",
+        placeholder="e.g., 'Explain photosynthesis process in plants' or 'Solve quadratic equations with examples'",
+        height=100
+    )
+
+    with st.expander("🎯 Scope (optional)"):
+        col1, col2 = st.columns(2)
+        with col1:
+            board = st.text_input("Board", placeholder="e.g., CBSE").strip()
+        with col2:
+            class_level = st.text_input("Class", placeholder="e.g., Class 10").strip()
+        bypass_cache = st.checkbox("Always generate a fresh question (skip the semantic cache)")
+
+    # Generate button
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        generate_btn = st.button("🚀 Generate Question", type="primary", use_container_width=True)
+
+    # Process query
+    if generate_btn and query.strip():
+        try:
+            # Stream the structured output (near-identical queries are served from cache)
+            st.markdown("---")
+            result, from_cache = stream_structured_output(stream_question(
+                query, board=board or None, class_level=class_level or None, use_cache=not bypass_cache
+            ))
+            if from_cache:
+                st.info("⚡ Served from the semantic cache (a similar query was answered recently)")
+
+            # Save option
+            st.markdown("---")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("💾 Save to File"):
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    filename = f"question_output_{timestamp}.json"
+                    with open(filename, 'w') as f:
+                        json.dump(result.model_dump(), f, indent=2)
+                    st.success(f"✅ Saved as {filename}")
+
+            with col2:
+                # Download button
+                json_str = json.dumps(result.model_dump(), indent=2)
+                st.download_button(
+                    label="📥 Download JSON",
+                    data=json_str,
+                    file_name=f"question_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json"
+                )
+
+        except Exception as e:
+            st.error(f"❌ Error generating question: {str(e)}")
+            st.info("💡 Please check your API key and try again")
+
+    elif generate_btn and not query.strip():
+        st.warning("⚠️ Please enter a query to generate a question!")
+
+def bulk_generation_ui():
+    """Generate questions for every query in an uploaded CSV/JSONL file"""
+    st.markdown("### 📦 Bulk Generation")
+    st.markdown("Upload a CSV with a `query` column (optional `id`) or a JSONL file with one `{\"query\": ...}` object per line.")
+    
+    uploaded_file = st.file_uploader("Query file", type=["csv", "jsonl"], key="bulk_query_file")
+    col1, col2 = st.columns(2)
+    with col1:
+        concurrency = st.number_input("Concurrent requests", min_value=1, max_value=64, value=DEFAULT_CONCURRENCY)
+    with col2:
+        retries = st.number_input("Attempts per query", min_value=1, max_value=10, value=DEFAULT_RETRIES)
+    
+    if st.button("🚀 Generate All", type="primary", use_container_width=True, disabled=uploaded_file is None):
+        rows = load_queries(uploaded_file, uploaded_file.name)
+        if not rows:
+            st.warning("⚠️ No queries found in the uploaded file!")
+            return
+        
+        progress_bar = st.progress(0, text=f"Generating {len(rows)} questions...")
+        failures = st.empty()
+        failed_ids = []
+        
+        def on_result(record, completed, total):
+            if record["status"] == "error":
+                failed_ids.append(record["id"])
+                failures.warning(f"⚠️ Failed rows so far: {', '.join(failed_ids)}")
+            progress_bar.progress(completed / total, text=f"Completed {completed}/{total}")
+        
+        output_path = default_output_path()
+        with open(output_path, "w", encoding="utf-8") as output:
+            stats = generate_bulk(rows, output, int(concurrency), int(retries), on_result=on_result)
+        
+        st.success(f"✅ {stats['succeeded']} succeeded, {stats['failed']} failed in {stats['duration_seconds']}s. Saved as {output_path}")
+        with open(output_path, "rb") as f:
+            st.download_button(
+                label="📥 Download JSONL",
+                data=f.read(),
+                file_name=os.path.basename(output_path),
+                mime="application/jsonl"
+            )
+
 def main():
     # Page configuration
     st.set_page_config(
@@ -150,8 +246,9 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Check if API key is available
+    # Check if API key is available (replayed runs need none)
     api_key = os.getenv("OPENAI_API_KEY")
+    replaying = not requires_api_key()
     
     # Title and description
     st.title("📚 Vedantu - Question Generator")
@@ -163,12 +260,22 @@ def main():
         st.header("⚙️ Configuration")
         
         # API Key status
-        if api_key:
+        if replaying:
+            st.info("▶️ Replaying recorded LLM responses (LLM_BACKEND=replay)")
+        elif api_key:
             st.success("✅ OpenAI API Key loaded from environment")
         else:
             st.error("❌ OpenAI API Key not found in environment")
             st.info("💡 Please add OPENAI_API_KEY to your .env file")
         
+        cache_stats = get_semantic_cache().stats()
+        st.markdown("---")
+        st.markdown("### ⚡ Semantic Cache")
+        st.caption(
+            f"Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits / {cache_stats['misses']} misses) · "
+            f"{cache_stats['size']} entries"
+        )
+        
         st.markdown("---")
         st.markdown("### 📝 How it works:")
         st.markdown("""
@@ -188,68 +295,12 @@ def main():
         """)
     
     # Main interface
-    if api_key:
-        # Query input
-        st.markdown("### 🔍 Enter Your Query")
-        query = st.text_area(
-            "",
-            placeholder="e.g., 'Explain photosynthesis process in plants' or 'Solve quadratic equations with examples'",
-            height=100
-        )
-        
-        # Generate button
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            generate_btn = st.button("🚀 Generate Question", type="primary", use_container_width=True)
-        
-        # Process query
-        if generate_btn and query.strip():
-            try:
-                with st.spinner("🔄 Generating structured question..."):
-                    # Create question generator
-                    question_chain = create_question_generator()
-                    
-                    # Create parser for format instructions
-                    parser = PydanticOutputParser(pydantic_object=QuestionStructure)
-                    
-                    # Generate structured output
-                    result = question_chain.invoke({
-                        "query": query,
-                        "format_instructions": parser.get_format_instructions()
-                    })
-                    
-                    # Display results
-                    st.markdown("---")
-
-                    display_structured_output(result)
-                    
-                    # Save option
-                    st.markdown("---")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("💾 Save to File"):
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            filename = f"question_output_{timestamp}.json"
-                            with open(filename, 'w') as f:
-                                json.dump(result.model_dump(), f, indent=2)
-                            st.success(f"✅ Saved as {filename}")
-                    
-                    with col2:
-                        # Download button
-                        json_str = json.dumps(result.model_dump(), indent=2)
-                        st.download_button(
-                            label="📥 Download JSON",
-                            data=json_str,
-                            file_name=f"question_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json"
-                        )
-                        
-            except Exception as e:
-                st.error(f"❌ Error generating question: {str(e)}")
-                st.info("💡 Please check your API key and try again")
-        
-        elif generate_btn and not query.strip():
-            st.warning("⚠️ Please enter a query to generate a question!")
+    if api_key or replaying:
+        single_tab, bulk_tab = st.tabs(["🔍 Single Query", "📦 Bulk Upload"])
+        with single_tab:
+            single_query_ui()
+        with bulk_tab:
+            bulk_generation_ui()
     
     else:
         st.info("� Please add your OpenAI API key to the .env file to get started")
@@ -0,0 +1,216 @@
+"""
+Semantic result cache for the question generator.
+
+Queries are normalized and embedded with a hashed bag-of-features vectorizer
+(word unigrams/bigrams and character trigrams, no external dependencies). A
+SimHash signature split into bands acts as an approximate nearest-neighbour
+index: only entries sharing at least one band with the query are compared by
+cosine similarity. Entries are scoped (e.g. by board and class), expire after a
+TTL and are evicted least-recently-used once the cache is full.
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from give how i in is it me of on or
+please explain show some tell that the this to what with about
+""".split())
+
+VECTOR_DIMENSIONS = 1 << 18
+SIGNATURE_BITS = 64
+BANDS = 8
+BAND_BITS = SIGNATURE_BITS // BANDS
+# Below this many entries in a scope an exact scan is cheaper than the index
+EXACT_SCAN_LIMIT = 64
+
+SparseVector = Dict[int, float]
+
+
+def _stem(token: str) -> str:
+    if len(token) > 6 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def normalize_query(query: str) -> List[str]:
+    """Lowercase, strip punctuation and stopwords, and lightly stem the query."""
+    tokens = re.findall(r"[a-z0-9]+", query.lower())
+    return [_stem(token) for token in tokens if token not in STOPWORDS]
+
+
+def _feature_hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+def _features(tokens: List[str]) -> Dict[str, float]:
+    features: Dict[str, float] = {}
+    for token in tokens:
+        features["w:" + token] = features.get("w:" + token, 0.0) + 1.0
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            gram = "c:" + padded[i:i + 3]
+            features[gram] = features.get(gram, 0.0) + 0.25
+    for first, second in zip(tokens, tokens[1:]):
+        bigram = f"b:{first} {second}"
+        features[bigram] = features.get(bigram, 0.0) + 0.5
+    return features
+
+
+def embed(tokens: List[str]) -> Tuple[SparseVector, int]:
+    """Return the L2-normalized sparse vector and 64-bit SimHash signature of the tokens."""
+    vector: SparseVector = {}
+    bit_weights = [0.0] * SIGNATURE_BITS
+    for feature, weight in _features(tokens).items():
+        feature_hash = _feature_hash(feature)
+        index = feature_hash % VECTOR_DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + weight
+        # Two independent 32-bit hashes make up the 64 signature bits
+        feature_bits = feature_hash | (_feature_hash(feature[::-1] + "~") << 32)
+        for bit in range(SIGNATURE_BITS):
+            bit_weights[bit] += weight if feature_bits >> bit & 1 else -weight
+
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    vector = {index: value / norm for index, value in vector.items()}
+    signature = sum(1 << bit for bit, weight in enumerate(bit_weights) if weight > 0)
+    return vector, signature
+
+
+def cosine(a: SparseVector, b: SparseVector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+def _bands(signature: int) -> List[Tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(band, signature >> (band * BAND_BITS) & mask) for band in range(BANDS)]
+
+
+class _Entry:
+    __slots__ = ("entry_id", "scope", "query", "vector", "signature", "value", "created_at")
+
+    def __init__(self, entry_id, scope, query, vector, signature, value):
+        self.entry_id = entry_id
+        self.scope = scope
+        self.query = query
+        self.vector = vector
+        self.signature = signature
+        self.value = value
+        self.created_at = time.monotonic()
+
+
+class SemanticCache:
+    """
+    Approximate query -> result cache with TTL and LRU eviction
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit
+        ttl_seconds (float): Entry lifetime; ``None`` disables expiry
+        max_entries (int): Capacity before least-recently-used entries are evicted
+    """
+
+    def __init__(self, threshold: float = 0.85, ttl_seconds: Optional[float] = 24 * 3600, max_entries: int = 10000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._scope_entries: Dict[Hashable, Set[int]] = {}
+        self._index: Dict[Tuple[Hashable, int, int], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(self, query: str, scope: Hashable = ()) -> Optional[Any]:
+        """Return the cached value for the most similar query in ``scope``, or None."""
+        vector, signature = embed(normalize_query(query))
+        with self._lock:
+            best, best_score = None, self.threshold
+            for entry_id in self._candidates(scope, signature):
+                entry = self._entries[entry_id]
+                if self._expired(entry):
+                    self._remove(entry)
+                    self.expirations += 1
+                    continue
+                score = cosine(vector, entry.vector)
+                if score >= best_score:
+                    best, best_score = entry, score
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best.entry_id)
+            return best.value
+
+    def store(self, query: str, value: Any, scope: Hashable = ()) -> None:
+        """Cache ``value`` as the result for ``query`` within ``scope``."""
+        vector, signature = embed(normalize_query(query))
+        with self._lock:
+            entry = _Entry(self._next_id, scope, query, vector, signature, value)
+            self._next_id += 1
+            self._entries[entry.entry_id] = entry
+            self._scope_entries.setdefault(scope, set()).add(entry.entry_id)
+            for band in _bands(signature):
+                self._index.setdefault((scope,) + band, set()).add(entry.entry_id)
+
+            while len(self._entries) > self.max_entries:
+                _, oldest = self._entries.popitem(last=False)
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._scope_entries.clear()
+            self._index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _candidates(self, scope: Hashable, signature: int) -> List[int]:
+        scope_ids = self._scope_entries.get(scope, set())
+        if len(scope_ids) <= EXACT_SCAN_LIMIT:
+            return list(scope_ids)
+        candidates: Set[int] = set()
+        for band in _bands(signature):
+            candidates |= self._index.get((scope,) + band, set())
+        return list(candidates)
+
+    def _remove(self, entry: _Entry) -> None:
+        self._entries.pop(entry.entry_id, None)
+        scope_ids = self._scope_entries.get(entry.scope)
+        if scope_ids is not None:
+            scope_ids.discard(entry.entry_id)
+            if not scope_ids:
+                del self._scope_entries[entry.scope]
+        for band in _bands(entry.signature):
+            key = (entry.scope,) + band
+            bucket = self._index.get(key)
+            if bucket is not None:
+                bucket.discard(entry.entry_id)
+                if not bucket:
+                    del self._index[key]
@@ -1,65 +1,90 @@
+"""
+Sliding-window question extraction from PDFs with Gemini
+
+Heavy SDKs (PyPDF2, LangChain and the provider clients, pydantic) are imported
+inside the stage that needs them, so importing this module, and starting the
+CLIs and workers built on it, stays cheap. ``python import_benchmark.py``
+checks that this keeps holding.
+"""
+
 import os
-import PyPDF2
-from typing import List, Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import HumanMessage
-from langchain_core.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+import sys
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from dotenv import load_dotenv
 import json
 import logging
 import time
 from datetime import datetime
 
+# Make the repo-level ``shared`` helpers importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.cancellation import (CancellationToken, ExtractionCancelled, call_timeout_from_env,
+                                 document_timeout_from_env, invoke_with_timeout)
+from shared.json_repair import JSONRecoveryError, reformat_json_with_llm, repair_json
+from shared.log_setup import configure_logging, log_fields
+from shared.ndjson_export import NDJSONExporter
+from shared.page_context import boundary_context
+from shared.progress_events import get_progress_bus, start_event_server
+from shared.question_bank import QuestionBank, get_question_bank, records_from_window_result
+from shared.token_accounting import BudgetExceededError, TokenLedger
+
+if TYPE_CHECKING:
+    from shared.page_router import RoutedPage
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Pydantic models for structured output
-class Question(BaseModel):
-    """Model for a single question"""
-    question_text: str = Field(description="The exact text of the question")
-    question_type: str = Field(description="Type of question (multiple choice, short answer, essay, problem-solving, etc.)")
-    subject_topic: str = Field(description="Subject or topic area of the question")
-    difficulty_level: str = Field(description="Difficulty level (beginner, intermediate, advanced)")
-    context: str = Field(description="Brief context or surrounding information where the question appears")
 
-class QuestionExtractionResult(BaseModel):
-    """Model for the complete question extraction result"""
-    questions: List[Question] = Field(description="List of extracted questions")
-    summary: str = Field(description="Brief summary of the content analyzed")
-    total_questions_found: int = Field(description="Total number of questions found")
+def __getattr__(name):
+    # The schemas moved to shared.question_schema; loaded on first access
+    if name in ("Question", "QuestionExtractionResult"):
+        from shared import question_schema
+        return getattr(question_schema, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+MODEL_NAME = "gemini-2.5-flash"
 
 class PDFQuestionExtractor:
     """
     A class to extract questions from PDF using sliding window approach with Gemini API
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, llm: Any = None, call_timeout: Optional[float] = None):
         """
         Initialize the PDF Question Extractor
         
         Args:
             api_key (str): Google API key for Gemini. If None, will look for GOOGLE_API_KEY env variable
+            llm: Chat model to use instead of Gemini (e.g. a stub for tests); no API key is needed then
+            call_timeout (float): Seconds a single model call may take (default: LLM_CALL_TIMEOUT env, else 120)
         """
+        from shared.llm_backend import create_chat_model, requires_api_key
+        from shared.question_schema import format_instructions
+        
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable or pass api_key parameter.")
-        
-        # Initialize Gemini model
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.0
-        )
+        self._downgrade_llms = {}
+        self._llm_injected = llm is not None
+        self.call_timeout = call_timeout if call_timeout is not None else call_timeout_from_env()
+        if llm is not None:
+            self.llm = llm
+            self.model_name = getattr(llm, "model", None) or getattr(llm, "model_name", None) or llm._llm_type
+        else:
+            if not self.api_key and requires_api_key():
+                raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable or pass api_key parameter.")
+            
+            # Initialize Gemini model (live, recording or replaying, per LLM_BACKEND)
+            self.model_name = MODEL_NAME
+            self.llm = create_chat_model("google", MODEL_NAME, temperature=0.0, api_key=self.api_key)
         
-        # Initialize structured output parser
-        self.output_parser = PydanticOutputParser(pydantic_object=QuestionExtractionResult)
+        # Schema validators are pre-built in shared.question_schema; only the instructions are kept
+        self.format_instructions = format_instructions()
     
-    def extract_text_from_pdf(self, pdf_path: str) -> List[str]:
+    # Text extraction and windowing need no model; they are static so they can run without one
+    @staticmethod
+    def extract_text_from_pdf(pdf_path: str) -> List[str]:
         """
         Extract text from each page of the PDF
         
@@ -69,6 +94,8 @@ class PDFQuestionExtractor:
         Returns:
             List[str]: List of text content from each page
         """
+        import PyPDF2
+        
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
@@ -78,7 +105,7 @@ class PDFQuestionExtractor:
                     page = pdf_reader.pages[page_num]
                     text = page.extract_text()
                     pages_text.append(text.strip())
-                    logger.info(f"Extracted text from page {page_num + 1}")
+                    logger.debug("Extracted text from page %d", page_num + 1)
                 
                 return pages_text
         
@@ -86,18 +113,50 @@ class PDFQuestionExtractor:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
     
-    def create_sliding_windows(self, pages_text: List[str], window_size: int = 3) -> List[Dict[str, Any]]:
+    @staticmethod
+    def extract_pages(pdf_path: str, page_source: str = "hybrid") -> List["RoutedPage"]:
+        """
+        Extract each page from its text layer, or through OCR where that layer is unusable
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            page_source (str): ``text``, ``hybrid`` or ``ocr`` (see shared/page_router.py)
+            
+        Returns:
+            List[RoutedPage]: One routed page per PDF page, in order
+        """
+        from shared.page_router import iter_routed_pages
+        from shared.pdf_splitter import PDFSplitter
+        
+        splitter = PDFSplitter.from_path(pdf_path)
+        batch_pages = int(os.getenv("OCR_BATCH_PAGES", "8"))
+        pages = []
+        for page in iter_routed_pages(splitter, page_source, batch_pages=batch_pages):
+            pages.append(page)
+            logger.debug("Page %d from %s (%s)", page.page_number, page.source,
+                         ", ".join(page.quality["reasons"]) or "text layer ok")
+        return pages
+    
+    @staticmethod
+    def create_sliding_windows(pages_text: List[str], window_size: int = 3,
+                               context_mode: str = "boundary") -> List[Dict[str, Any]]:
         """
         Create sliding windows of pages
         
         Args:
             pages_text (List[str]): List of text from each page
-            window_size (int): Size of the sliding window (default: 3)
+            window_size (int): Size of the sliding window in ``full`` mode (default: 3)
+            context_mode (str): ``boundary`` (default) adds only the fragments of the neighbouring
+                pages that a question crossing the page break needs; ``full`` joins whole pages
             
         Returns:
             List[Dict[str, Any]]: List of windows with metadata
         """
+        if context_mode not in ("boundary", "full"):
+            raise ValueError(f"Unknown context mode: {context_mode}")
+        
         windows = []
+        full_chars = sent_chars = 0
         
         for i in range(len(pages_text)):
             # Determine the window boundaries
@@ -106,9 +165,32 @@ class PDFQuestionExtractor:
             
             # Extract pages for current window
             window_pages = pages_text[start_page:end_page]
+            full_text = "\n\n=== PAGE BREAK ===\n\n".join(window_pages)
+            
+            if context_mode == "full":
+                combined_text = full_text
+            else:
+                # Only the parts of the neighbours a page-crossing question needs
+                previous_page = pages_text[i - 1] if i > 0 else None
+                next_page = pages_text[i + 1] if i + 1 < len(pages_text) else None
+                front, back = boundary_context(previous_page, pages_text[i], next_page)
+                parts = []
+                if front:
+                    parts.append(f"[End of page {i}]\n{front}")
+                    start_page = i - 1
+                else:
+                    start_page = i
+                parts.append(pages_text[i])
+                if back:
+                    parts.append(f"[Start of page {i + 2}]\n{back}")
+                    end_page = i + 2
+                else:
+                    end_page = i + 1
+                combined_text = "\n\n=== PAGE BREAK ===\n\n".join(parts)
+                window_pages = parts
             
-            # Combine text from all pages in the window
-            combined_text = "\n\n=== PAGE BREAK ===\n\n".join(window_pages)
+            full_chars += len(full_text)
+            sent_chars += len(combined_text)
             
             window_info = {
                 "window_id": i + 1,
@@ -119,23 +201,60 @@ class PDFQuestionExtractor:
             }
             
             windows.append(window_info)
-            logger.info(f"Created window {i + 1}: pages {start_page + 1}-{end_page}")
+            logger.debug("Created window %d: pages %d-%d (%d characters)", i + 1, start_page + 1, end_page, len(combined_text))
+        
+        if context_mode == "boundary" and full_chars:
+            logger.info(
+                "Boundary-aware context: %d of %d characters (%.0f%% of full-page windows)",
+                sent_chars, full_chars, 100 * sent_chars / full_chars,
+                extra=log_fields(context_chars=sent_chars, full_page_chars=full_chars)
+            )
         
         return windows
     
-    def extract_questions_from_window(self, window_text: str, window_info: Dict[str, Any]) -> Dict[str, Any]:
+    def llm_for_run(self, ledger: Optional[TokenLedger] = None):
+        """
+        Pick the model for the next call of a run
+        
+        Args:
+            ledger (TokenLedger): The run's ledger; its budget may request a cheaper model
+            
+        Returns:
+            Tuple[Any, str]: The chat model and its name (for pricing)
+            
+        Raises:
+            BudgetExceededError: If the run's budget is spent
+        """
+        if ledger is None or not ledger.check_budget() or self._llm_injected:
+            return self.llm, self.model_name
+        
+        model = ledger.downgrade_model
+        if model not in self._downgrade_llms:
+            logger.warning("💸 Budget exceeded; downgrading to %s", model)
+            from shared.llm_backend import create_chat_model
+            self._downgrade_llms[model] = create_chat_model("google", model, temperature=0.0, api_key=self.api_key)
+        return self._downgrade_llms[model], model
+    
+    def extract_questions_from_window(self, window_text: str, window_info: Dict[str, Any],
+                                      ledger: Optional[TokenLedger] = None,
+                                      cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         Extract questions from a window of pages using Gemini API with structured output
         
         Args:
             window_text (str): Combined text from the window
             window_info (Dict[str, Any]): Window metadata
+            ledger (TokenLedger): Optional run ledger the call's tokens and cost are recorded in
+            cancel_token (CancellationToken): Optional run token; cancelling it aborts the in-flight call
             
         Returns:
-            Dict[str, Any]: Extracted questions and metadata
+            Dict[str, Any]: Extracted questions and metadata (a call that times out gives an ``error`` result)
+            
+        Raises:
+            BudgetExceededError: If the run's budget is spent
+            ExtractionCancelled: If the run was cancelled or its deadline passed
         """
-        # Get format instructions from the parser
-        format_instructions = self.output_parser.get_format_instructions()
+        format_instructions = self.format_instructions
         
         prompt = f"""
         You are an expert educational content analyzer. Analyze the following text from pages {window_info['page_range']} of a document and extract all questions present in the content.
@@ -157,34 +276,56 @@ class PDFQuestionExtractor:
         {format_instructions}
         """
         
+        from langchain_core.messages import HumanMessage
+        from shared.question_schema import dump_questions, parse_extraction_result
+        
+        llm, model_name = self.llm_for_run(ledger)
+        usage = None
+        
         try:
             # Make API call to Gemini
             message = HumanMessage(content=prompt)
-            response = self.llm.invoke([message])
+            call_start = time.time()
+            response = invoke_with_timeout(llm, [message], self.call_timeout, cancel_token)
+            if ledger is not None:
+                usage = ledger.record(model_name, response, time.time() - call_start, window=window_info["window_id"])
             
-            # Parse the response using structured output parser
+            # Parse and validate the response in one pass
             try:
-                parsed_response = self.output_parser.parse(response.content)
+                parsed_response = parse_extraction_result(response.content)
                 
-                # Convert Pydantic model to dictionary
                 result_dict = {
-                    "questions": [q.model_dump() for q in parsed_response.questions],
+                    "questions": dump_questions(parsed_response.questions),
                     "summary": parsed_response.summary,
                     "total_questions_found": parsed_response.total_questions_found
                 }
                 
             except Exception as parse_error:
-                logger.warning(f"Failed to parse structured response for window {window_info['window_id']}: {str(parse_error)}")
+                logger.warning("Failed to parse structured response for window %s: %s", window_info['window_id'], parse_error)
                 
-                # Fallback: try to extract basic information from raw response
-                response_text = response.content
-                result_dict = {
-                    "questions": [],
-                    "summary": response_text[:500] + "..." if len(response_text) > 500 else response_text,
-                    "total_questions_found": 0,
-                    "raw_response": response_text,
-                    "parse_error": str(parse_error)
-                }
+                try:
+                    # Repair locally first, then re-format only the malformed output
+                    result_dict = self.recover_extraction_result(response.content, ledger, cancel_token,
+                                                                 llm=llm, model_name=model_name)
+                    logger.info(
+                        "Recovered %d questions for window %s via %s",
+                        result_dict["total_questions_found"], window_info['window_id'], result_dict["recovered_by"]
+                    )
+                    
+                except ExtractionCancelled:
+                    raise
+                except Exception as recovery_error:
+                    logger.warning("Could not recover response for window %s: %s", window_info['window_id'], recovery_error)
+                    
+                    # Fallback: try to extract basic information from raw response
+                    response_text = response.content
+                    result_dict = {
+                        "questions": [],
+                        "summary": response_text[:500] + "..." if len(response_text) > 500 else response_text,
+                        "total_questions_found": 0,
+                        "raw_response": response_text,
+                        "parse_error": str(parse_error)
+                    }
             
             # Add window metadata
             result_dict.update({
@@ -193,13 +334,17 @@ class PDFQuestionExtractor:
                 "page_range": window_info["page_range"],
                 "total_pages_in_window": window_info["total_pages_in_window"]
             })
+            if usage is not None:
+                result_dict["usage"] = usage
             
-            logger.info(f"Extracted {result_dict.get('total_questions_found', 0)} questions from window {window_info['window_id']}")
+            logger.debug("Extracted %s questions from window %s", result_dict.get('total_questions_found', 0), window_info['window_id'])
             
             return result_dict
             
+        except (BudgetExceededError, ExtractionCancelled):
+            raise
         except Exception as e:
-            logger.error(f"Error extracting questions from window {window_info['window_id']}: {str(e)}")
+            logger.error("Error extracting questions from window %s: %s", window_info['window_id'], e)
             return {
                 "window_id": window_info["window_id"],
                 "focus_page": window_info["focus_page"],
@@ -210,7 +355,76 @@ class PDFQuestionExtractor:
                 "error": str(e)
             }
     
-    def process_pdf(self, pdf_path: str, window_size: int = 3, output_path: str = "output.json") -> Dict[str, Any]:
+    def recover_extraction_result(self, response_text: str, ledger: Optional[TokenLedger] = None,
+                                  cancel_token: Optional[CancellationToken] = None,
+                                  llm: Any = None, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Recover questions from a response the structured parser rejected
+        
+        Local repairs (fences, trailing commas, truncation, partial arrays) are
+        tried first. Only if they yield no valid question is the model asked to
+        re-format the malformed output on its own, without the source pages.
+        Questions that still fail validation are dropped individually.
+        
+        Args:
+            response_text (str): Raw model response
+            ledger (TokenLedger): Optional run ledger the re-format call is recorded in
+            cancel_token (CancellationToken): Optional run token bounding the re-format call
+            llm: Model for the re-format call, e.g. the run's downgrade model (default: the extractor's)
+            model_name (str): Name ``llm`` is priced under in the ledger
+            
+        Returns:
+            Dict[str, Any]: Window result fields plus ``recovered_by``
+            
+        Raises:
+            JSONRecoveryError: If even the re-formatted output cannot be parsed
+        """
+        def question_items(value: Any) -> List[Any]:
+            if isinstance(value, list):
+                return value
+            return value.get("questions", []) if isinstance(value, dict) else []
+        
+        from shared.question_schema import dump_questions, validate_questions
+        
+        def valid_questions(items: List[Any]) -> List[Dict[str, Any]]:
+            return dump_questions(validate_questions(items))
+        
+        try:
+            value, method = repair_json(response_text)
+            items = question_items(value)
+            questions = valid_questions(items)
+            needs_reformat = bool(items) and not questions
+        except JSONRecoveryError:
+            needs_reformat = True
+        
+        if needs_reformat:
+            if llm is None:
+                llm, model_name = self.llm, self.model_name
+            
+            def record_usage(response, latency):
+                if ledger is not None:
+                    ledger.record(model_name or self.model_name, response, latency, purpose="reformat")
+            
+            reformatted = reformat_json_with_llm(
+                llm, response_text, self.format_instructions, on_response=record_usage,
+                timeout=self.call_timeout, cancel_token=cancel_token
+            )
+            value, _ = repair_json(reformatted)
+            method = "llm_reformat"
+            questions = valid_questions(question_items(value))
+        
+        return {
+            "questions": questions,
+            "summary": value.get("summary", "") if isinstance(value, dict) else "",
+            "total_questions_found": len(questions),
+            "recovered_by": method
+        }
+    
+    def process_pdf(self, pdf_path: str, window_size: int = 3, output_path: str = "output.json",
+                    question_bank: Optional[QuestionBank] = None, context_mode: str = "boundary",
+                    page_source: Optional[str] = None, export_dir: Optional[str] = None,
+                    job_id: Optional[str] = None, cancel_token: Optional[CancellationToken] = None,
+                    document_timeout: Optional[float] = None, resume: bool = False) -> Dict[str, Any]:
         """
         Process entire PDF with sliding window approach and incremental saving
         
@@ -218,48 +432,137 @@ class PDFQuestionExtractor:
             pdf_path (str): Path to the PDF file
             window_size (int): Size of the sliding window (default: 3)
             output_path (str): Path to save incremental results (default: "output.json")
+            question_bank (QuestionBank): Optional bank the extracted questions are ingested into
+            context_mode (str): ``boundary`` or ``full`` neighbour-page context (see create_sliding_windows)
+            page_source (str): ``text``, ``hybrid`` or ``ocr`` page text (default: PAGE_SOURCE env, else ``text``)
+            export_dir (str): Optional directory the questions are exported to as sharded NDJSON with an index
+            job_id (str): ID the run's progress events are tagged with (default: the token ledger's run ID)
+            cancel_token (CancellationToken): Optional token to stop the run from outside (a UI, a service job)
+            document_timeout (float): Seconds the whole document may take (default: DOCUMENT_TIMEOUT env, else none)
+            resume (bool): Continue a stopped run in ``output_path``, skipping its finished windows and
+                retrying its failed ones
             
         Returns:
-            Dict[str, Any]: Complete results from all windows
+            Dict[str, Any]: Complete results from all windows; a cancelled run is flushed with
+            ``processing_status`` ``cancelled`` and its ``pending_windows``
         """
         logger.info(f"Starting PDF processing: {pdf_path}")
         
         # Extract text from PDF
-        pages_text = self.extract_text_from_pdf(pdf_path)
+        page_source = page_source or os.getenv("PAGE_SOURCE", "text")
+        if page_source == "text":
+            pages_text = self.extract_text_from_pdf(pdf_path)
+            page_sources = None
+        else:
+            from shared.page_router import routing_summary
+            
+            pages = self.extract_pages(pdf_path, page_source)
+            pages_text = [page.markdown for page in pages]
+            page_sources = routing_summary(pages)
+            logger.info(
+                "🔀 %d pages from the text layer, %d via OCR %s", page_sources["text_layer"], page_sources["ocr"],
+                page_sources["ocr_pages"], extra=log_fields(page_sources=page_sources)
+            )
         logger.info(f"Extracted text from {len(pages_text)} pages")
         
         # Create sliding windows
-        windows = self.create_sliding_windows(pages_text, window_size)
+        windows = self.create_sliding_windows(pages_text, window_size, context_mode)
         logger.info(f"Created {len(windows)} sliding windows")
         
-        # Initialize the output file
-        self.initialize_output_file(
-            output_path=output_path,
-            pdf_path=pdf_path,
-            total_pages=len(pages_text),
-            window_size=window_size,
-            total_windows=len(windows)
-        )
+        ledger = TokenLedger.from_env(document=pdf_path)
+        job_id = job_id or ledger.run_id
+        events = get_progress_bus()
+        
+        def publish(event_type: str, **fields: Any):
+            events.publish(event_type, job=job_id, document=pdf_path, **fields)
+        
+        # Initialize the output file, or pick up where a stopped run left off
+        done_windows = self.resume_output_file(output_path, pdf_path, window_size, len(windows),
+                                               ledger) if resume else None
+        if done_windows is None:
+            done_windows = set()
+            self.initialize_output_file(
+                output_path=output_path,
+                pdf_path=pdf_path,
+                total_pages=len(pages_text),
+                window_size=window_size,
+                total_windows=len(windows),
+                page_sources=page_sources
+            )
+        elif done_windows:
+            logger.info("⏩ Resuming: %d of %d windows already done", len(done_windows), len(windows))
+        publish("document_started", total_pages=len(pages_text), total_windows=len(windows),
+                window_size=window_size, page_source=page_source, resumed_windows=len(done_windows))
+        status = "completed"
+        
+        # Deadline and cancellation for the whole document; cancelling the caller's token cancels it too
+        token = CancellationToken(document_timeout if document_timeout is not None else document_timeout_from_env(),
+                                  parent=cancel_token)
+        
+        def stop(window_idx: int, reason: str, stop_status: str):
+            pending = [w["window_id"] for w in windows if w["window_id"] not in done_windows]
+            self.mark_output_aborted(output_path, reason, ledger.summary(), status=stop_status, pending_windows=pending)
+            publish("window_finished", window=windows[window_idx - 1]["window_id"], window_index=window_idx,
+                    total_windows=len(windows), pages=windows[window_idx - 1]["page_range"], questions_found=0,
+                    error=reason)
+            logger.info("💾 Partial results saved; %d windows left to resume", len(pending))
         
         # Process each window with incremental saving
         for window_idx, window in enumerate(windows, 1):
-            logger.info(f"Processing window {window_idx}/{len(windows)}: pages {window['page_range']}")
+            if window["window_id"] in done_windows:
+                continue
+            logger.debug("Processing window %d/%d: pages %s", window_idx, len(windows), window['page_range'])
+            publish("window_started", window=window["window_id"], window_index=window_idx,
+                    total_windows=len(windows), pages=window["page_range"])
             
             try:
+                token.raise_if_cancelled()
+                
                 # Extract questions from current window
                 window_result = self.extract_questions_from_window(
                     window["combined_text"], 
-                    window
+                    window,
+                    ledger,
+                    token
                 )
                 
                 # Immediately save the window result
-                self.update_output_file_with_window(output_path, window_result)
+                self.update_output_file_with_window(output_path, window_result, ledger.summary())
+                done_windows.add(window["window_id"])
+                
+                usage = window_result.get("usage", {})
+                publish("window_finished", window=window["window_id"], window_index=window_idx,
+                        total_windows=len(windows), pages=window["page_range"],
+                        questions_found=window_result.get("total_questions_found", 0),
+                        input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0),
+                        cost_usd=usage.get("cost_usd", 0.0), error=window_result.get("error"))
+                
+                logger.info(
+                    "✅ Window %d completed and saved. Found %s questions.",
+                    window_idx, window_result.get('total_questions_found', 0),
+                    extra=log_fields(window=window_idx, pages=window['page_range'],
+                                     questions_found=window_result.get('total_questions_found', 0))
+                )
+                
+            except BudgetExceededError as e:
+                logger.error("🛑 Stopping before window %d: %s", window_idx, e, extra=log_fields(window=window_idx))
+                stop(window_idx, str(e), "aborted")
+                status = "aborted"
+                break
+                
+            except ExtractionCancelled as e:
+                logger.warning("⏹️ Stopping at window %d: %s", window_idx, e, extra=log_fields(window=window_idx))
+                stop(window_idx, str(e), "cancelled")
+                status = "cancelled"
+                break
                 
-                logger.info(f"✅ Window {window_idx} completed and saved. "
-                           f"Found {window_result.get('total_questions_found', 0)} questions.")
+            except KeyboardInterrupt:
+                token.cancel("Interrupted")
+                stop(window_idx, "Interrupted", "cancelled")
+                raise
                 
             except Exception as e:
-                logger.error(f"❌ Error processing window {window_idx}: {str(e)}")
+                logger.error("❌ Error processing window %d: %s", window_idx, e, extra=log_fields(window=window_idx))
                 # Save error result for this window
                 error_result = {
                     "window_id": window["window_id"],
@@ -271,6 +574,9 @@ class PDFQuestionExtractor:
                     "error": str(e)
                 }
                 self.update_output_file_with_window(output_path, error_result)
+                done_windows.add(window["window_id"])
+                publish("window_finished", window=window["window_id"], window_index=window_idx,
+                        total_windows=len(windows), pages=window["page_range"], questions_found=0, error=str(e))
         
         # Read final results from the output file
         try:
@@ -278,15 +584,43 @@ class PDFQuestionExtractor:
                 final_results = json.load(f)
             
             logger.info(f"🎉 PDF processing completed! Found {final_results['summary_stats']['total_questions_found']} total questions")
+            token_usage = ledger.summary()
+            logger.info(
+                "🧾 %d LLM calls, %d tokens, ~$%.4f", token_usage["calls"], token_usage["total_tokens"], token_usage["cost_usd"],
+                extra=log_fields(token_usage=token_usage)
+            )
+            from shared.hedging import hedging_enabled, hedging_stats
+            if hedging_enabled():
+                hedging = hedging_stats()
+                logger.info("🪁 Hedging: %s", hedging, extra=log_fields(hedging=hedging))
             logger.info(f"📁 Incremental results saved to: {output_path}")
             
-            return final_results
-            
         except Exception as e:
             logger.error(f"Error reading final results: {str(e)}")
+            publish("document_finished", status="failed", error=str(e))
             raise
+        
+        publish("document_finished", status=status, output_path=output_path,
+                windows_completed=final_results["windows_completed"],
+                questions_found=final_results["summary_stats"]["total_questions_found"],
+                token_usage=ledger.summary())
+        
+        if question_bank is not None:
+            records = []
+            for window_result in final_results["windows_results"]:
+                records.extend(records_from_window_result(window_result, pdf_path))
+            added = question_bank.add_questions(records)
+            logger.info(f"📚 Added {added} new questions to the question bank ({question_bank.path})")
+        
+        if export_dir:
+            with NDJSONExporter(export_dir) as exporter:
+                exported = exporter.add_results(final_results)
+            logger.info(f"📦 Exported {exported} questions to {export_dir}")
+        
+        return final_results
     
-    def initialize_output_file(self, output_path: str, pdf_path: str, total_pages: int, window_size: int, total_windows: int):
+    def initialize_output_file(self, output_path: str, pdf_path: str, total_pages: int, window_size: int, total_windows: int,
+                               page_sources: Optional[Dict[str, Any]] = None):
         """
         Initialize the output file with basic metadata
         
@@ -296,6 +630,7 @@ class PDFQuestionExtractor:
             total_pages (int): Total number of pages in PDF
             window_size (int): Size of sliding window
             total_windows (int): Total number of windows to process
+            page_sources (Dict[str, Any]): Text layer/OCR routing summary, when pages were routed
         """
         initial_structure = {
             "pdf_path": pdf_path,
@@ -312,6 +647,8 @@ class PDFQuestionExtractor:
             },
             "processing_started": datetime.now().isoformat()
         }
+        if page_sources is not None:
+            initial_structure["page_sources"] = page_sources
         
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
@@ -321,13 +658,15 @@ class PDFQuestionExtractor:
             logger.error(f"Error initializing output file: {str(e)}")
             raise
     
-    def update_output_file_with_window(self, output_path: str, window_result: Dict[str, Any]):
+    def update_output_file_with_window(self, output_path: str, window_result: Dict[str, Any],
+                                       token_usage: Optional[Dict[str, Any]] = None):
         """
         Update the output file with results from a completed window
         
         Args:
             output_path (str): Path to the output JSON file
             window_result (Dict[str, Any]): Results from the completed window
+            token_usage (Dict[str, Any]): Run token/cost totals so far, stored in ``summary_stats``
         """
         try:
             # Read current state
@@ -354,6 +693,9 @@ class PDFQuestionExtractor:
                     current_data["summary_stats"]["questions_by_difficulty"].get(q_difficulty, 0) + 1
                 )
             
+            if token_usage is not None:
+                current_data["summary_stats"]["token_usage"] = token_usage
+            
             # Update processing status
             if current_data["windows_completed"] >= current_data["total_windows"]:
                 current_data["processing_status"] = "completed"
@@ -363,13 +705,86 @@ class PDFQuestionExtractor:
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(current_data, f, indent=2, ensure_ascii=False)
             
-            logger.info(f"Updated output file with window {window_result['window_id']} results. "
-                       f"Progress: {current_data['windows_completed']}/{current_data['total_windows']}")
+            logger.debug(
+                "Updated output file with window %s results. Progress: %d/%d",
+                window_result['window_id'], current_data['windows_completed'], current_data['total_windows']
+            )
             
         except Exception as e:
             logger.error(f"Error updating output file with window {window_result.get('window_id', 'unknown')}: {str(e)}")
             raise
     
+    def mark_output_aborted(self, output_path: str, reason: str, token_usage: Dict[str, Any],
+                            status: str = "aborted", pending_windows: Optional[List[int]] = None):
+        """
+        Record in the output file that the run stopped early
+        
+        Args:
+            output_path (str): Path to the output JSON file
+            reason (str): Why the run stopped
+            token_usage (Dict[str, Any]): Run token/cost totals at the time of stopping
+            status (str): ``aborted`` (budget) or ``cancelled`` (token, deadline, interrupt)
+            pending_windows (List[int]): Windows not processed yet; ``process_pdf(resume=True)`` picks them up
+        """
+        with open(output_path, 'r', encoding='utf-8') as f:
+            current_data = json.load(f)
+        
+        current_data["processing_status"] = status
+        current_data["abort_reason"] = reason
+        current_data["summary_stats"]["token_usage"] = token_usage
+        current_data["processing_completed"] = datetime.now().isoformat()
+        if pending_windows is not None:
+            current_data["pending_windows"] = pending_windows
+            current_data["resumable"] = True
+        
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(current_data, f, indent=2, ensure_ascii=False)
+    
+    def resume_output_file(self, output_path: str, pdf_path: str, window_size: int, total_windows: int,
+                           ledger: Optional[TokenLedger] = None):
+        """
+        Reopen the output file of a stopped run so it can be continued
+        
+        Failed windows are dropped so they are retried; finished ones are kept.
+        ``ledger`` is seeded with the stopped run's token usage, so the budget
+        and the stored totals cover the whole document rather than restarting at zero.
+        
+        Args:
+            output_path (str): Path to the output JSON file
+            pdf_path (str): PDF being processed
+            window_size (int): Window size of this run
+            total_windows (int): Window count of this run
+            ledger (TokenLedger): This run's ledger
+            
+        Returns:
+            Optional[set]: IDs of the windows already done, or None if there is no matching run to resume
+        """
+        if not os.path.exists(output_path):
+            return None
+        with open(output_path, 'r', encoding='utf-8') as f:
+            current_data = json.load(f)
+        if (current_data.get("pdf_path"), current_data.get("window_size"), current_data.get("total_windows")) != \
+                (pdf_path, window_size, total_windows):
+            logger.warning("%s belongs to a different run; starting over", output_path)
+            return None
+        
+        if ledger is not None:
+            ledger.seed(current_data.get("summary_stats", {}).get("token_usage"))
+        kept = [w for w in current_data["windows_results"] if "error" not in w]
+        current_data["windows_results"] = kept
+        current_data["windows_completed"] = len(kept)
+        for key in ("abort_reason", "pending_windows", "resumable"):
+            current_data.pop(key, None)
+        if len(kept) < total_windows:
+            current_data["processing_status"] = "in_progress"
+            current_data.pop("processing_completed", None)
+        else:
+            current_data["processing_status"] = "completed"
+        
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(current_data, f, indent=2, ensure_ascii=False)
+        return {w["window_id"] for w in kept}
+    
     def save_results(self, results: Dict[str, Any], output_path: str):
         """
         Save complete results to JSON file (for backward compatibility)
@@ -394,6 +809,8 @@ def main():
     pdf_path = "sample.pdf"  # Replace with your PDF path
     output_path = "output.json"
     
+    configure_logging()
+    
     try:
         # Initialize extractor
         extractor = PDFQuestionExtractor()
@@ -403,11 +820,14 @@ def main():
         print(f"📄 PDF: {pdf_path}")
         print(f"💾 Output: {output_path}")
         print(f"⏰ Check {output_path} to see real-time progress!")
+        if start_event_server():
+            print(f"📡 Live progress: http://127.0.0.1:{os.environ['PROGRESS_EVENTS_PORT']}/events")
         
         results = extractor.process_pdf(
             pdf_path=pdf_path, 
             window_size=3,
-            output_path=output_path
+            output_path=output_path,
+            question_bank=get_question_bank()
         )
         
         # Print summary
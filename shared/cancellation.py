@@ -0,0 +1,191 @@
+"""
+Deadlines and cooperative cancellation for extraction runs.
+
+A :class:`CancellationToken` travels down a run: document, then window, then
+model call. It is cancelled explicitly (a Stop button, a cancelled service
+job, Ctrl+C) or by its deadline, and every stage checks it before starting
+work. :func:`invoke_with_timeout` runs a chat-model call as a task on one
+background event loop. It waits with the per-call timeout, the token's
+remaining time and the token's cancellation in view. When any of them trips,
+the task is cancelled, which aborts the request on async clients, and the
+caller is released at once instead of blocking on a stuck request.
+
+Environment variables:
+    LLM_CALL_TIMEOUT     Seconds a single model call may take (default 120; 0 disables)
+    DOCUMENT_TIMEOUT     Seconds a whole document may take (default: no limit)
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+DEFAULT_CALL_TIMEOUT = 120.0
+# How often a waiting call re-checks the token and runs its checkpoint
+POLL_INTERVAL = 0.5
+
+
+class ExtractionCancelled(Exception):
+    """The run's token was cancelled or its deadline passed."""
+
+
+class CallTimeoutError(TimeoutError):
+    """A single model call took longer than its timeout."""
+
+
+def _seconds_from_env(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    seconds = float(value)
+    return seconds if seconds > 0 else None
+
+
+def call_timeout_from_env() -> Optional[float]:
+    """Per-call timeout from LLM_CALL_TIMEOUT (None when disabled)."""
+    return _seconds_from_env("LLM_CALL_TIMEOUT", DEFAULT_CALL_TIMEOUT)
+
+
+def document_timeout_from_env() -> Optional[float]:
+    """Per-document deadline from DOCUMENT_TIMEOUT (None when unset)."""
+    return _seconds_from_env("DOCUMENT_TIMEOUT", None)
+
+
+class CancellationToken:
+    """
+    Cancellation flag with an optional deadline, shared by everything working on one run
+
+    Args:
+        timeout (float): Seconds from now until the token cancels itself (None: no deadline)
+        parent (CancellationToken): Cancelling the parent cancels this token too; its deadline also applies
+        checkpoint (Callable): Called every POLL_INTERVAL while a model call is awaited; it may raise
+            to abandon the call (e.g. a UI framework's stop signal)
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancellationToken"] = None,
+                 checkpoint: Optional[Callable[[], Any]] = None):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.checkpoint = checkpoint or (parent.checkpoint if parent is not None else None)
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        if parent is not None:
+            parent.add_callback(lambda: self.cancel(parent.reason))
+
+    def cancel(self, reason: str = "Cancelled"):
+        """Cancel the token (only the first reason is kept) and run its callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"Deadline exceeded ({self.timeout or 0:g}s)")
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline (None without one)."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ExtractionCancelled(self.reason)
+
+    def add_callback(self, callback: Callable[[], Any]):
+        """Run ``callback`` on cancellation (right away if the token is already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], Any]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def background_loop():
+    """The process-wide event loop model calls run on, so async clients stay bound to one loop."""
+    import asyncio
+
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-calls", daemon=True).start()
+        return _loop
+
+
+def invoke_with_timeout(llm: Any, messages: List[Any], timeout: Optional[float] = None,
+                        token: Optional[CancellationToken] = None) -> Any:
+    """
+    ``llm.invoke(messages)`` bounded by a timeout and a cancellation token
+
+    Args:
+        llm: LangChain chat model
+        messages (List[Any]): Messages for the call
+        timeout (float): Seconds the call may take (None: only the token bounds it)
+        token (CancellationToken): Run token; its deadline and cancellation abort the call
+
+    Returns:
+        Any: The model response
+
+    Raises:
+        CallTimeoutError: If the call took longer than ``timeout``
+        ExtractionCancelled: If the token was cancelled or its deadline passed
+    """
+    if token is not None:
+        token.raise_if_cancelled()
+    if timeout is None and token is None:
+        return llm.invoke(messages)
+
+    import asyncio
+    import concurrent.futures
+
+    future = asyncio.run_coroutine_threadsafe(llm.ainvoke(messages), background_loop())
+    started = time.monotonic()
+    if token is not None:
+        token.add_callback(future.cancel)
+    try:
+        while True:
+            waits = [POLL_INTERVAL]
+            if timeout is not None:
+                waits.append(timeout - (time.monotonic() - started))
+            if token is not None and token.deadline is not None:
+                waits.append(token.remaining())
+            try:
+                return future.result(timeout=max(0.0, min(waits)))
+            except concurrent.futures.TimeoutError:
+                pass
+            except concurrent.futures.CancelledError:
+                raise ExtractionCancelled(token.reason if token is not None else "Cancelled")
+            if token is not None:
+                token.raise_if_cancelled()
+                if token.checkpoint is not None:
+                    token.checkpoint()
+            if timeout is not None and time.monotonic() - started >= timeout:
+                raise CallTimeoutError(f"LLM call timed out after {timeout:g}s")
+    finally:
+        # Cancelling the task aborts the in-flight request
+        if not future.done():
+            future.cancel()
+        if token is not None:
+            token.remove_callback(future.cancel)
@@ -0,0 +1,192 @@
+"""
+Offline stand-ins for the chat models used by the pipelines.
+
+The stubs return canned, schema-valid payloads so the service and pipelines
+can run locally without API keys. :class:`LatencyFakeChatModel` also replays
+the response-time distribution recorded in ``pdf_question_extractor.log`` and
+answers with payloads taken from a real ``output.json``, for load testing.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field, PrivateAttr
+
+SAMPLE_EXTRACTION_RESULT = {
+    "questions": [
+        {
+            "question_text": "Find the area of the region bounded by the curve y = x^2 and the line y = 4.",
+            "question_type": "Problem-solving",
+            "subject_topic": "Application of Integrals",
+            "difficulty_level": "Intermediate",
+            "context": "Exercise 8.1, Question 1"
+        }
+    ],
+    "summary": "Exercise on areas bounded by curves.",
+    "total_questions_found": 1
+}
+
+SAMPLE_GENERATED_QUESTION = {
+    "question": "Solve the quadratic equation x^2 - 5x + 6 = 0 and verify both roots.",
+    "class": "Class 10",
+    "subject": "Mathematics",
+    "topic": "Quadratic Equations",
+    "board": "CBSE",
+    "difficulty": "Easy",
+    "concepts": ["Factorisation", "Zero product property"],
+    "prerequisites": ["Polynomials", "Linear equations"],
+    "learning_objective": "Solve quadratic equations by factorisation.",
+    "keywords": ["quadratic", "roots", "factorisation"]
+}
+
+LATENCY_PATTERN = re.compile(r"Gemini API response received for .*? in ([\d.]+) seconds")
+
+
+def stub_extraction_llm():
+    """Chat model that always answers with :data:`SAMPLE_EXTRACTION_RESULT`."""
+    return FakeListChatModel(responses=[json.dumps(SAMPLE_EXTRACTION_RESULT)])
+
+
+def stub_generation_llm():
+    """Chat model that always answers with :data:`SAMPLE_GENERATED_QUESTION`."""
+    return FakeListChatModel(responses=[json.dumps(SAMPLE_GENERATED_QUESTION)])
+
+
+def load_latency_samples(log_path: str) -> List[float]:
+    """
+    Model call durations (seconds) recorded in an extractor log
+
+    Both the plain-text format and the JSON-lines format written by
+    ``shared.log_setup`` are understood.
+    """
+    samples = []
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "latency_s" in entry and LATENCY_PATTERN.search(entry.get("msg", "")):
+                    samples.append(float(entry["latency_s"]))
+                    continue
+                line = entry.get("msg", "")
+            match = LATENCY_PATTERN.search(line)
+            if match:
+                samples.append(float(match.group(1)))
+    return samples
+
+
+def _output_questions(output_path: str) -> List[Dict[str, Any]]:
+    with open(output_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [w for w in data.get("windows_results", []) if not w.get("error") and "questions" in w]
+
+
+def extraction_payloads_from_output(output_path: str) -> List[str]:
+    """Extraction responses shaped like the model's answers, one per window of ``output.json``."""
+    payloads = [
+        json.dumps({
+            "questions": window["questions"],
+            "summary": window.get("summary", ""),
+            "total_questions_found": window.get("total_questions_found", len(window["questions"]))
+        }, ensure_ascii=False)
+        for window in _output_questions(output_path)
+    ]
+    return payloads or [json.dumps(SAMPLE_EXTRACTION_RESULT)]
+
+
+def generation_payloads_from_output(output_path: str) -> List[str]:
+    """Generated-question responses built from the questions found in ``output.json``."""
+    payloads = []
+    for window in _output_questions(output_path):
+        for q in window["questions"]:
+            payloads.append(json.dumps(dict(
+                SAMPLE_GENERATED_QUESTION,
+                question=q.get("question_text", SAMPLE_GENERATED_QUESTION["question"]),
+                topic=q.get("subject_topic", SAMPLE_GENERATED_QUESTION["topic"]),
+                difficulty=q.get("difficulty_level", SAMPLE_GENERATED_QUESTION["difficulty"]),
+            ), ensure_ascii=False))
+    return payloads or [json.dumps(SAMPLE_GENERATED_QUESTION)]
+
+
+class LatencyFakeChatModel(BaseChatModel):
+    """
+    Chat model that sleeps for a recorded latency and answers with a canned payload
+
+    Latencies are drawn at random from ``latencies`` and multiplied by
+    ``time_scale``; responses are returned in order, cycling. A fraction
+    ``error_rate`` of calls raise instead of answering.
+    """
+
+    responses: List[str]
+    latencies: List[float] = Field(default_factory=lambda: [0.0])
+    time_scale: float = 1.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+    _rng: Optional[random.Random] = PrivateAttr(default=None)
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-fake-chat-model"
+
+    def _next_call(self):
+        with self._lock:
+            if self._rng is None:
+                self._rng = random.Random(self.seed)
+            response = self.responses[self._calls % len(self.responses)]
+            self._calls += 1
+            delay = self._rng.choice(self.latencies) * self.time_scale
+            fail = self._rng.random() < self.error_rate
+        return response, delay, fail
+
+    @staticmethod
+    def _result(response: str, fail: bool) -> ChatResult:
+        if fail:
+            raise RuntimeError("Injected model failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        response, delay, fail = self._next_call()
+        time.sleep(delay)
+        return self._result(response, fail)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        response, delay, fail = self._next_call()
+        await asyncio.sleep(delay)
+        return self._result(response, fail)
+
+
+def latency_faithful_llms(
+    log_path: str = os.path.join("mistal_ocr_test", "pdf_question_extractor.log"),
+    output_path: str = "output.json",
+    time_scale: float = 1.0,
+    error_rate: float = 0.0,
+    seed: Optional[int] = None,
+):
+    """
+    Build the (extraction, generation) fake models from a recorded log and output file
+
+    Returns:
+        Tuple[LatencyFakeChatModel, LatencyFakeChatModel]: Models sharing the recorded latency profile
+    """
+    latencies = load_latency_samples(log_path) or [0.0]
+    options = dict(latencies=latencies, time_scale=time_scale, error_rate=error_rate, seed=seed)
+    return (
+        LatencyFakeChatModel(responses=extraction_payloads_from_output(output_path), **options),
+        LatencyFakeChatModel(responses=generation_payloads_from_output(output_path), **options),
+    )
@@ -0,0 +1,215 @@
+"""
+Hedged LLM requests to cut tail latency.
+
+When a call has not returned by the observed p90 latency of its model, a
+duplicate request is fired. Whichever finishes first wins and the other is
+cancelled: both run as asyncio tasks on the model's async client, so the
+losing HTTP request is actually aborted. Hedges are capped at a fraction of
+all calls, which bounds the extra spend, and every :class:`Hedger` keeps
+metrics on hedges fired, hedge wins and the latency distribution. The winning
+response records how many requests were sent (``hedge_requests`` in its
+response metadata), so token ledgers also bill the duplicate.
+
+Sync callers (the pipelines and Streamlit) run the hedged call on the
+process-wide background event loop (shared with the call timeouts in
+shared/cancellation.py), so async clients stay bound to a single loop.
+
+Environment variables:
+    LLM_HEDGE                on/off (default off); applies to every model from create_chat_model
+    LLM_HEDGE_PERCENTILE     Latency percentile that triggers a hedge (default 90)
+    LLM_HEDGE_MAX_EXTRA      Maximum hedges as a fraction of calls (default 0.1)
+    LLM_HEDGE_MIN_SAMPLES    Observed calls needed before hedging starts (default 10)
+    LLM_HEDGE_INITIAL_DELAY  Hedge delay in seconds until enough samples exist (default: no hedging)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from shared.cancellation import background_loop
+from shared.token_accounting import HEDGE_REQUESTS_KEY
+
+# Observed latencies kept per hedger for the percentile estimate
+LATENCY_WINDOW = 200
+
+
+def hedging_enabled() -> bool:
+    return os.getenv("LLM_HEDGE", "").strip().lower() in ("1", "on", "true", "yes")
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered), math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+class Hedger:
+    """
+    Hedging policy and metrics for one model
+
+    Args:
+        name (str): Label used in metrics (usually ``provider/model``)
+        percentile (float): Observed latency percentile after which a hedge fires
+        max_extra_fraction (float): Cap on hedges as a fraction of calls
+        min_samples (int): Completed calls needed before the percentile is trusted
+        initial_delay (float): Hedge delay used until ``min_samples`` calls completed (None: don't hedge yet)
+    """
+
+    def __init__(self, name: str, percentile: float = 90, max_extra_fraction: float = 0.1,
+                 min_samples: int = 10, initial_delay: Optional[float] = None):
+        self.name = name
+        self.percentile = percentile
+        self.max_extra_fraction = max_extra_fraction
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.metrics = {"calls": 0, "hedges_fired": 0, "hedge_wins": 0, "hedges_skipped_cap": 0, "cancelled": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> "Hedger":
+        initial_delay = os.getenv("LLM_HEDGE_INITIAL_DELAY")
+        return cls(
+            name,
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "90")),
+            max_extra_fraction=float(os.getenv("LLM_HEDGE_MAX_EXTRA", "0.1")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10")),
+            initial_delay=float(initial_delay) if initial_delay else None,
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging the next call, or None to not hedge."""
+        with self._lock:
+            if len(self.samples) >= self.min_samples:
+                return _percentile(list(self.samples), self.percentile)
+            return self.initial_delay
+
+    def _reserve_hedge(self) -> bool:
+        with self._lock:
+            if self.metrics["hedges_fired"] + 1 > self.max_extra_fraction * self.metrics["calls"]:
+                self.metrics["hedges_skipped_cap"] += 1
+                return False
+            self.metrics["hedges_fired"] += 1
+            return True
+
+    def _count(self, metric: str, amount: int = 1):
+        with self._lock:
+            self.metrics[metric] += amount
+
+    def _observe(self, latency: float):
+        with self._lock:
+            self.samples.append(latency)
+
+    async def ainvoke(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``call`` with hedging and return the first successful result
+
+        Args:
+            call (Callable): Creates a fresh request coroutine each time it is called
+
+        Raises:
+            Exception: The last error if every request failed
+        """
+        self._count("calls")
+        delay = self.hedge_delay()
+        started = {}
+        tasks = set()
+
+        def launch():
+            task = asyncio.ensure_future(call())
+            started[task] = time.monotonic()
+            tasks.add(task)
+            return task
+
+        primary = launch()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._reserve_hedge():
+                    launch()
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._observe(time.monotonic() - started[task])
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        result = task.result()
+                        metadata = getattr(result, "response_metadata", None)
+                        if len(tasks) > 1 and isinstance(metadata, dict):
+                            metadata[HEDGE_REQUESTS_KEY] = len(tasks)
+                        return result
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self._count("cancelled")
+
+    def invoke(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Blocking :meth:`ainvoke` for sync callers, run on the shared background loop."""
+        return asyncio.run_coroutine_threadsafe(self.ainvoke(call), background_loop()).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self.samples)
+            stats = dict(self.metrics)
+        stats["hedge_win_rate"] = round(stats["hedge_wins"] / stats["hedges_fired"], 3) if stats["hedges_fired"] else 0.0
+        for pct in (50, 90, 99):
+            value = _percentile(samples, pct)
+            stats[f"p{pct}_s"] = round(value, 3) if value is not None else None
+        return stats
+
+
+_hedgers: Dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def get_hedger(name: str) -> Hedger:
+    """Return the process-wide hedger for ``name``, so per-call model instances share latency history."""
+    with _hedgers_lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger.from_env(name)
+        return _hedgers[name]
+
+
+def hedging_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics of every hedger in the process, keyed by name."""
+    with _hedgers_lock:
+        hedgers = list(_hedgers.values())
+    return {hedger.name: hedger.stats() for hedger in hedgers}
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model wrapper that hedges ``invoke``/``ainvoke`` calls; streams pass straight through."""
+
+    inner: Any
+    hedger: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged-{self.inner._llm_type}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self.hedger.invoke(lambda: self.inner.ainvoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = await self.hedger.ainvoke(lambda: self.inner.ainvoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            yield ChatGenerationChunk(message=chunk)
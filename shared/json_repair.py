@@ -0,0 +1,210 @@
+"""
+Local JSON repair for malformed LLM output.
+
+Instead of discarding a window whose response does not parse, the recovery
+stage tries progressively more aggressive local fixes: code-fence stripping,
+trailing-comma removal, closing of truncated output, and salvage of the
+complete items of a partial array. Only if all of them fail does it fall back
+to a small re-formatting request that contains just the malformed output.
+
+Usage:
+    value, method = recover_json(response.content, reformat=lambda text: reformat_json_with_llm(llm, text))
+"""
+
+import json
+import logging
+import re
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Truncation repair tries at most this many cut points, from the end backwards
+MAX_TRUNCATION_ATTEMPTS = 200
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+REFORMAT_PROMPT = """The text below was meant to be valid JSON but could not be parsed.
+Rewrite it as valid JSON, keeping every value exactly as written and dropping only incomplete trailing items.
+Return only the JSON, with no explanation and no code fences.
+{format_instructions}
+--- MALFORMED OUTPUT ---
+{malformed}"""
+
+
+class JSONRecoveryError(ValueError):
+    """Raised when no repair strategy produced valid JSON."""
+
+
+def strip_code_fences(text: str) -> str:
+    """Return the body of the first fenced block, or the stripped text if there is none."""
+    text = text.strip()
+    match = FENCE_PATTERN.search(text)
+    return match.group(1).strip() if match else text
+
+
+def _outside_strings(text: str):
+    """Yield (index, char) for every character outside JSON string literals."""
+    in_string = escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        else:
+            if char == '"':
+                in_string = True
+            yield index, char
+
+
+def remove_trailing_commas(text: str) -> str:
+    """Drop commas that directly precede a closing bracket."""
+    drop = set()
+    pending_comma = None
+    for index, char in _outside_strings(text):
+        if char == ",":
+            pending_comma = index
+        elif char in "}]" and pending_comma is not None:
+            drop.add(pending_comma)
+            pending_comma = None
+        elif not char.isspace():
+            pending_comma = None
+    return "".join(char for index, char in enumerate(text) if index not in drop)
+
+
+def close_truncated(text: str) -> Optional[Any]:
+    """
+    Parse the longest prefix of truncated JSON that can be closed into a valid value
+
+    Cut points are taken just after each complete object/array and just before
+    each comma; at each one the still-open brackets are closed and parsing is
+    retried, from the end of the text backwards.
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, Tuple[str, ...]]] = []
+    for index, char in _outside_strings(text):
+        if char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((index + 1, tuple(stack)))
+        elif char == ",":
+            cuts.append((index, tuple(stack)))
+
+    for end, open_brackets in reversed(cuts[-MAX_TRUNCATION_ATTEMPTS:]):
+        candidate = text[:end].rstrip().rstrip(",") + "".join(_CLOSERS[b] for b in reversed(open_brackets))
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def salvage_array_items(text: str) -> Optional[List[Any]]:
+    """Decode the complete leading items of the first JSON array in ``text``."""
+    start = text.find("[")
+    if start < 0:
+        return None
+    decoder = json.JSONDecoder()
+    items: List[Any] = []
+    index = start + 1
+    while index < len(text):
+        while index < len(text) and text[index] in " \t\r\n,":
+            index += 1
+        if index >= len(text) or text[index] == "]":
+            break
+        try:
+            item, index = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    return items or None
+
+
+def repair_json(text: str) -> Tuple[Any, str]:
+    """
+    Parse ``text`` using local repairs only
+
+    Returns:
+        Tuple[Any, str]: The value and the strategy that produced it
+
+    Raises:
+        JSONRecoveryError: If no local strategy succeeds
+    """
+    body = strip_code_fences(text)
+    try:
+        return json.loads(body), "direct" if body == text.strip() else "fences"
+    except json.JSONDecodeError:
+        pass
+
+    body = remove_trailing_commas(body)
+    try:
+        return json.loads(body), "trailing_commas"
+    except json.JSONDecodeError:
+        pass
+
+    # Models sometimes wrap the JSON in prose; start at the first bracket
+    starts = [i for i in (body.find("{"), body.find("[")) if i >= 0]
+    if starts:
+        body = body[min(starts):]
+
+    value = close_truncated(body)
+    if value is not None:
+        return value, "truncation"
+
+    items = salvage_array_items(body)
+    if items is not None:
+        return items, "partial_array"
+
+    raise JSONRecoveryError("Could not repair JSON locally")
+
+
+def reformat_json_with_llm(llm: Any, malformed: str, format_instructions: str = "",
+                           on_response: Optional[Callable[[Any, float], Any]] = None,
+                           timeout: Optional[float] = None, cancel_token: Any = None) -> str:
+    """
+    Ask ``llm`` to re-emit just the malformed output as valid JSON
+
+    ``on_response`` receives the raw response and call latency (e.g. for token accounting).
+    ``timeout`` and ``cancel_token`` bound the call (see shared/cancellation.py).
+    """
+    from langchain_core.messages import HumanMessage
+    from shared.cancellation import invoke_with_timeout
+
+    prompt = REFORMAT_PROMPT.format(format_instructions=format_instructions, malformed=malformed)
+    start = time.time()
+    response = invoke_with_timeout(llm, [HumanMessage(content=prompt)], timeout, cancel_token)
+    if on_response is not None:
+        on_response(response, time.time() - start)
+    return response.content
+
+
+def recover_json(text: str, reformat: Optional[Callable[[str], str]] = None) -> Tuple[Any, str]:
+    """
+    Recover a JSON value from malformed model output
+
+    Args:
+        text (str): Raw model output
+        reformat (Callable): Optional last resort; receives the malformed text and returns new output
+
+    Returns:
+        Tuple[Any, str]: The value and the strategy used (``llm_reformat`` for the fallback)
+
+    Raises:
+        JSONRecoveryError: If local repair and the re-formatting request both fail
+    """
+    try:
+        return repair_json(text)
+    except JSONRecoveryError:
+        if reformat is None:
+            raise
+
+    logger.info("Local JSON repair failed; requesting a re-format of %d characters", len(text))
+    value, _ = repair_json(reformat(text))
+    return value, "llm_reformat"
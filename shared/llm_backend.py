@@ -0,0 +1,259 @@
+"""
+Pluggable chat-model backend with offline record/replay.
+
+Every app builds its chat model through :func:`create_chat_model` instead of
+constructing ``ChatGoogleGenerativeAI`` / ``ChatOpenAI`` directly. The backend
+mode decides what that returns:
+
+    live    the provider's chat model (default)
+    record  the provider's chat model, with every request/response pair written
+            to a cassette file on disk
+    replay  a model that serves the recorded cassettes deterministically; no
+            network access and no API key are needed
+
+Cassettes are keyed by a hash of the provider, model, temperature, stop
+sequences and message contents, so a replayed run sees exactly the responses
+recorded for the same prompts. Replay can sleep for the recorded latency
+(optionally scaled) to reproduce real timing.
+
+Environment variables:
+    LLM_BACKEND           live | record | replay (default live)
+    LLM_CASSETTE_DIR      Cassette directory (default cassettes)
+    LLM_REPLAY_LATENCY    Empty/0 for no delay, ``recorded`` for the recorded latency,
+                          or a multiplier such as 0.1
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import operator
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from shared.hedging import HedgedChatModel, get_hedger, hedging_enabled
+
+DEFAULT_CASSETTE_DIR = "cassettes"
+BACKEND_MODES = ("live", "record", "replay")
+# Replayed streams are cut into chunks of this many characters
+REPLAY_CHUNK_CHARS = 24
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no cassette was recorded for a request."""
+
+
+def backend_mode() -> str:
+    mode = os.getenv("LLM_BACKEND", "live").strip().lower() or "live"
+    if mode not in BACKEND_MODES:
+        raise ValueError(f"LLM_BACKEND must be one of {', '.join(BACKEND_MODES)}, got {mode!r}")
+    return mode
+
+
+def requires_api_key(mode: Optional[str] = None) -> bool:
+    """Whether the backend talks to a provider (replay never does)."""
+    return (mode or backend_mode()) != "replay"
+
+
+def replay_latency_scale() -> float:
+    value = os.getenv("LLM_REPLAY_LATENCY", "").strip().lower()
+    if not value:
+        return 0.0
+    return 1.0 if value == "recorded" else float(value)
+
+
+class CassetteStore:
+    """
+    Request/response cassettes stored as one JSON file per request
+
+    Args:
+        directory (str): Root directory; files are sharded by the first two hex digits of the key
+    """
+
+    def __init__(self, directory: str = DEFAULT_CASSETTE_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def key(provider: str, model: str, params: Dict[str, Any], messages: List[BaseMessage],
+            stop: Optional[List[str]] = None) -> str:
+        request = {
+            "provider": provider,
+            "model": model,
+            "params": params,
+            "stop": stop,
+            "messages": [{"type": m.type, "content": m.content} for m in messages],
+        }
+        encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(temp_path, path)
+
+
+def _cassette_entry(provider: str, model: str, messages: List[BaseMessage], message: AIMessage,
+                    latency_s: float) -> Dict[str, Any]:
+    return {
+        "provider": provider,
+        "model": model,
+        "recorded_at": datetime.now().isoformat(),
+        "latency_s": round(latency_s, 3),
+        "request": [{"type": m.type, "content": m.content} for m in messages],
+        "response": {
+            "content": message.content,
+            "usage_metadata": getattr(message, "usage_metadata", None),
+            "response_metadata": getattr(message, "response_metadata", None) or {},
+        },
+    }
+
+
+class RecordingChatModel(BaseChatModel):
+    """Delegates to a live chat model and writes every exchange to a cassette."""
+
+    inner: Any
+    provider: str
+    model: str
+    params: Dict[str, Any] = {}
+    store: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        start = time.time()
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        key = CassetteStore.key(self.provider, self.model, self.params, messages, stop)
+        self.store.save(key, _cassette_entry(self.provider, self.model, messages, message, time.time() - start))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        start = time.time()
+        chunks = []
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            chunks.append(chunk)
+            yield ChatGenerationChunk(message=chunk)
+        if chunks:
+            message = functools.reduce(operator.add, chunks)
+            key = CassetteStore.key(self.provider, self.model, self.params, messages, stop)
+            self.store.save(key, _cassette_entry(self.provider, self.model, messages, message, time.time() - start))
+
+
+class ReplayChatModel(BaseChatModel):
+    """Serves recorded cassettes; raises :class:`CassetteMissError` for unrecorded requests."""
+
+    provider: str
+    model: str
+    params: Dict[str, Any] = {}
+    store: Any
+    latency_scale: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _entry(self, messages, stop) -> Dict[str, Any]:
+        key = CassetteStore.key(self.provider, self.model, self.params, messages, stop)
+        entry = self.store.load(key)
+        if entry is None:
+            raise CassetteMissError(f"No cassette for {self.provider}/{self.model} request {key} in {self.store.directory}")
+        return entry
+
+    def _load(self, messages, stop):
+        entry = self._entry(messages, stop)
+        if self.latency_scale:
+            time.sleep(entry.get("latency_s", 0.0) * self.latency_scale)
+        return entry["response"]
+
+    @staticmethod
+    def _result(response: Dict[str, Any]) -> ChatResult:
+        message = AIMessage(
+            content=response["content"],
+            usage_metadata=response.get("usage_metadata"),
+            response_metadata=response.get("response_metadata") or {},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._result(self._load(messages, stop))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        entry = self._entry(messages, stop)
+        if self.latency_scale:
+            await asyncio.sleep(entry.get("latency_s", 0.0) * self.latency_scale)
+        return self._result(entry["response"])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        response = self._load(messages, stop)
+        content = response["content"] if isinstance(response["content"], str) else json.dumps(response["content"])
+        pieces = [content[i:i + REPLAY_CHUNK_CHARS] for i in range(0, len(content), REPLAY_CHUNK_CHARS)] or [""]
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece,
+                usage_metadata=response.get("usage_metadata") if last else None,
+            ))
+
+
+def _live_chat_model(provider: str, model: str, temperature: float, api_key: Optional[str], **kwargs):
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=temperature, **kwargs)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, openai_api_key=api_key, temperature=temperature, **kwargs)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def create_chat_model(provider: str, model: str, temperature: float = 0.0, api_key: Optional[str] = None,
+                      mode: Optional[str] = None, cassette_dir: Optional[str] = None, **kwargs):
+    """
+    Build the chat model for ``provider``/``model`` in the configured backend mode
+
+    Args:
+        provider (str): ``google`` or ``openai``
+        model (str): Provider model name
+        temperature (float): Sampling temperature (part of the cassette key)
+        api_key (str): Provider API key (unused in replay mode)
+        mode (str): Overrides the LLM_BACKEND env variable
+        cassette_dir (str): Overrides the LLM_CASSETTE_DIR env variable
+        **kwargs: Extra provider client arguments (e.g. pooled HTTP clients); ignored in replay mode
+
+    Returns:
+        BaseChatModel: A live, recording or replaying chat model, hedged when LLM_HEDGE is on
+    """
+    mode = mode or backend_mode()
+    store = CassetteStore(cassette_dir or os.getenv("LLM_CASSETTE_DIR", DEFAULT_CASSETTE_DIR))
+    params = {"temperature": temperature}
+
+    if mode == "replay":
+        chat_model = ReplayChatModel(provider=provider, model=model, params=params, store=store,
+                                     latency_scale=replay_latency_scale())
+    else:
+        chat_model = _live_chat_model(provider, model, temperature, api_key, **kwargs)
+        if mode == "record":
+            chat_model = RecordingChatModel(inner=chat_model, provider=provider, model=model, params=params, store=store)
+
+    if hedging_enabled():
+        chat_model = HedgedChatModel(inner=chat_model, hedger=get_hedger(f"{provider}/{model}"))
+    return chat_model
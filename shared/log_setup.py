@@ -0,0 +1,189 @@
+"""
+Shared logging setup for the extraction and generation pipelines.
+
+Records are handed to a queue on the calling thread and formatted/written by a
+background listener, so a log call in the hot path costs one level check and a
+queue put. Structured fields travel in ``extra`` and may be wrapped in
+:class:`Lazy` so they are only computed for records that pass the level check.
+
+The queue handler snapshots a record before queueing it, so the log shows the
+state at the time of the call: :class:`Lazy` fields are resolved on the calling
+thread, list/dict/set fields are copied, and a message whose arguments are
+mutable is rendered right away. Messages with only immutable arguments (the
+common case) are still rendered on the listener thread.
+
+Usage:
+    from shared.log_setup import Lazy, configure_logging, log_fields
+
+    configure_logging(log_file="pdf_question_extractor.log")
+    logger.info("Window finished", extra=log_fields(window=3, questions=Lazy(len, questions)))
+
+Environment variables:
+    LOG_LEVEL   Root level (default INFO)
+    LOG_LEVELS  Per-module overrides, e.g. ``questions_ingestion_pipeline=DEBUG,httpx=WARNING``
+    LOG_FORMAT  ``text`` (default) or ``json`` for console output; log files are always JSON lines
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Lazy:
+    """A log field whose value is computed only for records that pass the level check."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any):
+        self.func = func
+        self.args = args
+
+    def resolve(self) -> Any:
+        return self.func(*self.args)
+
+    def __str__(self) -> str:
+        return str(self.resolve())
+
+
+def log_fields(**fields: Any) -> Dict[str, Any]:
+    """Build the ``extra`` mapping that carries structured fields on a record."""
+    return {"fields": fields}
+
+
+def _resolved_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    fields = getattr(record, "fields", None)
+    if not fields:
+        return {}
+    return {key: value.resolve() if isinstance(value, Lazy) else value for key, value in fields.items()}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each record as a single JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_resolved_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The repo's usual text format with structured fields appended as ``key=value``."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = _resolved_fields(record)
+        if fields:
+            text += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+def _is_immutable(value: Any) -> bool:
+    if isinstance(value, tuple):
+        return all(_is_immutable(item) for item in value)
+    return value is None or isinstance(value, (str, int, float, bytes))
+
+
+def _snapshot(value: Any) -> Any:
+    if isinstance(value, Lazy):
+        value = value.resolve()
+    if isinstance(value, (list, dict, set)):
+        return type(value)(value)
+    return value
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that snapshots mutable record state and leaves the formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {key: _snapshot(value) for key, value in fields.items()}
+        if record.args and not _is_immutable(record.args):
+            # The arguments may change before the listener formats the record
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def parse_module_levels(spec: str) -> Dict[str, str]:
+    """Parse ``name=LEVEL,name2=LEVEL`` into a mapping."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(
+    log_file: Optional[str] = None,
+    level: Optional[str] = None,
+    module_levels: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Install the queue-based handlers on the root logger
+
+    Safe to call more than once (e.g. on every Streamlit rerun); only the
+    first call installs handlers, later calls just re-apply levels.
+
+    Args:
+        log_file (str): Optional path of a JSON-lines log file
+        level (str): Root level; defaults to the LOG_LEVEL env variable or INFO
+        module_levels (Dict[str, str]): Per-logger levels, merged over LOG_LEVELS
+    """
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+    levels = parse_module_levels(os.getenv("LOG_LEVELS", ""))
+    levels.update(module_levels or {})
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level.upper())
+
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler()
+    console.setFormatter(JsonLinesFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+    handlers = [console]
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
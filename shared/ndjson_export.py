@@ -0,0 +1,317 @@
+"""
+Sharded, compressed NDJSON export of extracted questions.
+
+The pipeline's ``output.json`` is one pretty-printed document that consumers
+have to load whole. The export writes one question per line into shards
+(``questions-00000.ndjson.gz``), each capped at a size budget, plus a compact
+``index.json``:
+
+    shards      file name, compressed size and question count per shard
+    documents   per document: the run metadata (everything in output.json but
+                the questions) and, per page, the byte range of its block
+    questions   question ID -> block byte range and line within the block
+
+Every (document, page) block is written as its own gzip member (or zstd
+frame). A shard is therefore still a valid stream for ``zcat`` / ``zstdcat``,
+and a reader can also seek to one block and decompress only that. zstd needs
+the optional ``zstandard`` package.
+
+An export directory is a growing corpus. A new exporter loads the existing
+index and writes into new shards, so earlier shards are never reopened. The
+index is replaced only once the new shards are complete. Exporting a document
+again re-points its entries at the new blocks. If an export crashes, the
+previous index and every byte it references stay intact.
+
+Usage:
+    python -m shared.ndjson_export export output.json other_output.json --out export/
+    python -m shared.ndjson_export page export/ maths_example.pdf 3
+    python -m shared.ndjson_export get export/ 3f2a9c0d81b7e645
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+SHARD_SUFFIXES = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def question_id(document: str, page: Optional[int], question_text: str, occurrence: int = 0) -> str:
+    """
+    Stable 16-hex-digit ID of a question within a document page
+
+    ``occurrence`` numbers repeats of the same text on one page (e.g. several
+    "Evaluate the following:" stems) so each gets its own ID; the first keeps the plain key.
+    """
+    key = f"{document}\x1f{page}\x1f{question_text.strip()}"
+    if occurrence:
+        key = f"{key}\x1f{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _compressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress
+    raise ValueError(f"Compression must be one of {', '.join(SHARD_SUFFIXES)}, got {compression!r}")
+
+
+def _decompressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "gzip":
+        return gzip.decompress
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Compression must be one of {', '.join(SHARD_SUFFIXES)}, got {compression!r}")
+
+
+def run_summary(results: Dict[str, Any]) -> Dict[str, Any]:
+    """The run metadata of a pipeline output, with windows reduced to their counts."""
+    summary = {key: value for key, value in results.items() if key != "windows_results"}
+    summary["windows_results"] = [
+        {key: window[key] for key in ("window_id", "focus_page", "page_range", "total_questions_found", "error")
+         if key in window}
+        for window in results.get("windows_results", [])
+    ]
+    return summary
+
+
+def _read_block(path: str, offset: int, length: int, decompress: Callable[[bytes], bytes]) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = decompress(f.read(length))
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+
+class NDJSONExporter:
+    """
+    Writes question records into size-bounded compressed shards and an offset index
+
+    An existing export in ``out_dir`` is extended: its index is loaded and new
+    shards are numbered after its shards.
+
+    Args:
+        out_dir (str): Export directory (shards and index.json)
+        compression (str): ``gzip`` or ``zstd`` (must match an existing export)
+        max_shard_bytes (int): A new shard is started before a block would push the current one past this size
+    """
+
+    def __init__(self, out_dir: str, compression: str = "gzip", max_shard_bytes: int = DEFAULT_SHARD_BYTES):
+        self.out_dir = out_dir
+        self.compression = compression
+        self.max_shard_bytes = max_shard_bytes
+        self._compress = _compressor(compression)
+        self._file = None
+        self._shard_size = 0
+        if os.path.exists(os.path.join(out_dir, INDEX_FILE)):
+            self.index = load_index(out_dir)
+            if self.index.get("compression") != compression:
+                raise ValueError(f"{out_dir} holds a {self.index.get('compression')} export; "
+                                 f"cannot add {compression} shards to it")
+        else:
+            self.index = {"version": INDEX_VERSION, "compression": compression, "shards": [],
+                          "documents": {}, "questions": {}}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def __enter__(self) -> "NDJSONExporter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_shard(self):
+        self._close_shard()
+        name = f"questions-{len(self.index['shards']):05d}{SHARD_SUFFIXES[self.compression]}"
+        self._file = open(os.path.join(self.out_dir, name), "wb")
+        self._shard_size = 0
+        self.index["shards"].append({"file": name, "bytes": 0, "questions": 0})
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write_block(self, document: str, page: Optional[int], records: List[Dict[str, Any]]):
+        """Write one page's question records as a single compressed member."""
+        if not records:
+            return
+        blob = self._compress("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+        if self._file is None or (self._shard_size and self._shard_size + len(blob) > self.max_shard_bytes):
+            self._open_shard()
+        shard_idx = len(self.index["shards"]) - 1
+        location = [shard_idx, self._shard_size, len(blob)]
+        self._file.write(blob)
+        self._shard_size += len(blob)
+        shard = self.index["shards"][shard_idx]
+        shard["bytes"] = self._shard_size
+        shard["questions"] += len(records)
+
+        pages = self.index["documents"].setdefault(document, {"run": None, "pages": {}})["pages"]
+        pages.setdefault(str(page), []).append(location + [len(records)])
+        for line, record in enumerate(records):
+            self.index["questions"][record["id"]] = location + [line]
+
+    def _drop_document(self, document: str):
+        """Remove an earlier export of ``document`` from the index (its blocks stay in their shards)."""
+        entry = self.index["documents"].pop(document, None)
+        if entry is None:
+            return
+        decompress = _decompressor(self.compression)
+        for blocks in entry["pages"].values():
+            for shard_idx, offset, length, count in blocks:
+                path = os.path.join(self.out_dir, self.index["shards"][shard_idx]["file"])
+                for record in _read_block(path, offset, length, decompress):
+                    if self.index["questions"].get(record["id"], [])[:3] == [shard_idx, offset, length]:
+                        del self.index["questions"][record["id"]]
+                self.index["shards"][shard_idx]["questions"] -= count
+
+    def add_results(self, results: Dict[str, Any]) -> int:
+        """
+        Export every window of an ingestion-pipeline result, replacing an earlier export of the same document
+
+        Returns:
+            int: Number of questions written
+        """
+        document = results.get("pdf_path", "unknown")
+        self._drop_document(document)
+        written = 0
+        occurrences: Dict[tuple, int] = {}
+        for window in results.get("windows_results", []):
+            page = window.get("focus_page")
+            records = []
+            for question in window.get("questions", []):
+                text = question.get("question_text", "")
+                key = (page, text.strip())
+                occurrence = occurrences[key] = occurrences.get(key, -1) + 1
+                records.append(dict(question, id=question_id(document, page, text, occurrence),
+                                    document=document, page=page, window_id=window.get("window_id")))
+            self.write_block(document, page, records)
+            written += len(records)
+        self.index["documents"].setdefault(document, {"run": None, "pages": {}})["run"] = run_summary(results)
+        return written
+
+    def close(self) -> str:
+        """Finish the last shard and write the index (last, so a partial export has none)."""
+        self._close_shard()
+        index_path = os.path.join(self.out_dir, INDEX_FILE)
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+        return index_path
+
+
+def load_index(path: str) -> Dict[str, Any]:
+    """Load ``index.json`` from an export directory (or the index file itself)."""
+    index_path = os.path.join(path, INDEX_FILE) if os.path.isdir(path) else path
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ShardedQuestions:
+    """
+    Random-access reader over an export directory
+
+    Args:
+        export_dir (str): Directory written by :class:`NDJSONExporter`
+    """
+
+    def __init__(self, export_dir: str):
+        self.export_dir = export_dir
+        self.index = load_index(export_dir)
+        self._decompress = _decompressor(self.index["compression"])
+
+    @property
+    def documents(self) -> List[str]:
+        return list(self.index["documents"])
+
+    def run_summary(self, document: str) -> Dict[str, Any]:
+        return self.index["documents"][document]["run"]
+
+    def _read_block(self, shard_idx: int, offset: int, length: int) -> List[Dict[str, Any]]:
+        path = os.path.join(self.export_dir, self.index["shards"][shard_idx]["file"])
+        return _read_block(path, offset, length, self._decompress)
+
+    def page_questions(self, document: str, page: int) -> List[Dict[str, Any]]:
+        """Questions of one document page, reading only that page's blocks."""
+        blocks = self.index["documents"].get(document, {}).get("pages", {}).get(str(page), [])
+        questions = []
+        for shard_idx, offset, length, _count in blocks:
+            questions.extend(self._read_block(shard_idx, offset, length))
+        return questions
+
+    def get_question(self, qid: str) -> Optional[Dict[str, Any]]:
+        location = self.index["questions"].get(qid)
+        if location is None:
+            return None
+        shard_idx, offset, length, line = location
+        return self._read_block(shard_idx, offset, length)[line]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Stream every question in shard order, one block in memory at a time."""
+        blocks = sorted(
+            (shard_idx, offset, length)
+            for document in self.index["documents"].values()
+            for page_blocks in document["pages"].values()
+            for shard_idx, offset, length, _count in page_blocks
+        )
+        for shard_idx, offset, length in blocks:
+            yield from self._read_block(shard_idx, offset, length)
+
+
+def export_output_files(output_paths: Iterable[str], out_dir: str, compression: str = "gzip",
+                        max_shard_bytes: int = DEFAULT_SHARD_BYTES) -> str:
+    """
+    Export pipeline ``output.json`` files into one sharded corpus (added to an existing export in ``out_dir``)
+
+    Returns:
+        str: Path of the written index
+    """
+    with NDJSONExporter(out_dir, compression, max_shard_bytes) as exporter:
+        for path in output_paths:
+            with open(path, "r", encoding="utf-8") as f:
+                exporter.add_results(json.load(f))
+    return os.path.join(out_dir, INDEX_FILE)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Export questions to sharded NDJSON and read them back")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export ingestion-pipeline output.json files")
+    export.add_argument("files", nargs="+")
+    export.add_argument("--out", default="export", help="Export directory")
+    export.add_argument("--compression", choices=list(SHARD_SUFFIXES), default="gzip")
+    export.add_argument("--shard-mb", type=float, default=DEFAULT_SHARD_BYTES / (1024 * 1024), help="Shard size cap in MB")
+
+    page = commands.add_parser("page", help="Print one page's questions")
+    page.add_argument("export_dir")
+    page.add_argument("document")
+    page.add_argument("page", type=int)
+
+    get = commands.add_parser("get", help="Print one question by ID")
+    get.add_argument("export_dir")
+    get.add_argument("question_id")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        index_path = export_output_files(args.files, args.out, args.compression, int(args.shard_mb * 1024 * 1024))
+        index = load_index(index_path)
+        print(f"📦 {len(index['questions'])} questions in {len(index['shards'])} shard(s); index: {index_path}")
+    elif args.command == "page":
+        for question in ShardedQuestions(args.export_dir).page_questions(args.document, args.page):
+            print(json.dumps(question, ensure_ascii=False))
+    else:
+        question = ShardedQuestions(args.export_dir).get_question(args.question_id)
+        print(json.dumps(question, ensure_ascii=False, indent=2) if question else f"❌ No question {args.question_id}")
+
+
+if __name__ == "__main__":
+    main()
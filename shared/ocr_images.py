@@ -0,0 +1,291 @@
+"""
+Deduplication and transcoding of OCR page images.
+
+With ``include_image_base64=True`` Mistral OCR returns every image a page
+places as a full-size base64 PNG/JPEG, so a logo, header graphic or figure
+reused across the book is carried (and cached) once per occurrence. An
+:class:`ImageStore` keeps one copy per distinct image:
+
+    dedup       byte-identical repeats collapse onto the first occurrence's ID.
+                Opt-in near-duplicate matching compares a 256-bit difference
+                hash of each image; a candidate within a few bits of an
+                earlier image (same picture rescaled or re-compressed) only
+                collapses once a block-wise pixel comparison at up to 512 px
+                confirms it, so figures differing in a label stay apart
+    transcode   the kept copy is downscaled to display size and re-encoded
+                (WebP by default), plus a small thumbnail for page previews
+
+:func:`shared.page_router.iter_routed_pages` feeds it every OCR image in page
+order and rewrites the ``image_id`` references in the page markdown to the
+kept ID, so the extractors and the question records only ever see that ID.
+Pillow is imported only once an image needs processing.
+
+Environment variables:
+    OCR_IMAGE_FORMAT          webp | jpeg | png | original (default webp; original keeps the OCR bytes)
+    OCR_IMAGE_MAX_SIDE        Longest side of the stored copy in pixels (default 1024)
+    OCR_IMAGE_THUMB_SIDE      Longest side of the thumbnail in pixels (default 160; 0 disables)
+    OCR_IMAGE_DEDUP_DISTANCE  Differing hash bits (of 256) still counted as the same image (default -1: exact copies only; e.g. 10)
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = ("webp", "jpeg", "png", "original")
+DEFAULT_FORMAT = "webp"
+DEFAULT_MAX_SIDE = 1024
+DEFAULT_THUMB_SIDE = 160
+DEFAULT_DEDUP_DISTANCE = -1
+DEFAULT_QUALITY = 80
+# 16x16: rescaled copies of a figure stay within ~3 bits, while different graphs drawn
+# on the same axes are 17+ bits apart (8x8 brought those down to 6)
+HASH_SIZE = 16
+# Near-duplicates must also have about the same shape; blank and flat images all hash alike
+MAX_ASPECT_DIFFERENCE = 0.1
+# A hash match is confirmed on grayscale copies at the smaller image's width (at most
+# CONFIRM_SIDE): the mean difference of every 8x8 block must stay within CONFIRM_MAX_DIFFERENCE
+# gray levels. A re-encode at the same size scores ~1 and a relabelled vertex (ABC vs PQR)
+# 9+, which a whole-image difference averages away; heavily re-compressed copies (6+) are
+# kept apart rather than risk merging distinct figures.
+CONFIRM_SIDE = 512
+CONFIRM_BLOCK = 8
+CONFIRM_MAX_DIFFERENCE = 4
+
+
+class StoredImage(NamedTuple):
+    """The single kept copy of a distinct image."""
+    id: str
+    image_base64: str
+    thumbnail_base64: Optional[str]
+    width: int
+    height: int
+    duplicates: List[str]
+
+
+def split_data_uri(value: str) -> Tuple[Optional[str], str]:
+    """``(mime type, base64 payload)`` of a data URI (mime type None for bare base64)."""
+    if value.startswith("data:") and "," in value:
+        header, payload = value.split(",", 1)
+        return header[5:].split(";", 1)[0] or None, payload
+    return None, value
+
+
+def difference_hash(image, size: int = HASH_SIZE) -> int:
+    """
+    Perceptual difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy
+
+    Rescaling, re-compression and small edits flip only a few of the ``size * size`` bits.
+    """
+    from PIL import Image
+
+    pixels = image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR).tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def confirmation_copy(image, side: int = CONFIRM_SIDE):
+    """Grayscale copy of ``image`` no wider than ``side``, kept to confirm later hash matches."""
+    from PIL import Image
+
+    gray = image.convert("L")
+    if gray.width > side:
+        gray = gray.resize((side, max(1, round(side * gray.height / gray.width))), Image.Resampling.BOX)
+    return gray
+
+
+def same_pixels(first, second, block: int = CONFIRM_BLOCK,
+                max_difference: int = CONFIRM_MAX_DIFFERENCE) -> bool:
+    """
+    Whether two grayscale copies show the same picture, block by block
+
+    Both are compared at the smaller one's width and lightly blurred so resampling and
+    compression noise along edges cancel out, while a changed label stays inside one block.
+    """
+    from PIL import Image, ImageChops, ImageFilter
+
+    width = min(first.width, second.width)
+    height = max(1, round(width * first.height / first.width))
+
+    def prepared(gray):
+        return gray.resize((width, height), Image.Resampling.BOX).filter(ImageFilter.GaussianBlur(1))
+
+    blocks = ImageChops.difference(prepared(first), prepared(second)).resize(
+        (max(1, width // block), max(1, height // block)), Image.Resampling.BOX)
+    return blocks.getextrema()[1] <= max_difference
+
+
+def encode_image(image, image_format: str, max_side: int, quality: int = DEFAULT_QUALITY) -> str:
+    """Downscale ``image`` to fit ``max_side`` and encode it as a data URI."""
+    from PIL import Image
+
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if image_format == "jpeg":
+        if has_alpha:
+            # JPEG has no alpha channel; flatten onto the white page background
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+        options = {"quality": quality, "optimize": True}
+    elif image_format == "webp":
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        options = {"quality": quality, "method": 4}
+    else:
+        if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        options = {"optimize": True}
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format.upper(), **options)
+    return f"data:image/{image_format};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+class ImageStore:
+    """
+    Keeps one transcoded copy of every distinct image seen in a document
+
+    Args:
+        image_format (str): ``webp``, ``jpeg``, ``png`` or ``original`` (keep the OCR bytes)
+        max_side (int): Longest side of the stored copy in pixels
+        thumb_side (int): Longest side of the thumbnail in pixels (0: no thumbnails)
+        dedup_distance (int): Differing hash bits of a near-duplicate candidate, confirmed pixel by pixel
+            before collapsing (-1: exact copies only)
+        quality (int): Lossy encoder quality
+    """
+
+    def __init__(self, image_format: str = DEFAULT_FORMAT, max_side: int = DEFAULT_MAX_SIDE,
+                 thumb_side: int = DEFAULT_THUMB_SIDE, dedup_distance: int = DEFAULT_DEDUP_DISTANCE,
+                 quality: int = DEFAULT_QUALITY):
+        image_format = image_format.lower()
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Image format must be one of {', '.join(IMAGE_FORMATS)}, got {image_format!r}")
+        self.image_format = image_format
+        self.max_side = max_side
+        self.thumb_side = thumb_side
+        self.dedup_distance = dedup_distance
+        self.quality = quality
+        self.images: Dict[str, StoredImage] = {}
+        self._canonical: Dict[str, str] = {}
+        self._by_digest: Dict[str, str] = {}
+        self._fingerprints: List[Tuple[int, float, Any, str]] = []
+        self.seen = 0
+        self.original_chars = 0
+
+    @classmethod
+    def from_env(cls) -> "ImageStore":
+        return cls(
+            image_format=os.getenv("OCR_IMAGE_FORMAT", DEFAULT_FORMAT),
+            max_side=int(os.getenv("OCR_IMAGE_MAX_SIDE") or DEFAULT_MAX_SIDE),
+            thumb_side=int(os.getenv("OCR_IMAGE_THUMB_SIDE") or DEFAULT_THUMB_SIDE),
+            dedup_distance=int(os.getenv("OCR_IMAGE_DEDUP_DISTANCE") or DEFAULT_DEDUP_DISTANCE),
+        )
+
+    def canonical_id(self, image_id: str) -> str:
+        """ID of the kept copy ``image_id`` was collapsed onto (itself if it was kept)."""
+        return self._canonical.get(image_id, image_id)
+
+    def _find_similar(self, fingerprint: int, aspect: float, gray) -> Optional[str]:
+        candidates = []
+        for other, other_aspect, other_gray, other_id in self._fingerprints:
+            distance = (fingerprint ^ other).bit_count()
+            if distance <= self.dedup_distance and abs(aspect - other_aspect) <= MAX_ASPECT_DIFFERENCE * max(aspect, other_aspect):
+                candidates.append((distance, other_gray, other_id))
+        # Closest hash first; only a pixel-level match collapses the image
+        for _, other_gray, other_id in sorted(candidates, key=lambda candidate: candidate[0]):
+            if same_pixels(gray, other_gray):
+                return other_id
+        return None
+
+    def _keep(self, image_id: str, image_base64: str, thumbnail: Optional[str] = None,
+              size: Tuple[int, int] = (0, 0)) -> str:
+        self.images[image_id] = StoredImage(image_id, image_base64, thumbnail, size[0], size[1], [])
+        self._canonical[image_id] = image_id
+        return image_id
+
+    def _collapse(self, image_id: str, canonical: str) -> str:
+        self.images[canonical].duplicates.append(image_id)
+        self._canonical[image_id] = canonical
+        return canonical
+
+    def add(self, image_id: str, image_base64: Optional[str]) -> str:
+        """
+        Add one OCR image
+
+        Args:
+            image_id (str): Document-unique image ID
+            image_base64 (str): Base64 image or data URI from the OCR response
+
+        Returns:
+            str: The ID to reference the image by; an earlier ID if this image is a (near-)duplicate
+        """
+        if not image_base64:
+            return image_id
+        self.seen += 1
+        self.original_chars += len(image_base64)
+        _, payload = split_data_uri(image_base64)
+        # Byte-identical repeats are matched without decoding them
+        digest = hashlib.sha1(payload.encode("ascii", "ignore")).hexdigest()
+        if digest in self._by_digest:
+            return self._collapse(image_id, self._by_digest[digest])
+
+        try:
+            from PIL import Image
+
+            image = Image.open(io.BytesIO(base64.b64decode(payload)))
+            image.load()
+        except Exception as e:
+            logger.warning("⚠️ Could not decode OCR image %s, keeping it as is: %s", image_id, e)
+            self._by_digest[digest] = image_id
+            return self._keep(image_id, image_base64)
+
+        self._by_digest[digest] = image_id
+        if self.dedup_distance >= 0:
+            aspect = image.width / max(1, image.height)
+            fingerprint = difference_hash(image)
+            gray = confirmation_copy(image)
+            similar = self._find_similar(fingerprint, aspect, gray)
+            if similar is not None:
+                self._by_digest[digest] = similar
+                return self._collapse(image_id, similar)
+            self._fingerprints.append((fingerprint, aspect, gray, image_id))
+
+        stored = image_base64
+        if self.image_format != "original":
+            try:
+                encoded = encode_image(image, self.image_format, self.max_side, self.quality)
+                # Small line art is often already smaller than any re-encode at full size
+                if len(encoded) < len(image_base64) or max(image.size) > self.max_side:
+                    stored = encoded
+            except Exception as e:
+                logger.warning("⚠️ Could not transcode OCR image %s, keeping it as is: %s", image_id, e)
+        thumbnail = None
+        if self.thumb_side > 0:
+            try:
+                thumbnail = encode_image(image, "jpeg" if self.image_format == "original" else self.image_format,
+                                         self.thumb_side, self.quality)
+            except Exception as e:
+                logger.warning("⚠️ Could not create a thumbnail for OCR image %s: %s", image_id, e)
+        return self._keep(image_id, stored, thumbnail, image.size)
+
+    def stats(self) -> Dict[str, Any]:
+        """Images seen and kept, and the base64 payload before and after (thumbnails included)."""
+        stored_chars = sum(len(image.image_base64) + len(image.thumbnail_base64 or "") for image in self.images.values())
+        return {
+            "images": self.seen,
+            "unique": len(self.images),
+            "duplicates": sum(len(image.duplicates) for image in self.images.values()),
+            "original_chars": self.original_chars,
+            "stored_chars": stored_chars,
+        }
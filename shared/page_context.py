@@ -0,0 +1,135 @@
+"""
+Boundary-aware context for page-by-page question extraction.
+
+Neighbouring pages are only needed to complete a question that crosses a page
+break. Instead of sending them whole, :func:`boundary_context` checks locally
+whether a question appears to cross the break before or after the main page.
+Only when one does, it returns the trailing fragment of the previous page
+(from the start of its last question) or the leading fragment of the next
+page (up to its first new question). The heuristics are tuned for textbook
+layouts: numbered exercise items, "Example"/"Exercise" headings, and running
+headers and footers.
+
+Usage:
+    front, back = boundary_context(previous_page, main_page, next_page)
+"""
+
+import re
+from typing import Optional, Tuple
+
+# Longest fragment taken from a neighbouring page
+DEFAULT_FRAGMENT_CHARS = 1200
+
+# Lines that begin a new question or section
+QUESTION_START = re.compile(
+    r"^\s*(?:#+\s*)?(?:\*\*)?(?:Q(?:uestion)?\.?\s*\d+|\d{1,3}\s*[.)]\s|Example\s+\d+|Exercise\s+\d+|"
+    r"Miscellaneous\s+Exercise|EXERCISE|EXAMPLE)",
+    re.MULTILINE | re.IGNORECASE,
+)
+# Sub-part markers such as "(ii)" or "(b)" continue the current question
+SUBPART_START = re.compile(r"^\s*\((?:[ivx]{1,4}|[a-h])\)", re.IGNORECASE)
+# Running headers/footers, page numbers and image-only lines carry no question text
+NOISE_LINE = re.compile(r"^\s*(?:\d{1,4}|Reprint\s+\d{4}-\d{2,4}|!\[[^\]]*\]\([^)]*\)|\[Image ID:[^\]]*\]|-+.*-+)?\s*$",
+                        re.IGNORECASE)
+SENTENCE_END = (".", "?", "!")
+CONTINUATION_START = (",", ";", ")", "=", "+", "-", "×", "and ", "or ")
+
+
+def _content_lines(text: str):
+    lines = [line.strip() for line in text.splitlines()]
+    return [line for line in lines if line and not NOISE_LINE.match(line)]
+
+
+def _is_running_header(line: str) -> bool:
+    letters = [c for c in line if c.isalpha()]
+    return bool(letters) and all(c.isupper() for c in letters) and len(line) <= 60 and not QUESTION_START.match(line)
+
+
+def ends_mid_question(text: str) -> bool:
+    """True if the page's last content line looks like an unfinished sentence."""
+    lines = _content_lines(text)
+    if not lines:
+        return False
+    last = lines[-1].rstrip("*_ ")
+    return not last.endswith(SENTENCE_END)
+
+
+def starts_mid_question(text: str) -> bool:
+    """True if the page's first content line continues a question from the previous page."""
+    lines = [line for line in _content_lines(text) if not _is_running_header(line)]
+    if not lines:
+        return False
+    first = lines[0]
+    if QUESTION_START.match(first) or first.startswith("#"):
+        return False
+    return first[0].islower() or first.startswith(CONTINUATION_START) or bool(SUBPART_START.match(first))
+
+
+def _strip_noise(text: str, leading: bool) -> str:
+    """Drop footer/header/page-number lines from the end (or start) of ``text``."""
+    lines = text.splitlines()
+    if leading:
+        while lines and (NOISE_LINE.match(lines[0]) or _is_running_header(lines[0].strip())):
+            lines.pop(0)
+    else:
+        while lines and NOISE_LINE.match(lines[-1]):
+            lines.pop()
+    return "\n".join(lines)
+
+
+def _clip_start(fragment: str, max_chars: int) -> str:
+    """Keep the last ``max_chars`` characters, starting at a line boundary."""
+    if len(fragment) <= max_chars:
+        return fragment
+    tail = fragment[-max_chars:]
+    newline = tail.find("\n")
+    return tail[newline + 1:] if 0 <= newline < len(tail) - 1 else tail
+
+
+def _clip_end(fragment: str, max_chars: int) -> str:
+    """Keep the first ``max_chars`` characters, ending at a line boundary."""
+    if len(fragment) <= max_chars:
+        return fragment
+    head = fragment[:max_chars]
+    newline = head.rfind("\n")
+    return head[:newline] if newline > 0 else head
+
+
+def trailing_fragment(text: str, max_chars: int = DEFAULT_FRAGMENT_CHARS) -> str:
+    """The end of a page, from the start of its last question (at most ``max_chars``)."""
+    text = _strip_noise(text.rstrip(), leading=False)
+    starts = [match.start() for match in QUESTION_START.finditer(text)]
+    fragment = text[starts[-1]:] if starts else text
+    return _clip_start(fragment.strip(), max_chars)
+
+
+def leading_fragment(text: str, max_chars: int = DEFAULT_FRAGMENT_CHARS) -> str:
+    """The start of a page, up to its first new question (at most ``max_chars``)."""
+    text = _strip_noise(text.lstrip(), leading=True)
+    first_line_end = text.find("\n") + 1 or len(text)
+    match = QUESTION_START.search(text, first_line_end)
+    fragment = text[:match.start()] if match else text
+    return _clip_end(fragment.strip(), max_chars)
+
+
+def boundary_context(previous_page: Optional[str], main_page: str, next_page: Optional[str],
+                     max_chars: int = DEFAULT_FRAGMENT_CHARS) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Context fragments needed to complete questions that cross the main page's breaks
+
+    Args:
+        previous_page (str): Text of the previous page (None on the first page)
+        main_page (str): Text of the page being extracted
+        next_page (str): Text of the next page (None on the last page)
+        max_chars (int): Longest fragment taken from either neighbour
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: Trailing fragment of the previous page and leading
+        fragment of the next page; None where no question crosses that break
+    """
+    front = back = None
+    if previous_page and (ends_mid_question(previous_page) or starts_mid_question(main_page)):
+        front = trailing_fragment(previous_page, max_chars) or None
+    if next_page and (ends_mid_question(main_page) or starts_mid_question(next_page)):
+        back = leading_fragment(next_page, max_chars) or None
+    return front, back
@@ -0,0 +1,279 @@
+"""
+Per-page routing between the PDF text layer and OCR.
+
+Most textbook pages have a usable embedded text layer, and extracting it with
+PyPDF2 is free and instant. OCR is only worth its cost and latency on pages
+where that layer is missing or broken. :func:`assess_text_layer` scores each
+page's text on four signals:
+
+    density   too few characters means a scanned or image-only page
+    garbage   replacement / private-use / control glyphs from unmapped fonts
+    spacing   letter-by-letter runs ("T h e  s e t") from broken word spacing
+    math      traces of dropped math glyphs: empty brackets, dangling operators,
+              differentials without an integral sign
+
+Pages that also reference a figure and carry images go to OCR as well, so the
+extractor gets the image IDs. :func:`iter_routed_pages` keeps good pages as
+they are and sends only the bad ones to Mistral OCR, several pages per request
+and several requests in parallel. It yields one :class:`RoutedPage` per page,
+in page order. A routed page has ``markdown`` and ``images`` like a Mistral
+OCR page, so both extractors consume the stream unchanged. Given an
+:class:`~shared.ocr_images.ImageStore`, OCR images are deduplicated and
+transcoded on the way (:func:`route_document` does this by default).
+
+Environment variables:
+    PAGE_SOURCE          text | hybrid | ocr (default text for the ingestion pipeline)
+    OCR_BATCH_PAGES      Pages per OCR request (default 8)
+"""
+
+import base64
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from shared.ocr_images import ImageStore
+from shared.pdf_splitter import PDFSplitter
+
+PAGE_SOURCES = ("text", "hybrid", "ocr")
+OCR_MODEL = "mistral-ocr-latest"
+DEFAULT_OCR_BATCH_PAGES = 8
+DEFAULT_OCR_WORKERS = 4
+
+# Text-layer quality thresholds
+MIN_TEXT_CHARS = 200
+MAX_GARBAGE_RATIO = 0.02
+MAX_SPACED_RATIO = 0.2
+MAX_MATH_LOSS = 3
+
+# Dropped math glyphs leave empty groups, operators with no operand and bare differentials
+EMPTY_GROUP = re.compile(r"\(\s*\)|\[\s*\]|\{\s*\}|\|\s*\|")
+DANGLING_OPERATOR = re.compile(r"[=+×÷<>≤≥]\s*(?:$|[,.;:)\]])", re.MULTILINE)
+DIFFERENTIAL = re.compile(r"\bd[xyzt]\b")
+FIGURE_REF = re.compile(r"\bFig(?:ure)?\.?\s*\d", re.IGNORECASE)
+# Four or more single letters in a row: "T h e  s e t"
+SPACED_RUN = re.compile(r"(?:\b[A-Za-z]\b[ \t]+){3,}\b[A-Za-z]\b")
+
+
+class PageImage(NamedTuple):
+    id: str
+    image_base64: Optional[str]
+    thumbnail_base64: Optional[str] = None
+
+
+class RoutedPage(NamedTuple):
+    """One page of the unified stream, shaped like a Mistral OCR page."""
+    page_number: int
+    markdown: str
+    images: List[PageImage]
+    source: str
+    quality: Dict[str, Any]
+
+
+def _is_garbage(char: str) -> bool:
+    if char in "\n\t\r":
+        return False
+    return char == "�" or unicodedata.category(char) in ("Co", "Cc", "Cs")
+
+
+def page_has_images(page) -> bool:
+    """Whether a PyPDF2 page places any image XObjects."""
+    try:
+        resources = page.get("/Resources")
+        xobjects = resources.get_object().get("/XObject") if resources else None
+        if not xobjects:
+            return False
+        xobjects = xobjects.get_object()
+        return any(xobjects[name].get_object().get("/Subtype") == "/Image" for name in xobjects)
+    except Exception:
+        return False
+
+
+def assess_text_layer(text: str, has_images: bool = False) -> Dict[str, Any]:
+    """
+    Score a page's embedded text layer
+
+    Args:
+        text (str): Text extracted from the page's text layer
+        has_images (bool): Whether the page carries images
+
+    Returns:
+        Dict[str, Any]: The signal values, the ``reasons`` the layer was rejected for
+        (empty when it is usable) and ``use_text_layer``
+    """
+    text = text or ""
+    visible = [c for c in text if not c.isspace()]
+    chars = len(visible)
+    garbage_ratio = sum(_is_garbage(c) for c in visible) / chars if chars else 0.0
+    spaced_ratio = sum(len(m.group()) for m in SPACED_RUN.finditer(text)) / len(text) if text else 0.0
+    math_loss = len(EMPTY_GROUP.findall(text)) + len(DANGLING_OPERATOR.findall(text))
+    if "∫" not in text:
+        math_loss += len(DIFFERENTIAL.findall(text))
+    figures = has_images and bool(FIGURE_REF.search(text))
+
+    reasons = []
+    if chars < MIN_TEXT_CHARS:
+        reasons.append("sparse")
+    if garbage_ratio > MAX_GARBAGE_RATIO:
+        reasons.append("garbage_glyphs")
+    if spaced_ratio > MAX_SPACED_RATIO:
+        reasons.append("letter_spacing")
+    if math_loss > MAX_MATH_LOSS:
+        reasons.append("math_symbol_loss")
+    if figures:
+        reasons.append("figures")
+    return {
+        "chars": chars,
+        "garbage_ratio": round(garbage_ratio, 4),
+        "spaced_ratio": round(spaced_ratio, 4),
+        "math_loss": math_loss,
+        "reasons": reasons,
+        "use_text_layer": not reasons,
+    }
+
+
+def mistral_client(api_key: Optional[str] = None):
+    from mistralai import Mistral
+
+    api_key = api_key or os.environ.get("MISTRAL_API_KEY")
+    if not api_key:
+        raise ValueError("MISTRAL_API_KEY is required to OCR pages")
+    return Mistral(api_key=api_key)
+
+
+def ocr_batch(client, splitter: PDFSplitter, page_indices: List[int]) -> List[Any]:
+    """OCR the given 0-based pages in one request; returns the Mistral pages in the same order."""
+    pdf_bytes = splitter.select_pages(page_indices)
+    base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
+    response = client.ocr.process(
+        model=OCR_MODEL,
+        document={"type": "document_url", "document_url": f"data:application/pdf;base64,{base64_pdf}"},
+        include_image_base64=True,
+    )
+    if len(response.pages) != len(page_indices):
+        raise ValueError(f"OCR returned {len(response.pages)} pages for a batch of {len(page_indices)}")
+    return response.pages
+
+
+def _ocr_page(page_number: int, ocr_page, quality: Dict[str, Any],
+              image_store: Optional[ImageStore] = None) -> RoutedPage:
+    # Image IDs restart in every OCR request, so they are made unique per page
+    markdown = ocr_page.markdown or ""
+    images = []
+    for img in ocr_page.images or []:
+        image_id = f"p{page_number}-{img.id}"
+        if image_store is None:
+            images.append(PageImage(image_id, img.image_base64))
+        else:
+            # A repeated image is referenced by the ID of its first occurrence
+            image_id = image_store.add(image_id, img.image_base64)
+            stored = image_store.images.get(image_id)
+            if stored is None:
+                images.append(PageImage(image_id, img.image_base64))
+            elif all(image.id != image_id for image in images):
+                images.append(PageImage(image_id, stored.image_base64, stored.thumbnail_base64))
+        markdown = markdown.replace(f"({img.id})", f"({image_id})").replace(f"[{img.id}]", f"[{image_id}]")
+    return RoutedPage(page_number, markdown, images, "ocr", quality)
+
+
+def iter_routed_pages(splitter: PDFSplitter, mode: str = "hybrid", client=None,
+                      batch_pages: int = DEFAULT_OCR_BATCH_PAGES,
+                      workers: int = DEFAULT_OCR_WORKERS,
+                      image_store: Optional[ImageStore] = None) -> Iterator[RoutedPage]:
+    """
+    Yield every page of the document from its text layer or OCR, in page order
+
+    Args:
+        splitter (PDFSplitter): The document
+        mode (str): ``text`` (text layer only), ``hybrid`` (OCR only bad pages) or ``ocr`` (OCR every page)
+        client: Mistral client; created from MISTRAL_API_KEY when pages need OCR
+        batch_pages (int): Pages per OCR request
+        workers (int): OCR requests in flight
+        image_store (ImageStore): Deduplicates and transcodes OCR images (None: keep them as returned)
+
+    Yields:
+        RoutedPage: One per page; pages whose OCR batch failed fall back to their text layer
+    """
+    if mode not in PAGE_SOURCES:
+        raise ValueError(f"Page source must be one of {', '.join(PAGE_SOURCES)}, got {mode!r}")
+
+    texts, qualities = [], []
+    for page in splitter.reader.pages:
+        text = (page.extract_text() or "").strip()
+        texts.append(text)
+        qualities.append(assess_text_layer(text, mode == "hybrid" and page_has_images(page)))
+
+    if mode == "text":
+        to_ocr = []
+    elif mode == "ocr":
+        to_ocr = list(range(splitter.page_count))
+    else:
+        to_ocr = [i for i, quality in enumerate(qualities) if not quality["use_text_layer"]]
+    batches = [to_ocr[i:i + batch_pages] for i in range(0, len(to_ocr), max(1, batch_pages))]
+
+    batch_of = {}
+    executor = None
+    if batches:
+        client = client or mistral_client()
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(batches)), thread_name_prefix="ocr")
+        for batch in batches:
+            future = executor.submit(ocr_batch, client, splitter, batch)
+            for position, page_idx in enumerate(batch):
+                batch_of[page_idx] = (future, position)
+
+    try:
+        for page_idx, text in enumerate(texts):
+            quality = qualities[page_idx]
+            if page_idx in batch_of:
+                future, position = batch_of[page_idx]
+                try:
+                    ocr_page = future.result()[position]
+                except Exception as e:
+                    yield RoutedPage(page_idx + 1, text, [], "text_layer", dict(quality, ocr_error=str(e)))
+                    continue
+                yield _ocr_page(page_idx + 1, ocr_page, quality, image_store)
+            else:
+                yield RoutedPage(page_idx + 1, text, [], "text_layer", quality)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def routing_summary(pages: List[RoutedPage]) -> Dict[str, Any]:
+    """Page counts per source, the OCR'd page numbers and why they were sent."""
+    ocr_pages = [page for page in pages if page.source == "ocr"]
+    fallbacks = [page.page_number for page in pages if "ocr_error" in page.quality]
+    reasons: Dict[str, int] = {}
+    for page in ocr_pages:
+        for reason in page.quality["reasons"]:
+            reasons[reason] = reasons.get(reason, 0) + 1
+    return {
+        "text_layer": len(pages) - len(ocr_pages),
+        "ocr": len(ocr_pages),
+        "ocr_pages": [page.page_number for page in ocr_pages],
+        "ocr_reasons": reasons,
+        "ocr_failed_pages": fallbacks,
+    }
+
+
+class RoutedDocument(NamedTuple):
+    """All routed pages of a document; ``pages`` mirrors a Mistral OCR response."""
+    pages: List[RoutedPage]
+    summary: Dict[str, Any]
+
+
+def route_document(splitter: PDFSplitter, mode: str = "hybrid", compact_images: bool = True,
+                   **kwargs) -> RoutedDocument:
+    """
+    Route every page (see :func:`iter_routed_pages`) and summarise where the text came from
+
+    With ``compact_images`` the OCR images are deduplicated and transcoded (``ImageStore.from_env()``)
+    and the summary gains their counts and payload sizes under ``images``.
+    """
+    image_store = kwargs.pop("image_store", None) or (ImageStore.from_env() if compact_images else None)
+    pages = list(iter_routed_pages(splitter, mode, image_store=image_store, **kwargs))
+    summary = routing_summary(pages)
+    if image_store is not None:
+        summary["images"] = image_store.stats()
+    return RoutedDocument(pages, summary)
@@ -0,0 +1,281 @@
+"""
+Split PDFs into page ranges or fixed-size chunks.
+
+A :class:`PDFSplitter` wraps one PDF's bytes. Cuts run in parallel, each
+worker with its own reader because PyPDF2 readers are not thread-safe. Results
+can be:
+
+- returned whole, cached in memory by (file hash, range) up to a byte budget;
+- streamed one at a time, with only a few chunks in flight;
+- written to disk, where an existing chunk file for the same hash and range
+  is reused rather than rebuilt.
+
+Usage:
+    python -m shared.pdf_splitter book.pdf --chunk-size 20 --out chunks/ --workers 4
+    python -m shared.pdf_splitter book.pdf --ranges 1-3,10-12 --out chunks/ --processes
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+PageRange = Tuple[int, int]
+
+# Upper bound on the bytes held by the shared in-memory range cache
+CACHE_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+# Parsed readers each thread keeps; long-lived threads (e.g. Streamlit's) see many documents
+READERS_PER_THREAD = 4
+
+
+def file_hash(pdf_bytes: bytes) -> str:
+    """Return the hex SHA-256 digest used as the cache key for a PDF."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def parse_ranges(spec: str, page_count: int) -> List[PageRange]:
+    """
+    Parse a 1-based, inclusive range list such as ``"1-3,5,8-"``
+
+    Returns:
+        List[PageRange]: 0-based ``[start, end)`` ranges clipped to the document
+    """
+    ranges = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        first, dash, last = part.partition("-")
+        start = int(first) if first else 1
+        end = (int(last) if last else page_count) if dash else start
+        start, end = max(1, start), min(page_count, end)
+        if start > end:
+            raise ValueError(f"Invalid page range: {part}")
+        ranges.append((start - 1, end))
+    return ranges
+
+
+def chunk_ranges(page_count: int, chunk_size: int, overlap: int = 0) -> List[PageRange]:
+    """Fixed-size ``[start, end)`` chunks covering the document, optionally overlapping."""
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be larger than overlap")
+    if page_count <= 0:
+        return []
+    step = chunk_size - overlap
+    return [(start, min(page_count, start + chunk_size))
+            for start in range(0, max(page_count - overlap, 1), step)]
+
+
+class _RangeCache:
+    """LRU of cut PDFs keyed by (file hash, start, end) or (file hash, "pages", indices), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_range_cache = _RangeCache(CACHE_MAX_BYTES)
+
+# Per-thread (or per-process) LRU of readers, keyed by file hash
+_worker_state = threading.local()
+# Set in process-pool workers by _init_process
+_process_source: Optional[Tuple[bytes, str]] = None
+
+
+def _reader_for(pdf_bytes: bytes, digest: str) -> PyPDF2.PdfReader:
+    readers = getattr(_worker_state, "readers", None)
+    if readers is None:
+        readers = _worker_state.readers = OrderedDict()
+    if digest in readers:
+        readers.move_to_end(digest)
+    else:
+        readers[digest] = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        while len(readers) > READERS_PER_THREAD:
+            readers.popitem(last=False)
+    return readers[digest]
+
+
+def _cut(pdf_bytes: bytes, digest: str, start: int, end: int, out_path: Optional[str] = None):
+    """Write pages ``[start, end)`` as a standalone PDF to ``out_path``, or return its bytes."""
+    reader = _reader_for(pdf_bytes, digest)
+    writer = PyPDF2.PdfWriter()
+    for page_idx in range(start, end):
+        writer.add_page(reader.pages[page_idx])
+
+    if out_path is None:
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    temp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        writer.write(f)
+    os.replace(temp_path, out_path)
+    return out_path
+
+
+def _init_process(pdf_bytes: bytes, digest: str):
+    global _process_source
+    _process_source = (pdf_bytes, digest)
+
+
+def _cut_in_process(start: int, end: int, out_path: Optional[str] = None):
+    return _cut(_process_source[0], _process_source[1], start, end, out_path)
+
+
+class PDFSplitter:
+    """
+    Cuts one PDF into standalone sub-PDFs
+
+    Args:
+        pdf_bytes (bytes): The whole document
+        digest (str): Precomputed SHA-256 of ``pdf_bytes`` (computed if omitted)
+        workers (int): Parallel workers for multi-range operations
+        use_processes (bool): Cut in a process pool instead of threads (true CPU
+            parallelism; the PDF is sent to each worker process once)
+    """
+
+    def __init__(self, pdf_bytes: bytes, digest: Optional[str] = None,
+                 workers: int = DEFAULT_WORKERS, use_processes: bool = False):
+        self.data = pdf_bytes
+        self.file_hash = digest or file_hash(pdf_bytes)
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        self.page_count = len(self.reader.pages)
+
+    @classmethod
+    def from_path(cls, pdf_path: str, **kwargs) -> "PDFSplitter":
+        with open(pdf_path, "rb") as f:
+            return cls(f.read(), **kwargs)
+
+    def _clip(self, start: int, end: int) -> PageRange:
+        return max(0, start), min(self.page_count, end)
+
+    def page_range(self, start: int, end: int) -> bytes:
+        """Return pages ``[start, end)`` as a standalone PDF, cached by (file hash, range)."""
+        start, end = self._clip(start, end)
+        key = (self.file_hash, start, end)
+        data = _range_cache.get(key)
+        if data is None:
+            data = _cut(self.data, self.file_hash, start, end)
+            _range_cache.put(key, data)
+        return data
+
+    def select_pages(self, page_indices: Iterable[int]) -> bytes:
+        """Return the given (0-based, not necessarily contiguous) pages as one standalone PDF."""
+        page_indices = tuple(i for i in page_indices if 0 <= i < self.page_count)
+        key = (self.file_hash, "pages", page_indices)
+        data = _range_cache.get(key)
+        if data is None:
+            reader = _reader_for(self.data, self.file_hash)
+            writer = PyPDF2.PdfWriter()
+            for page_idx in page_indices:
+                writer.add_page(reader.pages[page_idx])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            data = buffer.getvalue()
+            _range_cache.put(key, data)
+        return data
+
+    def _executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(self.workers, initializer=_init_process,
+                                       initargs=(self.data, self.file_hash))
+        return ThreadPoolExecutor(self.workers, thread_name_prefix="pdf-splitter")
+
+    def _submit(self, executor: Executor, start: int, end: int, out_path: Optional[str] = None):
+        if self.use_processes:
+            return executor.submit(_cut_in_process, start, end, out_path)
+        return executor.submit(_cut, self.data, self.file_hash, start, end, out_path)
+
+    def iter_ranges(self, ranges: Iterable[PageRange]) -> Iterator[Tuple[PageRange, bytes]]:
+        """
+        Yield ``(range, pdf_bytes)`` in order, cutting ahead in parallel
+
+        At most ``2 * workers`` chunks are held at once, and streamed chunks
+        are not added to the in-memory cache, so a whole book can be consumed
+        chunk by chunk.
+        """
+        ranges = [self._clip(start, end) for start, end in ranges]
+        with self._executor() as executor:
+            pending = []
+            next_index = 0
+            for index, (start, end) in enumerate(ranges):
+                while next_index < len(ranges) and next_index < index + 2 * self.workers:
+                    s, e = ranges[next_index]
+                    cached = _range_cache.get((self.file_hash, s, e))
+                    pending.append(cached if cached is not None else self._submit(executor, s, e))
+                    next_index += 1
+                item = pending.pop(0)
+                yield (start, end), item if isinstance(item, bytes) else item.result()
+
+    def write_ranges(self, ranges: Iterable[PageRange], out_dir: str) -> List[str]:
+        """
+        Write each range to ``out_dir`` in parallel and return the file paths
+
+        Files are named by file hash and range; a chunk already on disk is reused.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths, futures = [], []
+        with self._executor() as executor:
+            for start, end in (self._clip(s, e) for s, e in ranges):
+                path = os.path.join(out_dir, f"{self.file_hash[:16]}_p{start + 1}-{end}.pdf")
+                paths.append(path)
+                if not os.path.exists(path):
+                    futures.append(self._submit(executor, start, end, path))
+            for future in futures:
+                future.result()
+        return paths
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Split a PDF into page ranges or fixed-size chunks")
+    parser.add_argument("pdf_path")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ranges", help="1-based inclusive ranges, e.g. 1-3,10-12")
+    group.add_argument("--chunk-size", type=int, help="Pages per chunk")
+    parser.add_argument("--overlap", type=int, default=0, help="Pages shared by consecutive chunks")
+    parser.add_argument("--out", default="pdf_chunks", help="Output directory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads")
+    args = parser.parse_args(argv)
+
+    splitter = PDFSplitter.from_path(args.pdf_path, workers=args.workers, use_processes=args.processes)
+    if args.ranges:
+        ranges = parse_ranges(args.ranges, splitter.page_count)
+    else:
+        ranges = chunk_ranges(splitter.page_count, args.chunk_size, args.overlap)
+
+    for path in splitter.write_ranges(ranges, args.out):
+        print(f"📄 {path}")
+    print(f"✅ Wrote {len(ranges)} chunks from {splitter.page_count} pages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
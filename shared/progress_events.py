@@ -0,0 +1,295 @@
+"""
+In-process progress events and a Server-Sent-Events endpoint.
+
+Extraction runs publish structured events to a :class:`ProgressBus` instead
+of dashboards polling ``output.json``:
+
+    document_started    pages, windows and page source of a run
+    window_started      window and page range about to be sent to the model
+    window_finished     questions found, tokens and cost of the window, ``error`` if it failed
+    document_finished   final status, questions found and the run's token usage
+
+Every event carries ``id`` (increasing), ``type``, ``time``, ``job`` (the run
+or service job ID) and ``document``. Publishing never blocks. Each
+subscriber has its own bounded queue, so a slow dashboard loses its oldest
+events (counted in ``dropped``) instead of slowing the pipeline. The bus
+keeps the last events, so a client that reconnects with ``Last-Event-ID``
+catches up.
+
+:func:`start_event_server` serves the bus at ``GET /events`` as SSE from a
+background thread. ``?job=`` and ``?document=`` filter the stream. The HTTP
+service (extraction_service.py) serves the same stream at its own ``/events``.
+asyncio and http.server are only imported once a subscriber or server needs
+them, so the publishing side stays cheap to import.
+
+Environment variables:
+    PROGRESS_EVENTS_PORT   Start the SSE endpoint on this port in the CLI and the Streamlit app (unset: off)
+
+Usage:
+    curl -N http://127.0.0.1:8765/events?document=maths_example.pdf
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY = 1000
+DEFAULT_SUBSCRIBER_QUEUE = 1000
+HEARTBEAT_SECONDS = 15
+EVENT_FILTERS = ("job", "document", "type")
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "Access-Control-Allow-Origin": "*",
+}
+SSE_HEARTBEAT = b": keep-alive\n\n"
+
+
+def sse_message(event: Dict[str, Any]) -> bytes:
+    """One event in the ``text/event-stream`` wire format."""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """
+    A subscriber's bounded event queue (blocking reads, for threads)
+
+    Args:
+        bus (ProgressBus): Bus the subscription is registered with
+        filters (Dict[str, Any]): Event fields that must match (e.g. ``job``)
+        max_queued (int): Events buffered before the oldest are dropped
+    """
+
+    def __init__(self, bus: "ProgressBus", filters: Dict[str, Any], max_queued: int = DEFAULT_SUBSCRIBER_QUEUE):
+        self._bus = bus
+        self.filters = filters
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque = deque(maxlen=max_queued)
+        self._cond = threading.Condition()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return all(str(event.get(key)) == str(value) for key, value in self.filters.items())
+
+    def _deliver(self, event: Dict[str, Any]):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if none arrived within ``timeout`` seconds (or the subscription closed)."""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while not self.closed:
+            event = self.get(HEARTBEAT_SECONDS)
+            if event is not None:
+                yield event
+
+    def close(self):
+        self._bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncSubscription(Subscription):
+    """A subscription read from an asyncio event loop; events are handed over thread-safely."""
+
+    def __init__(self, bus: "ProgressBus", filters: Dict[str, Any], loop, max_queued: int = DEFAULT_SUBSCRIBER_QUEUE):
+        import asyncio
+
+        super().__init__(bus, filters, max_queued)
+        self._loop = loop
+        self._async_queue = asyncio.Queue(maxsize=max_queued)
+
+    def _put(self, event: Dict[str, Any]):
+        if self._async_queue.full():
+            self._async_queue.get_nowait()
+            self.dropped += 1
+        self._async_queue.put_nowait(event)
+
+    def _deliver(self, event: Dict[str, Any]):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is closed; the subscriber is gone
+            pass
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        import asyncio
+
+        try:
+            return await asyncio.wait_for(self._async_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ProgressBus:
+    """
+    Thread-safe publish/subscribe of progress events within one process
+
+    Args:
+        history (int): Recent events kept for late and reconnecting subscribers
+    """
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+        self._history: deque = deque(maxlen=history)
+        self._next_id = 0
+
+    def publish(self, event_type: str, **fields: Any) -> Dict[str, Any]:
+        """Publish an event to every matching subscriber and return it."""
+        with self._lock:
+            self._next_id += 1
+            event = {"id": self._next_id, "type": event_type, "time": round(time.time(), 3), **fields}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(event):
+                subscription._deliver(event)
+        return event
+
+    def _register(self, subscription: Subscription, after_id: Optional[int]) -> Subscription:
+        with self._lock:
+            if after_id is not None:
+                for event in self._history:
+                    if event["id"] > after_id and subscription.matches(event):
+                        subscription._deliver(event)
+            self._subscribers.append(subscription)
+        return subscription
+
+    def subscribe(self, after_id: Optional[int] = None, max_queued: int = DEFAULT_SUBSCRIBER_QUEUE,
+                  **filters: Any) -> Subscription:
+        """
+        Subscribe from a thread
+
+        Args:
+            after_id (int): Replay retained events after this ID first (e.g. from ``Last-Event-ID``)
+            max_queued (int): Events buffered before the oldest are dropped
+            **filters: Event fields that must match (``job``, ``document``, ``type``)
+
+        Returns:
+            Subscription: Close it (or use it as a context manager) when done
+        """
+        return self._register(Subscription(self, filters, max_queued), after_id)
+
+    def subscribe_async(self, after_id: Optional[int] = None, max_queued: int = DEFAULT_SUBSCRIBER_QUEUE,
+                        **filters: Any) -> AsyncSubscription:
+        """Like :meth:`subscribe`, for a coroutine on the running event loop."""
+        import asyncio
+
+        return self._register(AsyncSubscription(self, filters, asyncio.get_running_loop(), max_queued), after_id)
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+_bus = ProgressBus()
+
+
+def get_progress_bus() -> ProgressBus:
+    """The process-wide bus the extractors publish to."""
+    return _bus
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _event_stream_handler(bus: "ProgressBus"):
+    from http.server import BaseHTTPRequestHandler
+
+    class EventStreamHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/events":
+                self.send_error(404, "Use GET /events")
+                return
+            filters = {key: value for key, value in parse_qsl(url.query) if key in EVENT_FILTERS}
+            after_id = parse_last_event_id(self.headers.get("Last-Event-ID"))
+
+            self.send_response(200)
+            for name, value in SSE_HEADERS.items():
+                self.send_header(name, value)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            with bus.subscribe(after_id, **filters) as subscription:
+                try:
+                    while True:
+                        event = subscription.get(HEARTBEAT_SECONDS)
+                        self.wfile.write(sse_message(event) if event is not None else SSE_HEARTBEAT)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+
+        def log_message(self, format: str, *args: Any):
+            logger.debug("SSE %s - %s", self.address_string(), format % args)
+
+    return EventStreamHandler
+
+
+_servers: Dict[int, Any] = {}
+_servers_lock = threading.Lock()
+
+
+def start_event_server(port: Optional[int] = None, host: str = "127.0.0.1",
+                       bus: Optional[ProgressBus] = None):
+    """
+    Serve the bus at ``http://host:port/events`` from a daemon thread (once per port)
+
+    Args:
+        port (int): Port to listen on (default: the PROGRESS_EVENTS_PORT env variable)
+        host (str): Interface to bind; local only by default
+        bus (ProgressBus): Bus to serve (default: the process-wide one)
+
+    Returns:
+        Optional[ThreadingHTTPServer]: The running server, or None when no port is configured
+    """
+    if port is None:
+        port = int(os.getenv("PROGRESS_EVENTS_PORT") or 0) or None
+    if port is None:
+        return None
+    with _servers_lock:
+        if port not in _servers:
+            from http.server import ThreadingHTTPServer
+
+            server = ThreadingHTTPServer((host, port), _event_stream_handler(bus or _bus))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"progress-events-{port}", daemon=True).start()
+            _servers[port] = server
+            logger.info("📡 Progress events at http://%s:%d/events", host, port)
+        return _servers[port]
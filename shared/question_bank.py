@@ -0,0 +1,297 @@
+"""
+SQLite-backed question bank with FTS5 full-text search and indexed facets.
+
+Questions from the ingestion pipeline, the Streamlit OCR extractor and the
+question generator are normalized into one table. Facet columns are indexed,
+and the question text is mirrored into an FTS5 index (kept in sync by
+triggers). Ingestion happens in bulk, one transaction per call, and duplicates
+(same source, document and text) are ignored.
+
+Usage:
+    python -m shared.question_bank ingest output.json
+    python -m shared.question_bank search "area under the curve" --subject Mathematics --limit 10
+
+Search text is matched word by word (every word must occur), so math such as
+``f(x) = 2x`` or ``x-axis`` is safe to pass; ``raw=True`` (``--raw``) takes
+FTS5 query syntax (``OR``, ``NEAR``, prefixes, column filters) instead.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_BANK_PATH = "question_bank.db"
+
+FACETS = ("source", "document", "source_page", "subject", "topic", "chapter",
+          "difficulty", "board", "class_level", "question_type")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    document TEXT,
+    source_page INTEGER,
+    question_text TEXT NOT NULL,
+    subject TEXT COLLATE NOCASE,
+    topic TEXT COLLATE NOCASE,
+    chapter TEXT COLLATE NOCASE,
+    difficulty TEXT COLLATE NOCASE,
+    board TEXT COLLATE NOCASE,
+    class_level TEXT COLLATE NOCASE,
+    question_type TEXT COLLATE NOCASE,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_subject ON questions(subject);
+CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions(topic);
+CREATE INDEX IF NOT EXISTS idx_questions_chapter ON questions(chapter);
+CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions(difficulty);
+CREATE INDEX IF NOT EXISTS idx_questions_board ON questions(board, class_level);
+CREATE INDEX IF NOT EXISTS idx_questions_document_page ON questions(document, source_page);
+CREATE INDEX IF NOT EXISTS idx_questions_source ON questions(source);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+    question_text, topic, chapter, subject,
+    content='questions', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS questions_ai AFTER INSERT ON questions BEGIN
+    INSERT INTO questions_fts(rowid, question_text, topic, chapter, subject)
+    VALUES (new.id, new.question_text, new.topic, new.chapter, new.subject);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_ad AFTER DELETE ON questions BEGIN
+    INSERT INTO questions_fts(questions_fts, rowid, question_text, topic, chapter, subject)
+    VALUES ('delete', old.id, old.question_text, old.topic, old.chapter, old.subject);
+END;
+"""
+
+INSERT_SQL = f"""
+INSERT OR IGNORE INTO questions (content_hash, question_text, payload, created_at, {", ".join(FACETS)})
+VALUES (:content_hash, :question_text, :payload, :created_at, {", ".join(":" + f for f in FACETS)})
+"""
+
+
+def fts_query(text: str) -> str:
+    """Quote every whitespace-separated token as an FTS5 phrase, so user text is never parsed as query syntax."""
+    return " ".join('"' + token.replace('"', '""') + '"' for token in text.split())
+
+
+def _record(source: str, question_text: str, payload: Dict[str, Any], **facets: Any) -> Dict[str, Any]:
+    """Build a normalized row for :meth:`QuestionBank.add_questions`."""
+    record = {facet: facets.get(facet) for facet in FACETS}
+    record["source"] = source
+    record["question_text"] = question_text
+    record["payload"] = json.dumps(payload, ensure_ascii=False)
+    key = f"{source}\x1f{record['document'] or ''}\x1f{question_text.strip()}"
+    record["content_hash"] = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return record
+
+
+def records_from_window_result(window_result: Dict[str, Any], document: str) -> List[Dict[str, Any]]:
+    """Rows for one ``windows_results`` entry of the ingestion pipeline's output.json."""
+    return [
+        _record(
+            "ingestion", q.get("question_text", ""), q,
+            document=document,
+            source_page=window_result.get("focus_page"),
+            topic=q.get("subject_topic"),
+            difficulty=q.get("difficulty_level"),
+            question_type=q.get("question_type"),
+        )
+        for q in window_result.get("questions", [])
+        if q.get("question_text")
+    ]
+
+
+def records_from_ocr_questions(questions: Iterable[Dict[str, Any]], document: str, page: Optional[int]) -> List[Dict[str, Any]]:
+    """Rows for questions extracted by the Streamlit OCR extractor from one page."""
+    return [
+        _record(
+            "ocr_extractor", q.get("question", ""), q,
+            document=document,
+            source_page=page,
+            chapter=q.get("chapter"),
+            topic=q.get("topic"),
+        )
+        for q in questions
+        if q.get("question")
+    ]
+
+
+def record_from_generated(question: Dict[str, Any], query: str) -> Dict[str, Any]:
+    """Row for one generated ``QuestionStructure`` (dumped by alias)."""
+    payload = dict(question, query=query)
+    return _record(
+        "generator", question.get("question", ""), payload,
+        subject=question.get("subject"),
+        topic=question.get("topic"),
+        difficulty=question.get("difficulty"),
+        board=question.get("board"),
+        class_level=question.get("class") or question.get("class_level"),
+    )
+
+
+class QuestionBank:
+    """
+    Indexed question store on a single SQLite file
+
+    Args:
+        path (str): Database file path (created if missing)
+    """
+
+    def __init__(self, path: str = DEFAULT_BANK_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add_questions(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert records in a single transaction
+
+        Returns:
+            int: Number of new rows (duplicates are skipped)
+        """
+        created_at = datetime.now().isoformat()
+        rows = [dict(record, created_at=created_at) for record in records]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            return self._conn.executemany(INSERT_SQL, rows).rowcount
+
+    def ingest_output_file(self, output_path: str) -> int:
+        """Ingest every window of an ingestion-pipeline output.json."""
+        with open(output_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        document = data.get("pdf_path", output_path)
+        records = []
+        for window_result in data.get("windows_results", []):
+            records.extend(records_from_window_result(window_result, document))
+        return self.add_questions(records)
+
+    def search(self, text: Optional[str] = None, limit: int = 50, offset: int = 0, raw: bool = False,
+               **facets: Any) -> List[Dict[str, Any]]:
+        """
+        Full-text and/or faceted search
+
+        Args:
+            text (str): Words to find in question text, topic, chapter and subject
+            limit (int): Maximum rows returned
+            offset (int): Rows to skip (for paging)
+            raw (bool): Pass ``text`` through as an FTS5 query expression
+            **facets: Exact (case-insensitive) matches on any of :data:`FACETS`
+
+        Returns:
+            List[Dict[str, Any]]: Matching rows, best full-text matches first
+        """
+        where, params = self._facet_filters(facets)
+        query = (text if raw else fts_query(text)).strip() if text else ""
+        if query:
+            sql = ("SELECT q.* FROM questions_fts JOIN questions q ON q.id = questions_fts.rowid "
+                   "WHERE questions_fts MATCH ?")
+            params.insert(0, query)
+            if where:
+                sql += " AND " + " AND ".join("q." + clause for clause in where)
+            sql += " ORDER BY bm25(questions_fts)"
+        else:
+            sql = "SELECT * FROM questions"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY id"
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def facet_counts(self, facet: str, **facets: Any) -> Dict[str, int]:
+        """Count questions per value of ``facet`` within the other filters."""
+        if facet not in FACETS:
+            raise ValueError(f"Unknown facet: {facet}")
+        where, params = self._facet_filters(facets)
+        sql = f"SELECT {facet} AS value, COUNT(*) AS n FROM questions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY {facet} ORDER BY n DESC"
+        with self._lock:
+            return {row["value"]: row["n"] for row in self._conn.execute(sql, params)}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _facet_filters(facets: Dict[str, Any]):
+        where, params = [], []
+        for facet, value in facets.items():
+            if facet not in FACETS:
+                raise ValueError(f"Unknown facet: {facet}")
+            if value is not None:
+                where.append(f"{facet} = ?")
+                params.append(value)
+        return where, params
+
+
+_banks: Dict[str, QuestionBank] = {}
+_banks_lock = threading.Lock()
+
+
+def get_question_bank(path: Optional[str] = None) -> Optional[QuestionBank]:
+    """
+    Return the shared bank for ``path`` (default: the QUESTION_BANK_PATH env variable)
+
+    Returns None when QUESTION_BANK_PATH is set to an empty string, which
+    disables ingestion from the apps.
+    """
+    path = path if path is not None else os.getenv("QUESTION_BANK_PATH", DEFAULT_BANK_PATH)
+    if not path:
+        return None
+    with _banks_lock:
+        if path not in _banks:
+            _banks[path] = QuestionBank(path)
+        return _banks[path]
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Query or fill the local question bank")
+    parser.add_argument("--db", default=os.getenv("QUESTION_BANK_PATH", DEFAULT_BANK_PATH), help="Database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Ingest ingestion-pipeline output.json files")
+    ingest.add_argument("files", nargs="+")
+
+    search = commands.add_parser("search", help="Full-text / faceted search")
+    search.add_argument("text", nargs="?")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--raw", action="store_true", help="Treat the text as an FTS5 query expression")
+    for facet in FACETS:
+        search.add_argument(f"--{facet.replace('_', '-')}", dest=facet)
+
+    args = parser.parse_args(argv)
+    bank = QuestionBank(args.db)
+
+    if args.command == "ingest":
+        for path in args.files:
+            print(f"📥 {path}: {bank.ingest_output_file(path)} new questions")
+        print(f"📚 Question bank now holds {bank.count()} questions")
+    else:
+        facets = {facet: getattr(args, facet) for facet in FACETS}
+        for row in bank.search(args.text, limit=args.limit, raw=args.raw, **facets):
+            print(f"[{row['id']}] ({row['source']}, p.{row['source_page']}) {row['topic'] or ''}: {row['question_text'][:120]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Schemas and validators for the questions the extractors produce.
+
+Kept out of the pipeline modules so that importing them (and starting a CLI)
+does not load pydantic; the extractors import this module when they need it.
+
+Records are slotted dataclasses rather than pydantic models: they are compact
+and cheap to build, and the pydantic-core validators and serializers below are
+built once at import instead of per call. A model response is parsed and
+validated in one pass (``validate_json``), a list of questions is validated as
+one batch, and the records are dumped straight back to JSON-ready dicts for
+the output files.
+
+    Question / QuestionExtractionResult   ingestion pipeline (one window's result)
+    OCRQuestion                           Streamlit OCR app (chapter / question / topic / image_id)
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Annotated, Any, Iterable, List, Optional
+
+from pydantic import ConfigDict, Field, TypeAdapter, ValidationError
+
+
+@dataclass(slots=True)
+class Question:
+    """Model for a single question"""
+    question_text: Annotated[str, Field(description="The exact text of the question")]
+    question_type: Annotated[str, Field(description="Type of question (multiple choice, short answer, essay, problem-solving, etc.)")]
+    subject_topic: Annotated[str, Field(description="Subject or topic area of the question")]
+    difficulty_level: Annotated[str, Field(description="Difficulty level (beginner, intermediate, advanced)")]
+    context: Annotated[str, Field(description="Brief context or surrounding information where the question appears")]
+
+
+@dataclass(slots=True)
+class QuestionExtractionResult:
+    """Model for the complete question extraction result"""
+    questions: Annotated[List[Question], Field(description="List of extracted questions")]
+    summary: Annotated[str, Field(description="Brief summary of the content analyzed")]
+    total_questions_found: Annotated[int, Field(description="Total number of questions found")]
+
+
+@dataclass(slots=True)
+class OCRQuestion:
+    """A question extracted from one OCR page"""
+    # Chapter numbers often come back as JSON numbers
+    __pydantic_config__ = ConfigDict(coerce_numbers_to_str=True)
+
+    question: str
+    chapter: Optional[str] = None
+    topic: Optional[str] = None
+    image_id: Optional[str] = None
+
+
+EXTRACTION_RESULT = TypeAdapter(QuestionExtractionResult)
+QUESTIONS = TypeAdapter(List[Question])
+OCR_QUESTIONS = TypeAdapter(List[OCRQuestion])
+
+# PydanticOutputParser's template, kept here because its location varies across langchain-core releases
+FORMAT_INSTRUCTIONS_TEMPLATE = """The output should be formatted as a JSON instance that conforms to the JSON schema below.
+
+As an example, for the schema {{"properties": {{"foo": {{"title": "Foo", "description": "a list of strings", "type": "array", "items": {{"type": "string"}}}}}}, "required": ["foo"]}}
+the object {{"foo": ["bar", "baz"]}} is a well-formatted instance of the schema. The object {{"properties": {{"foo": ["bar", "baz"]}}}} is not well-formatted.
+
+Here is the output schema:
+```
+{schema}
+```"""
+
+FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def strip_fences(text: str) -> str:
+    """The body of a fenced JSON block in a model response (or the text itself)."""
+    match = FENCED_JSON.search(text)
+    return match.group(1) if match else text.strip()
+
+
+@lru_cache(maxsize=None)
+def format_instructions() -> str:
+    """Output format instructions for the ingestion prompt (same wording as PydanticOutputParser's)."""
+    schema = {key: value for key, value in EXTRACTION_RESULT.json_schema().items() if key not in ("title", "type")}
+    return FORMAT_INSTRUCTIONS_TEMPLATE.format(schema=json.dumps(schema, ensure_ascii=False))
+
+
+def parse_extraction_result(text: str) -> QuestionExtractionResult:
+    """
+    Parse and validate a model response in a single pass
+
+    Raises:
+        ValidationError: If the response is not valid JSON or does not match the schema
+    """
+    return EXTRACTION_RESULT.validate_json(strip_fences(text))
+
+
+def parse_ocr_questions(text: str) -> List[OCRQuestion]:
+    """
+    Parse and validate an OCR-page response (a JSON list) in a single pass
+
+    Raises:
+        ValidationError: If the response is not valid JSON or any question does not match the schema
+    """
+    return OCR_QUESTIONS.validate_json(strip_fences(text))
+
+
+def validate_questions(items: Iterable[Any], adapter: TypeAdapter = QUESTIONS) -> List[Any]:
+    """
+    Validate a batch of question dicts, dropping the ones that don't match
+
+    The whole batch goes through the validator at once. Only when it fails are
+    the offending items (located from the error paths) removed and the rest
+    validated again.
+
+    Args:
+        items (Iterable[Any]): Candidate questions
+        adapter (TypeAdapter): ``QUESTIONS`` or ``OCR_QUESTIONS``
+
+    Returns:
+        List[Any]: The valid questions as records
+    """
+    items = list(items)
+    while items:
+        try:
+            return adapter.validate_python(items)
+        except ValidationError as e:
+            bad = {error["loc"][0] for error in e.errors() if error["loc"] and isinstance(error["loc"][0], int)}
+            if not bad:
+                return []
+            items = [item for i, item in enumerate(items) if i not in bad]
+    return []
+
+
+def dump_questions(questions: List[Any], adapter: TypeAdapter = QUESTIONS) -> List[dict]:
+    """Serialize question records to JSON-ready dicts in one pass."""
+    return adapter.dump_python(questions, mode="json")
@@ -0,0 +1,237 @@
+"""
+Token and cost accounting for LLM calls.
+
+Every model call is recorded with its model, input/output tokens (taken from
+the LangChain response's usage metadata), latency and estimated cost. Records
+are appended to a JSON-lines run ledger, and the totals roll up per run and
+per model. Those totals are what the pipelines store in their output stats.
+
+A ledger can carry a budget in dollars and/or tokens. Once the budget is
+exceeded, the next call either raises :class:`BudgetExceededError` (``abort``)
+or is told to switch to a cheaper model (``downgrade``). A downgraded run
+still aborts if it reaches ``DOWNGRADE_HARD_LIMIT`` times the budget.
+
+A hedged call (shared/hedging.py) sends duplicate requests; the winning
+response carries their number under ``HEDGE_REQUESTS_KEY`` in its response
+metadata, and each duplicate is billed like the winner. That is an upper
+bound, since the cancelled request stops generating early, but budgets never
+undercount spend.
+
+Resuming a stopped run seeds the new ledger with the earlier run's summary
+(:meth:`TokenLedger.seed`), so its budget and totals cover both runs.
+
+Environment variables:
+    TOKEN_LEDGER_PATH    JSON-lines ledger file (default token_ledger.jsonl; empty disables it)
+    LLM_BUDGET_USD       Spend cap per run
+    LLM_BUDGET_TOKENS    Token cap (input + output) per run
+    LLM_BUDGET_ACTION    ``abort`` (default) or ``downgrade``
+    LLM_DOWNGRADE_MODEL  Model used after a downgrade (default gemini-2.5-flash-lite)
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_LEDGER_PATH = "token_ledger.jsonl"
+DEFAULT_DOWNGRADE_MODEL = "gemini-2.5-flash-lite"
+# A downgraded run is still aborted once it spends this multiple of its budget
+DOWNGRADE_HARD_LIMIT = 1.5
+# Response metadata key holding how many requests a hedged call sent
+HEDGE_REQUESTS_KEY = "hedge_requests"
+
+# USD per 1M tokens: (input, output)
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a run has spent its token or cost budget."""
+
+
+def usage_from_response(response: Any) -> Tuple[int, int]:
+    """
+    Input and output token counts of a chat model response
+
+    Reads ``usage_metadata`` (standard on LangChain messages) and falls back to
+    provider-specific ``response_metadata`` keys; unknown usage counts as zero.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or metadata.get("usage_metadata") or {}
+    return (
+        int(usage.get("prompt_tokens", usage.get("prompt_token_count", 0))),
+        int(usage.get("completion_tokens", usage.get("candidates_token_count", 0))),
+    )
+
+
+def hedge_requests(response: Any) -> int:
+    """Requests sent for one call (more than 1 when it was hedged)."""
+    metadata = getattr(response, "response_metadata", None) or {}
+    return max(1, int(metadata.get(HEDGE_REQUESTS_KEY, 1)))
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call; models missing from :data:`MODEL_PRICES` cost 0."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "total_tokens": 0,
+            "cost_usd": 0.0, "latency_s": 0.0}
+
+
+class TokenLedger:
+    """
+    Per-run record of LLM calls with optional budget enforcement
+
+    Args:
+        document (str): What the run processes (stored on every record)
+        ledger_path (str): JSON-lines file calls are appended to; None keeps records in memory only
+        budget_usd (float): Spend cap for the run
+        budget_tokens (int): Token cap (input + output) for the run
+        budget_action (str): ``abort`` or ``downgrade`` once a cap is exceeded
+        downgrade_model (str): Model name suggested after a downgrade
+    """
+
+    def __init__(self, document: Optional[str] = None, ledger_path: Optional[str] = None,
+                 budget_usd: Optional[float] = None, budget_tokens: Optional[int] = None,
+                 budget_action: str = "abort", downgrade_model: str = DEFAULT_DOWNGRADE_MODEL):
+        if budget_action not in ("abort", "downgrade"):
+            raise ValueError(f"Unknown budget action: {budget_action}")
+        self.run_id = uuid.uuid4().hex[:12]
+        self.document = document
+        self.ledger_path = ledger_path
+        self.budget_usd = budget_usd
+        self.budget_tokens = budget_tokens
+        self.budget_action = budget_action
+        self.downgrade_model = downgrade_model
+        self.downgraded = False
+        self.totals = _empty_totals()
+        self.by_model: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, document: Optional[str] = None) -> "TokenLedger":
+        budget_usd = os.getenv("LLM_BUDGET_USD")
+        budget_tokens = os.getenv("LLM_BUDGET_TOKENS")
+        return cls(
+            document=document,
+            ledger_path=os.getenv("TOKEN_LEDGER_PATH", DEFAULT_LEDGER_PATH) or None,
+            budget_usd=float(budget_usd) if budget_usd else None,
+            budget_tokens=int(budget_tokens) if budget_tokens else None,
+            budget_action=os.getenv("LLM_BUDGET_ACTION", "abort"),
+            downgrade_model=os.getenv("LLM_DOWNGRADE_MODEL", DEFAULT_DOWNGRADE_MODEL),
+        )
+
+    def seed(self, summary: Optional[Dict[str, Any]]):
+        """
+        Carry the usage of an earlier, stopped run of the same document into this ledger
+
+        Args:
+            summary (Dict[str, Any]): The earlier run's :meth:`summary`; None or empty seeds nothing
+        """
+        if not summary:
+            return
+        with self._lock:
+            for totals, earlier in [(self.totals, summary)] + [
+                    (self.by_model.setdefault(model, _empty_totals()), model_totals)
+                    for model, model_totals in (summary.get("by_model") or {}).items()]:
+                for key in totals:
+                    totals[key] += earlier.get(key, 0)
+            self.downgraded = self.downgraded or bool(summary.get("downgraded"))
+
+    def _budget_fraction(self) -> float:
+        """Largest share of any configured cap spent so far (0 without caps)."""
+        fractions = [0.0]
+        if self.budget_usd:
+            fractions.append(self.totals["cost_usd"] / self.budget_usd)
+        if self.budget_tokens:
+            fractions.append(self.totals["total_tokens"] / self.budget_tokens)
+        return max(fractions)
+
+    def check_budget(self) -> bool:
+        """
+        Call before each model request
+
+        Returns:
+            bool: True when the caller should use :attr:`downgrade_model`
+
+        Raises:
+            BudgetExceededError: When the run must stop
+        """
+        with self._lock:
+            spent = self._budget_fraction()
+            if spent < 1.0:
+                return self.downgraded
+            if self.budget_action == "abort" or spent >= DOWNGRADE_HARD_LIMIT:
+                raise BudgetExceededError(
+                    f"Run {self.run_id} exceeded its budget: ${self.totals['cost_usd']:.4f}, "
+                    f"{self.totals['total_tokens']} tokens"
+                )
+            self.downgraded = True
+            return True
+
+    def record(self, model: str, response: Any, latency_s: float, **context: Any) -> Dict[str, Any]:
+        """
+        Record one call and append it to the ledger
+
+        Args:
+            model (str): Model name used for pricing
+            response: The chat model response (usage metadata is read from it)
+            latency_s (float): Wall time of the call
+            **context: Extra fields such as ``window`` or ``page``
+
+        Returns:
+            Dict[str, Any]: The call record (tokens, cost, latency, model)
+        """
+        input_tokens, output_tokens = usage_from_response(response)
+        requests = hedge_requests(response)
+        input_tokens, output_tokens = input_tokens * requests, output_tokens * requests
+        entry = {
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost_usd": round(estimate_cost(model, input_tokens, output_tokens), 6),
+            "latency_s": round(latency_s, 3),
+        }
+        if requests > 1:
+            entry["hedge_requests"] = requests
+        with self._lock:
+            for totals in (self.totals, self.by_model.setdefault(model, _empty_totals())):
+                totals["calls"] += 1
+                for key in ("input_tokens", "output_tokens", "total_tokens", "cost_usd", "latency_s"):
+                    totals[key] += entry[key]
+            if self.ledger_path:
+                line = dict(entry, run_id=self.run_id, document=self.document,
+                            ts=datetime.now().isoformat(), **context)
+                with open(self.ledger_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+        return entry
+
+    def summary(self) -> Dict[str, Any]:
+        """Run totals and per-model breakdown, suitable for output stats."""
+        with self._lock:
+            def rounded(totals):
+                return dict(totals, cost_usd=round(totals["cost_usd"], 6), latency_s=round(totals["latency_s"], 2))
+
+            summary = rounded(self.totals)
+            summary["run_id"] = self.run_id
+            summary["by_model"] = {model: rounded(totals) for model, totals in self.by_model.items()}
+            summary["downgraded"] = self.downgraded
+            if self.budget_usd is not None:
+                summary["budget_usd"] = self.budget_usd
+            if self.budget_tokens is not None:
+                summary["budget_tokens"] = self.budget_tokens
+            return summary
@@ -0,0 +1,285 @@
+"""
+Lease-based window work queue on a shared SQLite file.
+
+Spreads sliding-window extraction across processes and machines without a
+broker. An enqueuer splits each document into windows and stores them, with
+their text, in one SQLite file on a shared filesystem. Any number of workers
+then claim windows:
+
+    claim      atomically leases up to N pending windows (or windows whose lease
+               expired) to a worker for ``lease_seconds``
+    heartbeat  extends the worker's leases while a slow LLM call is running
+    complete   stores the result; the first completion of a window wins and
+               later ones are ignored, so re-running a window is harmless
+    fail       returns the window to the pool, or marks it failed after
+               ``max_attempts`` claims
+
+A lease that expires on a window's last attempt (its worker died) marks the
+window failed at the next claim, so it never blocks a drained queue.
+
+A worker that dies simply stops heartbeating. Its leases expire and its
+in-flight windows are claimed by someone else.
+
+Claims run in ``BEGIN IMMEDIATE`` transactions with the rollback journal (WAL
+needs shared memory, which network filesystems don't provide). The shared
+filesystem must therefore honour POSIX file locks (NFSv4, SMB, EFS...).
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_QUEUE_PATH = "work_queue.db"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    total_pages INTEGER NOT NULL,
+    total_windows INTEGER NOT NULL,
+    meta TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS windows (
+    doc_id TEXT NOT NULL,
+    window_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (doc_id, window_id)
+);
+CREATE INDEX IF NOT EXISTS idx_windows_claim ON windows(status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_windows_owner ON windows(lease_owner);
+"""
+
+CLAIMABLE = "(status = 'pending' OR (status = 'leased' AND lease_expires < :now)) AND attempts < :max_attempts"
+EXHAUSTED = "status = 'leased' AND lease_expires < :now AND attempts >= :max_attempts"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Shared queue of extraction windows
+
+    Args:
+        path (str): SQLite file on a filesystem every worker can reach
+        lease_seconds (float): How long a claim is valid without a heartbeat
+        max_attempts (int): Claims a window gets before it is marked failed
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front (no upgrade deadlocks)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue_document(self, doc_id: str, pdf_path: str, total_pages: int,
+                         windows: List[Dict[str, Any]], **meta: Any) -> int:
+        """
+        Add a document's windows; enqueueing the same document again is a no-op
+
+        Args:
+            doc_id (str): Stable document key (e.g. the PDF's SHA-256)
+            pdf_path (str): Original path, kept for the assembled output
+            total_pages (int): Page count of the document
+            windows (List[Dict[str, Any]]): Windows from create_sliding_windows (with their text)
+            **meta: Run settings stored with the document (window_size, context_mode, ...)
+
+        Returns:
+            int: Number of windows added
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (doc_id, pdf_path, total_pages, total_windows, meta, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, pdf_path, total_pages, len(windows), json.dumps(meta), now),
+            )
+            return conn.executemany(
+                "INSERT OR IGNORE INTO windows (doc_id, window_id, payload, updated_at) VALUES (?, ?, ?, ?)",
+                [(doc_id, w["window_id"], json.dumps(w, ensure_ascii=False), now) for w in windows],
+            ).rowcount
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Lease up to ``limit`` claimable windows to ``worker_id``
+
+        Returns:
+            List[Dict[str, Any]]: ``doc_id``, ``window_id``, ``attempts`` and the window ``payload``
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # The worker died on the window's last attempt: nobody will ever claim it again
+            conn.execute(
+                "UPDATE windows SET status = 'failed', error = 'Lease expired on the last attempt', "
+                f"lease_owner = NULL, lease_expires = NULL, updated_at = :now WHERE {EXHAUSTED}",
+                {"now": now, "max_attempts": self.max_attempts},
+            )
+            rows = conn.execute(
+                f"SELECT doc_id, window_id, payload, attempts FROM windows WHERE {CLAIMABLE} "
+                "ORDER BY doc_id, window_id LIMIT :limit",
+                {"now": now, "max_attempts": self.max_attempts, "limit": limit},
+            ).fetchall()
+            conn.executemany(
+                "UPDATE windows SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE doc_id = ? AND window_id = ?",
+                [(worker_id, now + self.lease_seconds, now, row["doc_id"], row["window_id"]) for row in rows],
+            )
+        return [{"doc_id": row["doc_id"], "window_id": row["window_id"], "attempts": row["attempts"] + 1,
+                 "payload": json.loads(row["payload"])} for row in rows]
+
+    def heartbeat(self, worker_id: str) -> int:
+        """Extend every lease held by ``worker_id``; returns how many it still holds."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE windows SET lease_expires = ?, updated_at = ? WHERE lease_owner = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, worker_id),
+            ).rowcount
+
+    def complete(self, worker_id: str, doc_id: str, window_id: int, result: Dict[str, Any]) -> bool:
+        """
+        Store a window's result
+
+        Returns:
+            bool: False if the window was already completed (by this or another worker)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE windows SET status = 'done', result = ?, error = NULL, lease_owner = ?, "
+                "lease_expires = NULL, updated_at = ? WHERE doc_id = ? AND window_id = ? AND status != 'done'",
+                (json.dumps(result, ensure_ascii=False), worker_id, now, doc_id, window_id),
+            ).rowcount == 1
+
+    def fail(self, worker_id: str, doc_id: str, window_id: int, error: str) -> None:
+        """Give a window back to the pool, or mark it failed once it has used all attempts."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE windows SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE doc_id = ? AND window_id = ? AND lease_owner = ? AND status = 'leased'",
+                (self.max_attempts, error, now, doc_id, window_id, worker_id),
+            )
+
+    def release(self, worker_id: str) -> int:
+        """Return the worker's leased windows to the pool without spending an attempt (clean shutdown)."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE windows SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE lease_owner = ? AND status = 'leased'",
+                (now, worker_id),
+            ).rowcount
+
+    def retry_failed(self, doc_id: Optional[str] = None) -> int:
+        """Put failed windows back in the pool with fresh attempts."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE windows SET status = 'pending', attempts = 0, updated_at = ? "
+                "WHERE status = 'failed' AND (? IS NULL OR doc_id = ?)",
+                (time.time(), doc_id, doc_id),
+            ).rowcount
+
+    def progress(self, doc_id: Optional[str] = None) -> Dict[str, int]:
+        """Window counts by status (expired leases are ``expired``, or ``failed`` once out of attempts)."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT CASE WHEN {EXHAUSTED} THEN 'failed' "
+                "WHEN status = 'leased' AND lease_expires < :now THEN 'expired' ELSE status END AS state, "
+                "COUNT(*) AS n FROM windows WHERE (:doc_id IS NULL OR doc_id = :doc_id) GROUP BY state",
+                {"now": time.time(), "max_attempts": self.max_attempts, "doc_id": doc_id},
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "expired": 0, "done": 0, "failed": 0}
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents ORDER BY created_at").fetchall()
+        return [dict(row, meta=json.loads(row["meta"])) for row in rows]
+
+    def window_states(self, doc_id: str) -> Iterable[Dict[str, Any]]:
+        """Every window of a document in order, with its result or last error."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT window_id, payload, status, result, error FROM windows WHERE doc_id = ? ORDER BY window_id",
+                (doc_id,),
+            ).fetchall()
+        for row in rows:
+            yield {
+                "window_id": row["window_id"],
+                "status": row["status"],
+                "payload": json.loads(row["payload"]),
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseHeartbeat:
+    """
+    Background thread that renews a worker's leases every third of the lease period
+
+    Args:
+        queue (WorkQueue): The queue (its connection is shared; calls are serialized)
+        worker_id (str): Worker whose leases are renewed
+    """
+
+    def __init__(self, queue: WorkQueue, worker_id: str):
+        self.queue = queue
+        self.worker_id = worker_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{worker_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(self.worker_id)
+            except sqlite3.Error:
+                # A missed beat only shortens the lease; the next one retries
+                pass
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()